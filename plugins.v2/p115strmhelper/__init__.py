@@ -167,6 +167,9 @@ class P115StrmHelper(_PluginBase):
                 )
             else:
                 raise Exception("初始化迁移脚本失败")
+            # 载入文件夹路径映射
+            count = FileDbHelper().seed_folder_path_cache()
+            logger.debug(f"【数据库】已载入 {count} 个文件夹路径映射")
         return True
 
     def get_state(self) -> bool:
@@ -383,6 +386,27 @@ class P115StrmHelper(_PluginBase):
                 "auth": "bear",
                 "summary": "清理增量同步跳过路径缓存",
             },
+            {
+                "path": "/db_storage_report",
+                "endpoint": self.api.db_storage_report_api,
+                "methods": ["GET"],
+                "auth": "bear",
+                "summary": "获取数据库空间占用报告",
+            },
+            {
+                "path": "/db_compact_extra",
+                "endpoint": self.api.db_compact_extra_api,
+                "methods": ["POST"],
+                "auth": "bear",
+                "summary": "按当前存储模式重新编码文件表 extra",
+            },
+            {
+                "path": "/redirect_stats",
+                "endpoint": self.api.redirect_stats_api,
+                "methods": ["GET"],
+                "auth": "bear",
+                "summary": "获取 302 跳转服务统计",
+            },
             {
                 "path": "/browse_dir",
                 "endpoint": self.api.browse_dir_api,
@@ -679,28 +703,14 @@ class P115StrmHelper(_PluginBase):
         ):
             return
 
-        remove_id = ""
-        # 遍历删除字典
-        for key, item_list in pantransfercacher.top_delete_pan_transfer_list.items():
-            # 只有目前处理完成的这个文件ID在处理列表中，才表明匹配到了该删除的顶层目录
-            if str(dest_fileitem.fileid) in item_list:
-                # 从列表中删除这个ID
-                pantransfercacher.top_delete_pan_transfer_list[key] = [
-                    item for item in item_list if item != str(dest_fileitem.fileid)
-                ]
-                # 记录需删除的顶层目录
-                remove_id = key
-                break
-
+        # 只有需删除的顶层目录下面的文件全部整理完成才进行删除操作
+        remove_id = pantransfercacher.finish_top_delete(dest_fileitem.fileid)
         if remove_id:
-            # 只有需删除的顶层目录下面的文件全部整理完成才进行删除操作
-            if not pantransfercacher.top_delete_pan_transfer_list.get(remove_id):
-                del pantransfercacher.top_delete_pan_transfer_list[remove_id]
-                resp = servicer.client.fs_delete(int(remove_id))
-                if resp["state"]:
-                    logger.info(f"【网盘整理】删除 {remove_id} 文件夹成功")
-                else:
-                    logger.error(f"【网盘整理】删除 {remove_id} 文件夹失败: {resp}")
+            resp = servicer.client.fs_delete(int(remove_id))
+            if resp["state"]:
+                logger.info(f"【网盘整理】删除 {remove_id} 文件夹成功")
+            else:
+                logger.error(f"【网盘整理】删除 {remove_id} 文件夹失败: {resp}")
 
         return
 
@@ -3,7 +3,7 @@ from io import BytesIO
 from datetime import datetime
 from dataclasses import asdict
 from time import time, sleep
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from pathlib import Path
 from urllib.parse import quote, unquote
 
@@ -17,11 +17,14 @@ from fastapi.responses import JSONResponse
 
 from .service import servicer
 from .core.config import configer
-from .core.cache import idpathcacher, DirectoryCache
+from .core.cache import idpathcacher, pathpickcodecacher, DirectoryCache
 from .core.aliyunpan import AliyunPanLogin
-from .core.p115 import get_pid_by_path, get_pickcode_by_path
+from .core.p115 import get_pid_by_path, async_get_pickcode_by_path
+from .db_manager.oper import FileDbHelper
 from .helper.life.test import MonitorLifeTest
 from .helper.strm import ApiSyncStrmHelper
+from .helper.strm.checkpoint import FullSyncCheckpoint
+from .helper.r302 import Redirect
 from .schemas.offline import (
     OfflineTasksPayload,
     AddOfflineTaskPayload,
@@ -43,7 +46,15 @@ from .schemas.u115 import (
     UserStorageStatusResponse,
     StorageInfo,
 )
-from .schemas.plugin import PluginStatusData, LifeEventCheckData, LifeEventCheckSummary
+from .schemas.plugin import (
+    PluginStatusData,
+    LifeEventCheckData,
+    LifeEventCheckSummary,
+    FullSyncCheckpointData,
+    DbStorageReportData,
+    DbCompactExtraData,
+    RedirectStatsData,
+)
 from .schemas.api import ApiResponse
 from .schemas.share import ShareApiData, ShareResponseData, ShareSaveParent
 from .schemas.strm_api import (
@@ -779,7 +790,7 @@ class Api:
         )
 
     @staticmethod
-    def _resolve_pickcode_from_args(
+    async def _resolve_pickcode_from_args(
         args: str, pickcode: str
     ) -> tuple[Optional[str], Optional[Response]]:
         """
@@ -805,7 +816,7 @@ class Api:
                 if path_to_use and not path_to_use.startswith("/"):
                     path_to_use = "/" + path_to_use
                 try:
-                    resolved_pickcode = get_pickcode_by_path(
+                    resolved_pickcode = await async_get_pickcode_by_path(
                         servicer.client, path_to_use
                     )
                     if not resolved_pickcode:
@@ -849,7 +860,7 @@ class Api:
         """
         115 网盘 302 跳转 (GET)
         """
-        resolved_pickcode, error_response = Api._resolve_pickcode_from_args(
+        resolved_pickcode, error_response = await Api._resolve_pickcode_from_args(
             args, pickcode
         )
         if error_response:
@@ -871,7 +882,7 @@ class Api:
         """
         115 网盘 302 跳转 (POST)
         """
-        resolved_pickcode, error_response = Api._resolve_pickcode_from_args(
+        resolved_pickcode, error_response = await Api._resolve_pickcode_from_args(
             args, pickcode
         )
         if error_response:
@@ -893,7 +904,7 @@ class Api:
         """
         115 网盘 302 跳转 (HEAD)
         """
-        resolved_pickcode, error_response = Api._resolve_pickcode_from_args(
+        resolved_pickcode, error_response = await Api._resolve_pickcode_from_args(
             args, pickcode
         )
         if error_response:
@@ -903,15 +914,27 @@ class Api:
         )
 
     @staticmethod
-    def trigger_full_sync_api() -> ApiResponse:
+    def trigger_full_sync_api(
+        mode: str = "full",
+    ) -> ApiResponse[List[FullSyncCheckpointData]]:
         """
         触发全量同步
+
+        :param mode: full 重新全量同步；resume 从上次中断的断点继续
         """
         try:
             if not configer.get_config("enabled") or not configer.get_config("cookies"):
                 return ApiResponse(code=1, msg="插件未启用或未配置cookie")
-            servicer.start_full_sync()
-            return ApiResponse(msg="全量同步任务已启动")
+            if mode not in ("full", "resume"):
+                return ApiResponse(code=1, msg=f"不支持的全量同步模式: {mode}")
+            checkpoints = [
+                FullSyncCheckpointData(**summary)
+                for summary in FullSyncCheckpoint.list_all()
+            ]
+            servicer.start_full_sync(resume=mode == "resume")
+            if mode == "resume":
+                return ApiResponse(msg="全量同步任务已从断点启动", data=checkpoints)
+            return ApiResponse(msg="全量同步任务已启动", data=checkpoints)
         except Exception as e:
             return ApiResponse(code=1, msg=f"启动全量同步任务失败: {str(e)}")
 
@@ -949,6 +972,7 @@ class Api:
         清理文件路径ID缓存
         """
         idpathcacher.clear()
+        pathpickcodecacher.clear()
         return ApiResponse(msg="文件路径ID缓存已清理")
 
     @staticmethod
@@ -960,6 +984,40 @@ class Api:
         directory_cache.clear_group("increment_skip")
         return ApiResponse(msg="增量同步跳过路径缓存已清理")
 
+    @staticmethod
+    def db_storage_report_api() -> ApiResponse[DbStorageReportData]:
+        """
+        获取数据库空间占用报告
+        """
+        try:
+            report = FileDbHelper().get_storage_report()
+        except Exception as e:
+            return ApiResponse(code=1, msg=f"获取数据库空间占用失败: {str(e)}")
+        return ApiResponse(data=DbStorageReportData(**report))
+
+    @staticmethod
+    def db_compact_extra_api() -> ApiResponse[DbCompactExtraData]:
+        """
+        按当前存储模式重新编码已有的 files.extra
+        """
+        try:
+            result = FileDbHelper().compact_extra()
+        except Exception as e:
+            return ApiResponse(code=1, msg=f"重新编码 extra 失败: {str(e)}")
+        return ApiResponse(data=DbCompactExtraData(**result))
+
+    @staticmethod
+    def redirect_stats_api() -> ApiResponse[RedirectStatsData]:
+        """
+        获取 302 跳转服务统计
+        """
+        return ApiResponse(
+            data=RedirectStatsData(
+                downurl_flight=Redirect.downurl_flight.stats(),
+                prewarm=Redirect.prewarmer.stats(),
+            )
+        )
+
     @staticmethod
     def get_status_api() -> ApiResponse[PluginStatusData]:
         """
@@ -1151,10 +1209,20 @@ class Api:
 
         debug_info.append("6. MonitorLife实例状态")
         monitorlife = servicer.monitorlife
+        poll_stats = monitorlife.poller.stats() if monitorlife else {}
         if monitorlife:
             debug_info.append("   实例存在: 是")
             client_associated = "是" if monitorlife._client else "否"
             debug_info.append(f"   客户端关联: {client_associated}")
+            debug_info.append(
+                f"   拉取间隔: {poll_stats['interval']:.1f}s "
+                f"(范围 {poll_stats['min_interval']:.0f}-{poll_stats['max_interval']:.0f}s，"
+                f"连续空闲 {poll_stats['idle_pulls']} 次)"
+            )
+            event_lag = poll_stats["last_event_lag"]
+            debug_info.append(
+                f"   事件延迟: {f'{event_lag:.1f}s' if event_lag is not None else '暂无事件'}"
+            )
 
             test_client = monitorlife._client if monitorlife._client else client
             if test_client:
@@ -1242,6 +1310,8 @@ class Api:
                         monitor_life_thread and monitor_life_thread.is_alive()
                     ),
                     config_valid=should_run,
+                    poll_interval=poll_stats.get("interval"),
+                    event_lag=poll_stats.get("last_event_lag"),
                 ),
             ),
         )
@@ -1,23 +1,46 @@
 __all__ = [
     "idpathcacher",
+    "pathpickcodecacher",
+    "folderpathcacher",
+    "dbitemcacher",
     "pantransfercacher",
     "lifeeventcacher",
     "r302cacher",
     "DirectoryCache",
     "OofFastMiCache",
+    "StrmFingerprintCache",
     "IntKeyCacheAdapter",
 ]
 
 
+import asyncio
+import posixpath
 from abc import ABC, abstractmethod
 from base64 import b64encode, b64decode
+from io import BytesIO
+from hashlib import blake2b
+from itertools import chain
 from pathlib import Path
-from typing import List, Dict, MutableMapping, Optional, Union, Set, Any
+from shutil import copyfileobj
+from threading import Lock
+from typing import (
+    List,
+    Dict,
+    MutableMapping,
+    Optional,
+    Union,
+    Set,
+    Any,
+    Iterable,
+    Tuple,
+    Callable,
+)
 from time import time
 
 from cachetools import TTLCache as MemoryTTLCache
 from diskcache import Cache as DiskCache
 from orjson import dumps
+from zstandard import ZstdDecompressor
 
 from app.core.cache import LRUCache, TTLCache, AsyncCache
 from app.core.config import settings
@@ -76,15 +99,417 @@ class IdPathCache:
         self.dir_to_id.clear()
 
 
+class PathPickcodeCache:
+    """
+    路径 pick_code 缓存
+    """
+
+    def __init__(self, maxsize=65536, ttl=1800):
+        """
+        :param maxsize: 缓存可以容纳的最大条目数
+        :param ttl: 缓存有效期（秒），到期后重新解析以感知网盘侧的移动与删除
+        """
+        self._cache: MutableMapping[str, str] = MemoryTTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, path: str) -> Optional[str]:
+        """
+        通过路径获取 pick_code
+        """
+        return self._cache.get(path)
+
+    def set(self, path: str, pickcode: str):
+        """
+        添加缓存
+        """
+        self._cache[path] = pickcode
+
+    def delete(self, path: str):
+        """
+        删除缓存
+        """
+        self._cache.pop(path, None)
+
+    def clear(self):
+        """
+        清空所有缓存
+        """
+        self._cache.clear()
+
+
+class FolderPathCache:
+    """
+    数据库文件夹 ID 路径映射
+
+    启动时从 folders 表载入，并在文件夹写入提交后、删除与移动时同步更新，
+    用于跳过已入库且路径未变化的祖先文件夹；按父路径索引子路径，
+    删除与移动子树只遍历子树本身
+    """
+
+    def __init__(self):
+        self._paths: Dict[int, str] = {}
+        # 路径 -> ID
+        self._ids: Dict[str, int] = {}
+        # 父路径 -> 子路径，包含未入库的中间路径
+        self._children: Dict[str, Set[str]] = {}
+        self._lock = Lock()
+
+    def _link(self, path: str):
+        while True:
+            parent = posixpath.dirname(path)
+            if parent == path:
+                return
+            children = self._children.setdefault(parent, set())
+            if path in children:
+                return
+            children.add(path)
+            path = parent
+
+    def _set(self, folder_id: int, path: str):
+        old_path = self._paths.get(folder_id)
+        if old_path == path:
+            return
+        if old_path is not None and self._ids.get(old_path) == folder_id:
+            del self._ids[old_path]
+        other_id = self._ids.get(path)
+        if other_id is not None and other_id != folder_id:
+            self._paths.pop(other_id, None)
+        self._paths[folder_id] = path
+        self._ids[path] = folder_id
+        self._link(path)
+
+    def _detach(self, path: str) -> List[str]:
+        """
+        从索引中摘除路径及其子树
+
+        :return: 子树内的所有路径
+        """
+        siblings = self._children.get(posixpath.dirname(path))
+        if siblings is not None:
+            siblings.discard(path)
+        nodes, stack = [], [path]
+        while stack:
+            node = stack.pop()
+            nodes.append(node)
+            stack.extend(self._children.pop(node, ()))
+        return nodes
+
+    def seed(self, items: Iterable[Tuple[int, str]]) -> int:
+        """
+        使用数据库中的 (id, path) 重建映射
+
+        :return: 载入的条目数
+        """
+        with self._lock:
+            self._paths, self._ids, self._children = {}, {}, {}
+            for folder_id, path in items:
+                self._set(int(folder_id), path)
+            return len(self._paths)
+
+    def get(self, folder_id: Union[int, str]) -> Optional[str]:
+        """
+        获取文件夹路径
+        """
+        return self._paths.get(int(folder_id))
+
+    def is_known(self, folder_id: Union[int, str], path: str) -> bool:
+        """
+        文件夹是否已按相同路径入库
+        """
+        return self._paths.get(int(folder_id)) == path
+
+    def update(self, items: Iterable[Dict[str, Any]]):
+        """
+        记录已写入数据库的文件夹
+        """
+        with self._lock:
+            for item in items:
+                self._set(int(item["id"]), item["path"])
+
+    def remove(self, folder_id: Union[int, str]):
+        """
+        删除文件夹及其子文件夹
+        """
+        path = self._paths.get(int(folder_id))
+        if path is None:
+            return
+        self.remove_subtree(path)
+
+    def remove_subtree(self, path: str):
+        """
+        删除路径及其下所有文件夹
+        """
+        path = path.rstrip("/") or "/"
+        with self._lock:
+            for node in self._detach(path):
+                folder_id = self._ids.pop(node, None)
+                if folder_id is not None:
+                    self._paths.pop(folder_id, None)
+
+    def move_subtree(self, old_path: str, new_path: str):
+        """
+        同步文件夹移动或重命名后的子树路径
+        """
+        old_path = old_path.rstrip("/") or "/"
+        new_path = new_path.rstrip("/") or "/"
+        old_prefix = old_path.rstrip("/") + "/"
+        new_prefix = new_path.rstrip("/") + "/"
+        with self._lock:
+            moved = []
+            for node in self._detach(old_path):
+                folder_id = self._ids.pop(node, None)
+                if folder_id is None:
+                    continue
+                if node == old_path:
+                    moved.append((folder_id, new_path))
+                else:
+                    moved.append((folder_id, new_prefix + node[len(old_prefix) :]))
+            for folder_id, path in moved:
+                self._set(folder_id, path)
+
+    def clear(self):
+        """
+        清空所有缓存
+        """
+        with self._lock:
+            self._paths, self._ids, self._children = {}, {}, {}
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+
+class _EvictingTTLCache(MemoryTTLCache):
+    """
+    条目被淘汰或过期时回调的 TTLCache
+    """
+
+    def __init__(self, maxsize: int, ttl: int, on_evict: Callable[[Any, Any], None]):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self._on_evict = on_evict
+
+    def popitem(self):
+        key, value = super().popitem()
+        self._on_evict(key, value)
+        return key, value
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        for key, value in expired:
+            self._on_evict(key, value)
+        return expired
+
+
+class DbItemCache:
+    """
+    数据库文件与文件夹查询缓存
+
+    命中结果按 ID 存储，按 LRU 淘汰并在 ttl 后过期，路径索引随条目一起移除；
+    未命中结果只保留较短时间；写入数据库时按 ID 与路径失效
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 8192,
+        ttl: int = 600,
+        negative_maxsize: int = 4096,
+        negative_ttl: int = 30,
+    ):
+        """
+        :param maxsize: 命中结果的最大条目数
+        :param ttl: 命中结果的有效期（秒）
+        :param negative_maxsize: 未命中结果的最大条目数
+        :param negative_ttl: 未命中结果的有效期（秒）
+        """
+        self._items: MutableMapping[int, Dict] = _EvictingTTLCache(
+            maxsize=maxsize, ttl=ttl, on_evict=self._unindex
+        )
+        # 路径 -> ID
+        self._paths: Dict[str, int] = {}
+        self._misses: MutableMapping[Tuple[str, Any], bool] = MemoryTTLCache(
+            maxsize=negative_maxsize, ttl=negative_ttl
+        )
+        self._lock = Lock()
+        # 每次失效递增，查询期间发生写入时不回填缓存
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(kind: str, value: Any) -> Tuple[str, Any]:
+        if kind == "id":
+            value = int(value)
+        return kind, value
+
+    def _unindex(self, item_id: int, item: Dict):
+        path = item.get("path")
+        if path and self._paths.get(path) == item_id:
+            del self._paths[path]
+
+    def get(self, kind: str, value: Any) -> Tuple[bool, Optional[Dict]]:
+        """
+        读取缓存
+
+        :param kind: id 或 path
+        :param value: ID 或路径
+
+        :return: (是否命中, 数据副本)，命中且数据为 None 表示数据库中不存在
+        """
+        key = self._key(kind, value)
+        with self._lock:
+            item_id = key[1] if kind == "id" else self._paths.get(key[1])
+            item = self._items.get(item_id) if item_id is not None else None
+            if item is not None:
+                self.hits += 1
+                return True, dict(item)
+            if key in self._misses:
+                self.hits += 1
+                return True, None
+            self.misses += 1
+        return False, None
+
+    def set(self, kind: str, value: Any, item: Optional[Dict], version: int):
+        """
+        写入查询结果，查询开始后缓存已失效时放弃写入
+
+        :param version: 查询开始前的 version
+        """
+        key = self._key(kind, value)
+        with self._lock:
+            if version != self.version:
+                return
+            if item is None:
+                self._misses[key] = True
+                return
+            item = dict(item)
+            item_id = int(item["id"])
+            self._drop_id(item_id)
+            path = item.get("path")
+            if path:
+                self._drop_path(path)
+            self._items[item_id] = item
+            if path and item_id in self._items:
+                self._paths[path] = item_id
+
+    def _drop_id(self, item_id: int):
+        self._misses.pop(("id", item_id), None)
+        item = self._items.pop(item_id, None)
+        if item is not None:
+            self._unindex(item_id, item)
+
+    def _drop_path(self, path: str):
+        self._misses.pop(("path", path), None)
+        item_id = self._paths.pop(path, None)
+        if item_id is not None:
+            self._items.pop(item_id, None)
+
+    def invalidate(self, ids: Iterable[Any] = (), paths: Iterable[str] = ()):
+        """
+        失效指定 ID 与路径的缓存
+        """
+        with self._lock:
+            self.version += 1
+            for rid in ids:
+                self._drop_id(int(rid))
+            for path in paths:
+                self._drop_path(path)
+
+    def invalidate_rows(self, rows: Iterable[Dict]):
+        """
+        失效一批写入数据涉及的缓存
+        """
+        ids, paths = [], []
+        for row in rows:
+            ids.append(row["id"])
+            if row.get("path"):
+                paths.append(row["path"])
+        self.invalidate(ids, paths)
+
+    def clear(self):
+        """
+        清空所有缓存
+        """
+        with self._lock:
+            self.version += 1
+            self._items.clear()
+            self._paths.clear()
+            self._misses.clear()
+
+
 class PanTransferCache:
     """
     网盘整理缓存
+
+    生活事件按媒体目录并行处理，读写均需通过加锁的方法进行
     """
 
     def __init__(self):
         self.delete_pan_transfer_list = []
         self.creata_pan_transfer_list = []
         self.top_delete_pan_transfer_list: Dict[str, List] = {}
+        self._lock = Lock()
+
+    def add_delete(self, file_id: Union[int, str]):
+        """
+        缓存整理时将被删除的文件夹 ID
+        """
+        with self._lock:
+            if str(file_id) not in self.delete_pan_transfer_list:
+                self.delete_pan_transfer_list.append(str(file_id))
+
+    def add_creata(self, file_id: Union[int, str]):
+        """
+        缓存整理后将被创建的文件 ID
+        """
+        with self._lock:
+            if str(file_id) not in self.creata_pan_transfer_list:
+                self.creata_pan_transfer_list.append(str(file_id))
+
+    def pop_delete(self, file_id: Union[int, str]) -> bool:
+        """
+        命中删除缓存时移除并返回 True
+        """
+        with self._lock:
+            if str(file_id) not in self.delete_pan_transfer_list:
+                return False
+            self.delete_pan_transfer_list.remove(str(file_id))
+            return True
+
+    def pop_creata(self, file_id: Union[int, str]) -> bool:
+        """
+        命中创建缓存时移除并返回 True
+        """
+        with self._lock:
+            if str(file_id) not in self.creata_pan_transfer_list:
+                return False
+            self.creata_pan_transfer_list.remove(str(file_id))
+            return True
+
+    def merge_top_delete(self, top_id: Union[int, str], file_ids: List[str]):
+        """
+        记录顶层目录下待整理的文件 ID，已存在时合并
+        """
+        with self._lock:
+            existing = self.top_delete_pan_transfer_list.get(str(top_id), [])
+            self.top_delete_pan_transfer_list[str(top_id)] = list(
+                dict.fromkeys(chain(file_ids, existing))
+            )
+
+    def finish_top_delete(self, file_id: Union[int, str]) -> Optional[str]:
+        """
+        标记文件整理完成
+
+        :return: 所在顶层目录下文件全部整理完成时返回顶层目录 ID
+        """
+        with self._lock:
+            for key, item_list in self.top_delete_pan_transfer_list.items():
+                if str(file_id) not in item_list:
+                    continue
+                remaining = [item for item in item_list if item != str(file_id)]
+                if remaining:
+                    self.top_delete_pan_transfer_list[key] = remaining
+                    return None
+                del self.top_delete_pan_transfer_list[key]
+                return key
+        return None
 
 
 class LifeEventCache:
@@ -113,6 +538,10 @@ class R302Cache:
         """
         self._cache = AsyncCache(maxsize=maxsize)
         self.region = "p115strmhelper_r302_cache"
+        # pick_code -> {ua_code: expires_time} 二级索引，随条目一同过期；
+        # 条目被提前淘汰时索引不会同步移除，读取时再校验
+        self.index_region = "p115strmhelper_r302_cache_index"
+        self._index_lock = asyncio.Lock()
 
     @classmethod
     def _make_key(cls, pick_code: str, ua_code: str) -> str:
@@ -142,6 +571,25 @@ class R302Cache:
             ttl=int(expires_time - time()),
             region=self.region,
         )
+        async with self._index_lock:
+            now = time()
+            index: Dict[str, float] = (
+                await self._cache.get(key=pick_code, region=self.index_region) or {}
+            )
+            index = {ua: expires for ua, expires in index.items() if expires > now}
+            index[ua_code] = expires_time
+            await self._save_index(pick_code, index, now)
+
+    async def _save_index(self, pick_code: str, index: Dict[str, float], now: float):
+        if not index:
+            await self._cache.delete(key=pick_code, region=self.index_region)
+            return
+        await self._cache.set(
+            key=pick_code,
+            value=index,
+            ttl=max(int(max(index.values()) - now), 1),
+            region=self.index_region,
+        )
 
     async def get(self, pick_code, ua_code) -> Optional[str]:
         """
@@ -164,20 +612,28 @@ class R302Cache:
 
         :return: 匹配的缓存条目数量
         """
-        count = 0
-        pick_code_len = len(pick_code)
-        async for key_str, _ in self._cache.items(region=self.region):  # noqa
-            if not key_str.startswith(pick_code):
-                continue
-            if len(key_str) > pick_code_len:
-                count += 1
-        return count
+        async with self._index_lock:
+            index: Dict[str, float] = await self._cache.get(
+                key=pick_code, region=self.index_region
+            )
+            if not index:
+                return 0
+            now = time()
+            live = {
+                ua: expires
+                for ua, expires in index.items()
+                if expires > now and await self.get(pick_code, ua) is not None
+            }
+            if len(live) != len(index):
+                await self._save_index(pick_code, live, now)
+            return len(live)
 
     async def clear(self):
         """
         清空所有缓存
         """
         await self._cache.clear(region=self.region)
+        await self._cache.clear(region=self.index_region)
 
 
 class BaseCacheDirectory(ABC):
@@ -313,8 +769,15 @@ class DirectoryCache:
 class OofFastMiCache:
     """
     OOF 快速媒体信息文件缓存器
+
+    同时作为以 sha1 为键的本地内容仓库，保存下载过的媒体信息文件原始内容
     """
 
+    # 内容仓库键前缀，与 OOF 压缩数据区分
+    blob_prefix = "blob:"
+    # 内容仓库单个文件大小上限
+    blob_max_size = 16 * 1024 * 1024
+
     def __init__(self, cache_dir: Path):
         """
         初始化缓存器
@@ -333,6 +796,98 @@ class OofFastMiCache:
             sqlite_cache_size=131072,
         )
 
+        self.hits = 0
+        self.misses = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.blob_hits = 0
+        self.blob_misses = 0
+
+    def _open(self, key: str):
+        """
+        以文件对象形式读取缓存值，内联存储的小数据包装为 BytesIO
+        """
+        value = self.cache.get(key, read=True)
+        if isinstance(value, bytes):
+            return BytesIO(value)
+        return value
+
+    def set_blob(self, sha1: str, file_path: Path) -> bool:
+        """
+        将文件内容存入内容仓库
+
+        :param sha1: 文件 sha1
+        :param file_path: 文件路径
+
+        :return: 是否写入
+        """
+        if not sha1:
+            return False
+        try:
+            if file_path.stat().st_size > self.blob_max_size:
+                return False
+            with open(file_path, "rb") as f:
+                self.cache.set(self.blob_prefix + sha1, f, read=True)
+        except OSError:
+            return False
+        return True
+
+    def write_blob(self, sha1: str, file_path: Path) -> bool:
+        """
+        将内容仓库中的数据写入目标文件
+
+        :param sha1: 文件 sha1
+        :param file_path: 目标文件路径
+
+        :return: 是否命中
+        """
+        reader = self._open(self.blob_prefix + sha1) if sha1 else None
+        if reader is None:
+            self.blob_misses += 1
+            return False
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = file_path.with_name(f".{file_path.name}.tmp")
+        with reader, open(tmp_path, "wb") as f:
+            copyfileobj(reader, f)
+        tmp_path.replace(file_path)
+        self.blob_hits += 1
+        return True
+
+    def blob_stats(self) -> Dict[str, Any]:
+        """
+        内容仓库命中统计
+        """
+        total = self.blob_hits + self.blob_misses
+        return {
+            "hits": self.blob_hits,
+            "misses": self.blob_misses,
+            "hit_rate": self.blob_hits / total if total else 0.0,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        OOF 缓存命中与读写字节统计
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+        }
+
+    def reset_stats(self):
+        """
+        重置 OOF 缓存与内容仓库统计
+        """
+        self.hits = 0
+        self.misses = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.blob_hits = 0
+        self.blob_misses = 0
+
     def batch_set(self, items: List[Any | Dict]):
         """
         批量写入
@@ -350,26 +905,110 @@ class OofFastMiCache:
                 if isinstance(sha1_key, str) and isinstance(compressed_data, bytes):
                     self.cache.set(sha1_key, compressed_data)
 
-    def batch_get(self, sha1_keys: List[str]) -> bytes:
+    def batch_get_bytes(self, sha1_keys: Iterable[str]) -> Dict[str, Optional[bytes]]:
         """
-        批量获取
+        批量获取压缩数据
+
+        :return: {sha1: 压缩数据}，未命中为 None
         """
-        results = {}
-        retrieved_items = {}
+        results: Dict[str, Optional[bytes]] = {}
         for key in sha1_keys:
             value = self.cache.get(key)
-            if value is not None:
-                retrieved_items[key] = value
-        results.update(
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.bytes_read += len(value)
+            results[key] = value
+        return results
+
+    def batch_get(self, sha1_keys: List[str]) -> bytes:
+        """
+        批量获取，返回 base64 编码的 JSON 数据
+        """
+        return dumps(
             {
-                key: b64encode(value).decode("utf-8")
-                for key, value in retrieved_items.items()
+                key: b64encode(value).decode("utf-8") if value is not None else None
+                for key, value in self.batch_get_bytes(sha1_keys).items()
             }
         )
-        missed_keys = set(sha1_keys) - set(retrieved_items)
-        for key in missed_keys:
-            results[key] = None
-        return dumps(results)
+
+    def write_decompressed(self, sha1: str, file_path: Path) -> bool:
+        """
+        将缓存的压缩数据流式解压写入目标文件
+
+        :param sha1: 文件 sha1
+        :param file_path: 目标文件路径
+
+        :return: 是否命中
+        """
+        reader = self._open(sha1)
+        if reader is None:
+            self.misses += 1
+            return False
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = file_path.with_name(f".{file_path.name}.tmp")
+        try:
+            with reader, open(tmp_path, "wb") as f:
+                read_size, write_size = ZstdDecompressor().copy_stream(reader, f)
+            tmp_path.replace(file_path)
+        except Exception:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        self.hits += 1
+        self.bytes_read += read_size
+        self.bytes_written += write_size
+        return True
+
+    def close(self):
+        self.cache.close()
+
+
+class StrmFingerprintCache:
+    """
+    STRM 内容指纹缓存器，记录 本地 STRM 路径 → 渲染后内容的哈希
+    """
+
+    def __init__(self, cache_dir: Path):
+        """
+        初始化缓存器
+
+        :param cache_dir: 缓存文件在磁盘上存储的目录
+        """
+        if not cache_dir.exists():
+            cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self.cache = DiskCache(
+            cache_dir.as_posix(),
+            size_limit=4 * (1024**3),
+            sqlite_journal_mode="WAL",
+            sqlite_synchronous="NORMAL",
+            sqlite_mmap_size=2**28,
+        )
+
+    @staticmethod
+    def fingerprint(content: str) -> bytes:
+        """
+        计算内容指纹
+        """
+        return blake2b(content.encode("utf-8"), digest_size=16).digest()
+
+    def batch_get(self, paths: Iterable[str]) -> Dict[str, Optional[bytes]]:
+        """
+        批量获取指纹
+        """
+        return {path: self.cache.get(path) for path in paths}
+
+    def batch_set(self, items: Dict[str, bytes]):
+        """
+        批量写入指纹
+        """
+        with self.cache.transact():
+            for path, fingerprint in items.items():
+                self.cache.set(path, fingerprint)
+
+    def clear(self):
+        self.cache.clear()
 
     def close(self):
         self.cache.close()
@@ -406,6 +1045,11 @@ class IntKeyCacheAdapter(MutableMapping[int, Any]):
 
 
 idpathcacher = IdPathCache(maxsize=4096)
+pathpickcodecacher = PathPickcodeCache(maxsize=65536, ttl=1800)
+folderpathcacher = FolderPathCache()
+dbitemcacher = DbItemCache(
+    maxsize=8192, ttl=600, negative_maxsize=4096, negative_ttl=30
+)
 pantransfercacher = PanTransferCache()
 lifeeventcacher = LifeEventCache()
 r302cacher = R302Cache(maxsize=8096)
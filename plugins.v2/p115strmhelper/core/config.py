@@ -146,6 +146,19 @@ class ConfigManager(BaseModel):
         default="P115StrmHelper", min_length=1, description="插件名称"
     )
     DB_WAL_ENABLE: bool = Field(default=True, description="是否开启数据库WAL模式")
+    DB_FILES_EXTRA_MODE: Literal["full", "compact", "zstd", "none"] = Field(
+        default="compact",
+        description="文件表 extra 字段存储模式：full 完整/compact 精简/zstd 精简压缩/none 不存储",
+    )
+    DB_WRITE_BEHIND_ENABLE: bool = Field(
+        default=False, description="是否开启数据库延迟批量写入"
+    )
+    DB_WRITE_BEHIND_BATCH_SIZE: int = Field(
+        default=500, ge=1, description="数据库延迟写入单次提交的最大条目数"
+    )
+    DB_WRITE_BEHIND_INTERVAL: float = Field(
+        default=1.0, ge=0, description="数据库延迟写入的最长提交间隔（秒）"
+    )
     PLUGIN_CONFIG_PATH: Path = Field(
         default_factory=lambda: ConfigManager._get_default_plugin_config_path(),
         description="插件配置目录",
@@ -266,6 +279,18 @@ class ConfigManager(BaseModel):
     full_sync_process_rust: bool = Field(
         default=False, description="全量同步处理数据使用 rust 模块"
     )
+    full_sync_io_workers_min: int = Field(
+        default=2, ge=1, description="全量同步 STRM 写入最小线程数"
+    )
+    full_sync_io_workers_max: int = Field(
+        default=32, ge=1, description="全量同步 STRM 写入最大线程数"
+    )
+    full_sync_skip_unchanged_strm: bool = Field(
+        default=True, description="全量同步跳过内容未变化的 STRM 文件"
+    )
+    directory_tree_memory_budget: int = Field(
+        default=64, ge=1, description="目录树外部排序内存预算（MB）"
+    )
 
     increment_sync_strm_enabled: bool = Field(default=False, description="增量同步开关")
     increment_sync_auto_download_mediainfo_enabled: bool = Field(
@@ -292,6 +317,9 @@ class ConfigManager(BaseModel):
     increment_sync_mediaservers: Optional[List[str]] = Field(
         default=None, description="刷新媒体服务器"
     )
+    increment_sync_export_workers: int = Field(
+        default=1, ge=1, description="增量同步并发导出网盘目录树的根路径数量"
+    )
     increment_sync_min_file_size: Optional[int] = Field(
         default=None, ge=0, description="增量生成最小文件大小"
     )
@@ -336,6 +364,15 @@ class ConfigManager(BaseModel):
     monitor_life_event_wait_time: int = Field(
         default=0, ge=0, description="生活事件事件等待时间"
     )
+    monitor_life_poll_min_interval: int = Field(
+        default=2, ge=1, description="生活事件最小拉取间隔（秒）"
+    )
+    monitor_life_poll_max_interval: int = Field(
+        default=20, ge=1, description="生活事件空闲时最大拉取间隔（秒）"
+    )
+    monitor_life_event_workers: int = Field(
+        default=4, ge=1, description="生活事件按顶层媒体目录并行处理的线程数"
+    )
 
     share_strm_config: List[ShareStrmConfig] = Field(
         default_factory=list, description="分享 STRM 生成配置"
@@ -432,6 +469,16 @@ class ConfigManager(BaseModel):
     )
 
     same_playback: bool = Field(default=False, description="多端播放同一个文件")
+    redirect_prewarm_enabled: bool = Field(
+        default=False,
+        description="302 跳转预热同目录后续文件下载地址（多端播放开启时不生效）",
+    )
+    redirect_prewarm_count: int = Field(
+        default=2, ge=1, description="302 跳转每次预热的后续文件数量"
+    )
+    redirect_prewarm_budget: int = Field(
+        default=20, ge=1, description="302 跳转每分钟最多预热的下载地址数量"
+    )
 
     error_info_upload: bool = Field(default=True, description="上传错误信息")
     upload_module_enhancement: bool = Field(default=False, description="115 上传增强")
@@ -498,6 +545,16 @@ class ConfigManager(BaseModel):
     mediainfo_download_blacklist: Optional[List] = Field(
         default=None, description="媒体信息文件下载黑名单"
     )
+    mediainfo_download_rate: float = Field(
+        default=4.0, ge=0, description="媒体信息文件下载速率（个/秒），0 为不限速"
+    )
+    mediainfo_download_concurrency: int = Field(
+        default=8, ge=1, description="媒体信息文件最大并发下载连接数"
+    )
+    mediainfo_download_dedup_hardlink: bool = Field(
+        default=False,
+        description="相同 sha1 的媒体信息文件使用硬链接，关闭时复制",
+    )
     strm_url_encode: bool = Field(default=False, description="STRM URL 文件名称编码")
 
     sync_del_enabled: bool = Field(default=False, description="同步删除开关")
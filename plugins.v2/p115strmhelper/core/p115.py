@@ -4,9 +4,11 @@ __all__ = [
     "iter_share_files_with_path",
     "get_pid_by_path",
     "get_pickcode_by_path",
+    "async_get_pickcode_by_path",
 ]
 
 
+import asyncio
 from dataclasses import dataclass
 from itertools import cycle
 from os import PathLike
@@ -29,9 +31,10 @@ from p115client import P115Client, check_response
 from p115client.util import complete_url, posix_escape_name
 from p115client.tool.attr import normalize_attr, get_id
 
-from ..core.cache import idpathcacher
+from ..core.cache import idpathcacher, pathpickcodecacher
 from ..db_manager.oper import FileDbHelper
 from ..utils.limiter import ApiEndpointCooldown
+from ..utils.singleflight import AsyncSingleFlight
 
 
 class ShareP115Client(P115Client):
@@ -294,6 +297,25 @@ def get_pid_by_path(
     return -1
 
 
+def get_pickcode_by_path_local(
+    client: P115Client,
+    path: str,
+) -> Optional[str]:
+    """
+    仅通过本地数据库与路径 ID 缓存获取 pick_code，不发起网络请求
+    """
+    db_item = FileDbHelper().get_by_path(path)
+    if db_item:
+        try:
+            return db_item["pickcode"]
+        except ValueError:
+            return client.to_pickcode(db_item["id"])
+    folder_id = idpathcacher.get_id_by_dir(directory=path)
+    if folder_id:
+        return client.to_pickcode(folder_id)
+    return None
+
+
 def get_pickcode_by_path(
     client: P115Client,
     path: str | PathLike | Path,
@@ -301,16 +323,19 @@ def get_pickcode_by_path(
     """
     通过文件（夹）路径获取 pick_code
     """
-    db_helper = FileDbHelper()
     path = Path(path).as_posix()
     if path == "/":
         return None
-    db_item = db_helper.get_by_path(path)
-    if db_item:
-        try:
-            return db_item["pickcode"]
-        except ValueError:
-            return client.to_pickcode(db_item["id"])
+    pickcode = get_pickcode_by_path_local(client, path)
+    if pickcode:
+        return pickcode
+    return _get_pickcode_by_path_remote(client, path)
+
+
+def _get_pickcode_by_path_remote(client: P115Client, path: str) -> Optional[str]:
+    """
+    通过网盘接口获取 pick_code
+    """
     try:
         file_id = get_id(client=client, path=path)
         if file_id:
@@ -318,3 +343,31 @@ def get_pickcode_by_path(
         return None
     except Exception:
         return None
+
+
+_pickcode_flight = AsyncSingleFlight()
+
+
+async def async_get_pickcode_by_path(
+    client: P115Client,
+    path: str | PathLike | Path,
+) -> Optional[str]:
+    """
+    通过文件（夹）路径获取 pick_code（异步）
+
+    优先查询 TTL 缓存，未命中时在工作线程中依次查询本地数据库与网盘，
+    同一路径的并发请求只会发起一次查询
+    """
+    path = Path(path).as_posix()
+    if path == "/":
+        return None
+    pickcode = pathpickcodecacher.get(path)
+    if pickcode:
+        return pickcode
+    pickcode = await _pickcode_flight.do(
+        path,
+        lambda: asyncio.to_thread(get_pickcode_by_path, client, path),
+    )
+    if pickcode:
+        pathpickcodecacher.set(path, pickcode)
+    return pickcode
@@ -29,7 +29,6 @@ from oss2.exceptions import OssError
 from p115client import P115Client
 from p115client.tool.attr import normalize_attr
 from p115client.type import DirNode
-from cryptography.hazmat.primitives import hashes
 from diskcache import Deque
 
 from app import schemas
@@ -50,6 +49,7 @@ from ..utils.sentry import sentry_manager
 from ..utils.exception import U115NoCheckInException, CanNotFindPathToCid
 from ..utils.path import PathUtils
 from ..utils.limiter import RateLimiter
+from ..utils.hashing import FileHasher
 
 
 p115_open_lock = Lock()
@@ -69,6 +69,9 @@ class U115OpenHelper:
 
     retry_delay = 70
 
+    # 上传特征值计算，preid 为文件前 128 MiB 的 SHA1
+    hasher = FileHasher(preid_size=128 * 1024 * 1024)
+
     def __init__(self):
         super().__init__()
         self.session = Client(follow_redirects=True, timeout=20.0)
@@ -282,24 +285,6 @@ class U115OpenHelper:
             logger.error(f"【P115Open】解析下载链接失败: {e}")
             return None
 
-    @staticmethod
-    def _calc_sha1(filepath: Path, size: Optional[int] = None) -> str:
-        """
-        计算文件 SHA1
-
-        :param filepath: 文件路径
-        :param size: 前多少字节
-        """
-        sha1 = hashes.Hash(hashes.SHA1())
-        with open(filepath, "rb") as f:
-            if size:
-                chunk = f.read(size)
-                sha1.update(chunk)
-            else:
-                while chunk := f.read(8192):
-                    sha1.update(chunk)
-        return sha1.finalize().hex()
-
     @staticmethod
     def _can_write_db(path: Path) -> bool:
         """
@@ -447,9 +432,13 @@ class U115OpenHelper:
         target_name = new_name or local_path.name
         target_path = Path(target_dir.path) / target_name
         # 计算文件特征值
-        file_size = local_path.stat().st_size
-        file_sha1 = self._calc_sha1(local_path)
-        file_preid = self._calc_sha1(local_path, 128 * 1024 * 1024)
+        hash_start = perf_counter()
+        digest = self.hasher.digest(local_path)
+        file_size, file_sha1, file_preid = digest.size, digest.sha1, digest.preid
+        logger.debug(
+            f"【P115Open】{local_path} 特征值计算耗时 {perf_counter() - hash_start:.2f} 秒，"
+            f"缓存命中 {self.hasher.hits} 次"
+        )
 
         # 获取目标目录CID
         target_cid = target_dir.fileid
@@ -497,13 +486,8 @@ class U115OpenHelper:
                 end = int(sign_checks[1])
                 # 计算指定区间的SHA1
                 # sign_check （用下划线隔开,截取上传文内容的sha1）(单位是byte): "2392148-2392298"
-                with open(local_path, "rb") as f:
-                    # 取2392148-2392298之间的内容(包含2392148、2392298)的sha1
-                    f.seek(start)
-                    chunk = f.read(end - start + 1)
-                    sha1 = hashes.Hash(hashes.SHA1())
-                    sha1.update(chunk)
-                    sign_val = sha1.finalize().hex().upper()
+                # 取2392148-2392298之间的内容(包含2392148、2392298)的sha1
+                sign_val = self.hasher.range_sha1(local_path, start, end).upper()
                 second_sha1 = sign_val
                 # 重新初始化请求
                 # sign_key，sign_val(根据sign_check计算的值大写的sha1值)
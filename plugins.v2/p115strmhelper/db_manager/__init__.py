@@ -1,18 +1,24 @@
 from pathlib import Path
-from time import sleep
-from typing import Any, Generator, List, Optional, Self, Tuple
+from threading import Condition, Thread, current_thread
+from time import monotonic, sleep
+from typing import Any, Callable, Dict, Generator, List, Optional, Self, Tuple
 from sqlite3 import OperationalError as SqlOperationalError, SQLITE_BUSY
 
 from sqlalchemy import (
     create_engine,
     and_,
+    or_,
     inspect,
     event,
     NullPool,
     QueuePool,
     text,
     Engine,
+    delete,
+    update,
+    func,
 )
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import (
     declared_attr,
     sessionmaker,
@@ -151,6 +157,9 @@ class __DBManager:
         """
         关闭所有数据库连接并清理资源
         """
+        # 写入延迟队列中剩余的数据
+        ct_db_writer.stop()
+
         # 检查是否需要并可以执行 checkpoint
         if self.Engine and configer.get_config("DB_WAL_ENABLE"):
             logger.info("正在执行数据库关闭前的最终 checkpoint...")
@@ -190,6 +199,10 @@ def get_db() -> Generator:
             db.close()
 
 
+# 写入经过延迟写入队列的数据模型
+WRITE_BEHIND_MODELS = frozenset({"File", "Folder"})
+
+
 def get_args_db(args: tuple, kwargs: dict) -> Optional[Session]:
     """
     从参数中获取数据库Session对象
@@ -208,6 +221,40 @@ def get_args_db(args: tuple, kwargs: dict) -> Optional[Session]:
     return db
 
 
+def path_subtree_clause(column, path: str):
+    """
+    匹配路径本身及其所有子路径的条件
+
+    使用 ``path >= prefix/ AND path < prefix0`` 区间查询代替 ``LIKE 'prefix%'``，
+    可以直接命中 path 列上的唯一索引；同时不会误匹配 ``/a/bc`` 这类同名前缀的兄弟路径
+
+    :param column: 路径列
+    :param path: 路径
+    """
+    base = path.rstrip("/")
+    # "0" 为 "/" 的下一个字符，[base/, base0) 即为 base 下的全部子路径
+    return or_(column == base, and_(column >= base + "/", column < base + "0"))
+
+
+def subtree_path_update(model, old_path: str, new_path: str):
+    """
+    将 old_path 下所有子路径的前缀替换为 new_path 的 UPDATE 语句
+
+    不使用 OR REPLACE，目标路径已被占用时由唯一索引抛出 IntegrityError
+
+    :param model: 带 path 列的数据模型
+    :param old_path: 原路径
+    :param new_path: 新路径
+    """
+    old_base = old_path.rstrip("/")
+    return (
+        update(model)
+        .where(model.path >= old_base + "/", model.path < old_base + "0")
+        .values(path=new_path.rstrip("/") + func.substr(model.path, len(old_base) + 1))
+        .execution_options(synchronize_session=False)
+    )
+
+
 def update_args_db(args: tuple, kwargs: dict, db: Session) -> Tuple[tuple, dict]:
     """
     更新参数中的数据库Session对象，关键字传参时更新db的值，否则更新第1或第2个参数
@@ -255,15 +302,30 @@ def init_database() -> bool:
     return True
 
 
+def _session_held() -> bool:
+    """
+    当前线程的会话是否处于未结束的事务中
+    """
+    scoped = ct_db_manager.ScopedSession
+    return bool(scoped and scoped.registry.has() and scoped().in_transaction())
+
+
 def db_update(func):
     """
     数据库更新类操作装饰器，第一个参数必须是数据库会话或存在db参数
     """
 
+    # 延迟写入队列只承载文件与文件夹表
+    flush_first = func.__qualname__.partition(".")[0] in WRITE_BEHIND_MODELS
+
     def wrapper(*args, **kwargs):
         # 是否关闭数据库会话
         _close_db = False
         db = get_args_db(args, kwargs)
+        # 先写入延迟队列中的数据，保证写入顺序；
+        # 已持有会话时不等待，避免写入线程等待该会话释放数据库锁
+        if flush_first and not db and not _session_held():
+            ct_db_writer.flush()
         if not db:
             init_database()
             # 如果没有获取到数据库会话，创建一个
@@ -392,6 +454,317 @@ class P115StrmHelperBase(DeclarativeBase):
         return self.__name__.lower()
 
 
+class WriteBehindQueue:
+    """
+    数据库延迟写入队列
+
+    按 (表, 主键) 合并零散的写入与删除，由单独的写入线程按数量或时间阈值批量提交；
+    提交前的数据可通过 get_by_id / get_by_path 读取；提交成功后通知 on_commit 注册的回调，
+    提交失败的数据重新入队，超过重试次数后丢弃并通知 on_discard 注册的回调
+    """
+
+    # 单条数据的最大提交次数
+    MAX_ATTEMPTS = 3
+    # 提交失败后的等待时间（秒）
+    RETRY_DELAY = 1.0
+
+    def __init__(self):
+        self._cond = Condition()
+        # (表名, 主键) -> (模型, 数据)，数据为 None 表示删除
+        self._pending: Dict[Tuple[str, Any], Tuple[Any, Optional[Dict]]] = {}
+        self._inflight: Dict[Tuple[str, Any], Tuple[Any, Optional[Dict]]] = {}
+        # (表名, 路径) -> 主键
+        self._pending_paths: Dict[Tuple[str, str], Any] = {}
+        self._inflight_paths: Dict[Tuple[str, str], Any] = {}
+        # (表名, 主键) -> 已失败的提交次数
+        self._attempts: Dict[Tuple[str, Any], int] = {}
+        self._commit_hooks: List[
+            Callable[[List[Tuple[Any, Any, Optional[Dict]]]], None]
+        ] = []
+        self._discard_hooks: List[
+            Callable[[List[Tuple[Any, Any, Optional[Dict]]]], None]
+        ] = []
+        self._flush_waiters = 0
+        self._stopping = False
+        self._thread: Optional[Thread] = None
+        self.committed = 0
+        self.batches = 0
+        self.discarded = 0
+
+    @property
+    def enabled(self) -> bool:
+        """
+        是否启用延迟写入
+        """
+        return bool(configer.get_config("DB_WRITE_BEHIND_ENABLE"))
+
+    @property
+    def batch_size(self) -> int:
+        """
+        单次提交的最大条目数
+        """
+        return max(int(configer.get_config("DB_WRITE_BEHIND_BATCH_SIZE") or 1), 1)
+
+    @property
+    def interval(self) -> float:
+        """
+        最长提交间隔（秒）
+        """
+        return max(float(configer.get_config("DB_WRITE_BEHIND_INTERVAL") or 0), 0)
+
+    @staticmethod
+    def _key(table: str, rid: Any) -> Tuple[str, Any]:
+        if isinstance(rid, str) and rid.isdigit():
+            rid = int(rid)
+        return table, rid
+
+    def _in_writer(self) -> bool:
+        return self._thread is not None and current_thread() is self._thread
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = Thread(
+                target=self._run, name="p115strmhelper-db-writer", daemon=True
+            )
+            self._thread.start()
+
+    def on_commit(
+        self, callback: Callable[[List[Tuple[Any, Any, Optional[Dict]]]], None]
+    ):
+        """
+        注册数据提交成功后的回调，在写入线程中持有队列锁调用，
+        已被新操作覆盖的数据不会传入
+
+        :param callback: 参数为 (模型, 主键, 数据) 列表，数据为 None 表示删除
+        """
+        self._commit_hooks.append(callback)
+
+    def on_discard(
+        self, callback: Callable[[List[Tuple[Any, Any, Optional[Dict]]]], None]
+    ):
+        """
+        注册数据被丢弃时的回调
+
+        :param callback: 参数为 (模型, 主键, 数据) 列表，数据为 None 表示删除
+        """
+        self._discard_hooks.append(callback)
+
+    def upsert(self, model, rows: List[Dict]):
+        """
+        加入写入或更新数据
+
+        :param model: 数据模型
+        :param rows: 包含主键 id 的完整行数据
+        """
+        table = model.__tablename__
+        with self._cond:
+            for row in rows:
+                key = self._key(table, row["id"])
+                self._pending[key] = (model, row)
+                if row.get("path"):
+                    self._pending_paths[(table, row["path"])] = key[1]
+            self._ensure_thread()
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+
+    def delete(self, model, ids: List[Any]):
+        """
+        加入按主键删除
+
+        :param model: 数据模型
+        :param ids: 主键列表
+        """
+        table = model.__tablename__
+        with self._cond:
+            for rid in ids:
+                self._pending[self._key(table, rid)] = (model, None)
+            self._ensure_thread()
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+
+    def _lookup(self, table: str, rid: Any) -> Tuple[bool, Optional[Dict]]:
+        key = self._key(table, rid)
+        if key in self._pending:
+            return True, self._pending[key][1]
+        if key in self._inflight:
+            return True, self._inflight[key][1]
+        return False, None
+
+    def get_by_id(self, model, rid: Any) -> Tuple[bool, Optional[Dict]]:
+        """
+        读取尚未提交的数据
+
+        :return: (是否存在未提交的操作, 行数据)，行数据为 None 表示已删除
+        """
+        with self._cond:
+            return self._lookup(model.__tablename__, rid)
+
+    def get_by_path(self, model, path: str) -> Optional[Dict]:
+        """
+        通过路径读取尚未提交的数据
+        """
+        table = model.__tablename__
+        with self._cond:
+            for paths in (self._pending_paths, self._inflight_paths):
+                rid = paths.get((table, path))
+                if rid is None:
+                    continue
+                _, row = self._lookup(table, rid)
+                if row and row.get("path") == path:
+                    return row
+        return None
+
+    def shadows(self, model, rid: Any) -> bool:
+        """
+        数据库中的该行是否已被未提交的操作覆盖
+        """
+        with self._cond:
+            return self._lookup(model.__tablename__, rid)[0]
+
+    def flush(self):
+        """
+        等待队列中的数据全部提交
+        """
+        if self._in_writer():
+            return
+        with self._cond:
+            if not self._pending and not self._inflight:
+                return
+            self._ensure_thread()
+            self._flush_waiters += 1
+            try:
+                self._cond.notify_all()
+                while self._pending or self._inflight:
+                    self._cond.wait()
+            finally:
+                self._flush_waiters -= 1
+
+    def stop(self):
+        """
+        提交剩余数据并停止写入线程
+        """
+        self.flush()
+        with self._cond:
+            thread = self._thread
+            self._stopping = True
+            self._cond.notify_all()
+        if thread is not None and not self._in_writer():
+            thread.join(timeout=10)
+        self._thread = None
+        if self.batches or self.discarded:
+            logger.debug(
+                f"数据库延迟写入: 批次 {self.batches}，提交 {self.committed} 条，"
+                f"丢弃 {self.discarded} 条"
+            )
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                deadline = monotonic() + self.interval
+                while (
+                    len(self._pending) < self.batch_size
+                    and not self._flush_waiters
+                    and not self._stopping
+                ):
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                self._inflight, self._pending = self._pending, {}
+                self._inflight_paths, self._pending_paths = self._pending_paths, {}
+                batch = self._inflight
+            retry = False
+            try:
+                self._commit(None, batch)
+                self.committed += len(batch)
+                self.batches += 1
+                with self._cond:
+                    committed = []
+                    for key, (model, row) in batch.items():
+                        self._attempts.pop(key, None)
+                        if key not in self._pending:
+                            committed.append((model, key[1], row))
+                    self._call_hooks(self._commit_hooks, committed)
+            except Exception as e:
+                with self._cond:
+                    discarded = self._requeue(batch)
+                retry = len(discarded) < len(batch)
+                logger.error(
+                    f"数据库延迟写入失败，重新入队 {len(batch) - len(discarded)} 条，"
+                    f"丢弃 {len(discarded)} 条: {e}",
+                    exc_info=True,
+                )
+                self.discarded += len(discarded)
+                self._call_hooks(self._discard_hooks, discarded)
+            finally:
+                with self._cond:
+                    self._inflight = {}
+                    self._inflight_paths = {}
+                    self._cond.notify_all()
+            if retry:
+                sleep(self.RETRY_DELAY)
+
+    @staticmethod
+    def _call_hooks(hooks: List[Callable], rows: List[Tuple[Any, Any, Optional[Dict]]]):
+        if not rows:
+            return
+        for hook in hooks:
+            try:
+                hook(rows)
+            except Exception as e:
+                logger.error(f"数据库延迟写入回调失败: {e}", exc_info=True)
+
+    def _requeue(
+        self, batch: Dict[Tuple[str, Any], Tuple[Any, Optional[Dict]]]
+    ) -> List[Tuple[Any, Any, Optional[Dict]]]:
+        """
+        将提交失败的数据放回队列，已有更新操作的主键以新操作为准
+
+        :return: 超过重试次数被丢弃的 (模型, 主键, 数据)
+        """
+        discarded = []
+        requeued = set()
+        for key, (model, row) in batch.items():
+            attempts = self._attempts.pop(key, 0) + 1
+            if key in self._pending:
+                continue
+            if attempts >= self.MAX_ATTEMPTS:
+                discarded.append((model, key[1], row))
+                continue
+            self._attempts[key] = attempts
+            self._pending[key] = (model, row)
+            requeued.add(key)
+        for (table, path), rid in self._inflight_paths.items():
+            if (table, rid) in requeued:
+                self._pending_paths.setdefault((table, path), rid)
+        return discarded
+
+    @staticmethod
+    @db_update
+    def _commit(db: Session, batch: Dict[Tuple[str, Any], Tuple[Any, Optional[Dict]]]):
+        """
+        在一个事务中提交一批操作，先删除后写入
+        """
+        deletes: Dict[Any, List[Any]] = {}
+        upserts: Dict[Tuple[Any, Tuple[str, ...]], List[Dict]] = {}
+        for (_, rid), (model, row) in batch.items():
+            if row is None:
+                deletes.setdefault(model, []).append(rid)
+            else:
+                upserts.setdefault((model, tuple(sorted(row))), []).append(row)
+        for model, ids in deletes.items():
+            for i in range(0, len(ids), 500):
+                db.execute(delete(model).where(model.id.in_(ids[i : i + 500])))
+        for (model, _), rows in upserts.items():
+            db.execute(sqlite_insert(model).prefix_with("OR REPLACE"), rows)
+        return True
+
+
 class DbOper:
     """
     数据库操作基类
@@ -405,3 +778,5 @@ class DbOper:
 
 # 全局数据库会话
 ct_db_manager = __DBManager()
+# 全局数据库延迟写入队列
+ct_db_writer = WriteBehindQueue()
@@ -1,19 +1,107 @@
-from typing import Dict, Optional, List
+from ast import literal_eval
+from typing import Any, Dict, Optional, List, Set, Tuple
 from pathlib import Path
 
-from . import DbOper
+from orjson import dumps, loads
+from sqlalchemy.exc import IntegrityError
+from zstandard import ZstdCompressor, ZstdDecompressor
+
+from . import DbOper, ct_db_writer
 from .models.folder import Folder
 from .models.file import File
+from ..core.cache import dbitemcacher, folderpathcacher
+from ..core.config import configer
 from ..utils.exception import PathNotInKey
 
+from app.log import logger
 from app.schemas import FileItem
 
 
+# 已单独存为列或可由其它列推导的键，精简模式下不写入 extra
+EXTRA_REDUNDANT_KEYS = frozenset(
+    {
+        # iter_files_with_path
+        "id",
+        "parent_id",
+        "name",
+        "sha1",
+        "size",
+        "pickcode",
+        "pick_code",
+        "ctime",
+        "mtime",
+        "path",
+        "ancestors",
+        "top_ancestors",
+        # 115 原始数据
+        "fid",
+        "cid",
+        "n",
+        "sha",
+        "s",
+        "pc",
+        "tp",
+        "tu",
+        # 生活事件
+        "file_id",
+        "file_name",
+        "file_size",
+        "create_time",
+        "update_time",
+    }
+)
+
+
 class FileDbHelper(DbOper):
     """
     文件类数据库操作
     """
 
+    @staticmethod
+    def encode_extra(item: Optional[Dict]) -> Optional[str | bytes]:
+        """
+        按存储模式编码 files.extra
+
+        full: 完整 JSON；compact: 去除冗余键后的 JSON；
+        zstd: 精简 JSON 经 zstd 压缩后以 BLOB 存储；none: 不存储
+        """
+        if not item:
+            return None
+        mode = configer.DB_FILES_EXTRA_MODE
+        if mode == "none":
+            return None
+        if mode == "full":
+            return dumps(item, default=str).decode("utf-8")
+        compact = {
+            key: value
+            for key, value in item.items()
+            if key not in EXTRA_REDUNDANT_KEYS and value is not None
+        }
+        if not compact:
+            return None
+        data = dumps(compact, default=str)
+        if mode == "zstd":
+            return ZstdCompressor().compress(data)
+        return data.decode("utf-8")
+
+    @staticmethod
+    def decode_extra(extra: Optional[str | bytes]) -> Optional[Dict]:
+        """
+        解码 files.extra，兼容 JSON、zstd 压缩 JSON 与旧版本的 Python repr 格式
+        """
+        if not extra:
+            return None
+        try:
+            if isinstance(extra, bytes):
+                item = loads(ZstdDecompressor().decompress(extra))
+            elif extra.startswith('{"'):
+                item = loads(extra)
+            else:
+                item = literal_eval(extra)
+        except Exception:
+            return None
+        return item if isinstance(item, dict) else None
+
     @staticmethod
     def process_item(item: Dict) -> List[Dict]:
         """
@@ -25,9 +113,12 @@ class FileDbHelper(DbOper):
         results = []
         ancestors = item.get("ancestors", [])
 
-        # 处理祖先文件夹
-        for i, ancestor in enumerate(ancestors[1:-1], start=1):
-            path = "/" + "/".join(a["name"] for a in ancestors[1 : i + 1])
+        # 处理祖先文件夹，跳过已按相同路径入库的文件夹
+        path = ""
+        for ancestor in ancestors[1:-1]:
+            path = f"{path}/{ancestor['name']}"
+            if folderpathcacher.is_known(ancestor["id"], path):
+                continue
             results.append(
                 {
                     "table": "folders",
@@ -54,7 +145,7 @@ class FileDbHelper(DbOper):
                     "ctime": item.get("ctime", 0),
                     "mtime": item.get("mtime", 0),
                     "path": item.get("path"),
-                    "extra": str(item) if item else None,
+                    "extra": FileDbHelper.encode_extra(item),
                 },
             }
         )
@@ -79,7 +170,7 @@ class FileDbHelper(DbOper):
                     "ctime": event.get("create_time", 0),
                     "mtime": event.get("update_time", 0),
                     "path": str(file_path),
-                    "extra": str(event),
+                    "extra": FileDbHelper.encode_extra(event),
                 },
             }
         ]
@@ -135,7 +226,7 @@ class FileDbHelper(DbOper):
                         "ctime": item.get("tp", 0),
                         "mtime": item.get("tu", 0),
                         "path": item.get("path"),
-                        "extra": str(item),
+                        "extra": FileDbHelper.encode_extra(item),
                     },
                 }
             ]
@@ -212,48 +303,95 @@ class FileDbHelper(DbOper):
         """
         通过列表批量写入或更新数据
         """
-        if list_type == "files":
-            File.upsert_batch_by_list(self._db, batch)
+        model = File if list_type == "files" else Folder
+        if self._write_behind(len(batch)):
+            # 文件夹路径映射在写入线程提交后更新
+            ct_db_writer.upsert(model, batch)
         else:
-            Folder.upsert_batch_by_list(self._db, batch)
+            model.upsert_batch_by_list(self._db, batch)
+            if model is Folder:
+                folderpathcacher.update(batch)
+        dbitemcacher.invalidate_rows(batch)
         return True
 
+    @staticmethod
+    def _write_behind(size: int) -> bool:
+        """
+        是否将零散写入交给延迟写入队列，大批量写入仍直接提交
+        """
+        return ct_db_writer.enabled and size < ct_db_writer.batch_size
+
+    def seed_folder_path_cache(self) -> int:
+        """
+        从数据库载入文件夹 ID 路径映射
+
+        :return: 载入的文件夹数量
+        """
+        return folderpathcacher.seed(Folder.get_all_id_path(self._db))
+
+    def _get_item(self, kind: str, value: Any) -> Optional[Dict]:
+        """
+        通过 ID 或路径获取文件或文件夹
+
+        依次读取延迟写入队列、查询缓存，最后在一条语句中同时查询文件表与文件夹表
+
+        :param kind: id 或 path
+        :param value: ID 或路径
+        """
+        # 先记录缓存版本，查询期间发生写入时不回填缓存
+        version = dbitemcacher.version
+        for model, item_type in ((File, "file"), (Folder, "folder")):
+            if kind == "id":
+                row = ct_db_writer.get_by_id(model, value)[1]
+            else:
+                row = ct_db_writer.get_by_path(model, value)
+            if row:
+                return {**row, "type": item_type, "_sa_instance_state": None}
+        hit, item = dbitemcacher.get(kind, value)
+        if not hit:
+            if kind == "id":
+                item = File.get_item(self._db, file_id=value)
+            else:
+                item = File.get_item(self._db, file_path=value)
+            dbitemcacher.set(kind, value, item, version)
+        if not item:
+            return None
+        if ct_db_writer.shadows(File if item["type"] == "file" else Folder, item["id"]):
+            return None
+        return {**item, "_sa_instance_state": None}
+
     def get_by_path(self, path: str) -> Optional[Dict]:
         """
         通过路径获取项目
         """
-        file = File.get_by_path(self._db, path)
-        if file:
-            return {
-                **file.__dict__,
-                "type": "file",
-                "_sa_instance_state": None,
-            }
-        folder = Folder.get_by_path(self._db, path)
-        if folder:
-            return {**folder.__dict__, "type": "folder", "_sa_instance_state": None}
-        return None
+        return self._get_item("path", path)
+
+    def get_next_files(self, file_id: int, limit: int) -> List[Dict]:
+        """
+        获取同一父目录下按名称排序紧随其后的文件
+        """
+        ct_db_writer.flush()
+        file = File.get_by_id(self._db, file_id)
+        if not file:
+            return []
+        return [
+            {**item.__dict__, "type": "file", "_sa_instance_state": None}
+            for item in File.get_next_by_parent_id(
+                self._db, file.parent_id, file.name, limit
+            )
+        ]
 
     def get_by_id(self, id: int) -> Optional[Dict]:
         """
         通过ID获取项目
         """
-        file = File.get_by_id(self._db, id)
-        if file:
-            return {
-                **file.__dict__,
-                "type": "file",
-                "_sa_instance_state": None,
-            }
-        folder = Folder.get_by_id(self._db, id)
-        if folder:
-            return {**folder.__dict__, "type": "folder", "_sa_instance_state": None}
-        return None
+        return self._get_item("id", id)
 
     def get_children(self, path: str) -> Dict:
         """
         获取路径下的所有子项
         """
+        ct_db_writer.flush()
         parent = Folder.get_by_path(self._db, path)
         if not parent:
             return {"files": [], "subfolders": []}
@@ -285,6 +423,8 @@ class FileDbHelper(DbOper):
         File.remove_by_path_batch(self._db, path)
         if not only_file:
             Folder.remove_by_path_batch(self._db, path)
+            folderpathcacher.remove_subtree(path)
+        dbitemcacher.clear()
         return True
 
     def remove_by_id_batch(self, id: int, only_file: bool = False):
@@ -298,6 +438,8 @@ class FileDbHelper(DbOper):
         File.remove_by_path_batch(self._db, path)
         if not only_file:
             Folder.remove_by_path_batch(self._db, path)
+            folderpathcacher.remove_subtree(path)
+        dbitemcacher.clear()
         return True
 
     def remove_by_path(self, path_type: str, path: str):
@@ -308,19 +450,25 @@ class FileDbHelper(DbOper):
             File.delete_by_path(self._db, path)
         else:
             Folder.delete_by_path(self._db, path)
+            folderpathcacher.remove_subtree(path)
+        dbitemcacher.invalidate(paths=[path])
 
     def remove_by_id(self, id_type: str, id: int):
         """
         通过 ID 删除记录
         """
-        if id_type == "file":
-            File.delete_by_id(self._db, id)
+        model = File if id_type == "file" else Folder
+        if self._write_behind(1):
+            ct_db_writer.delete(model, [id])
         else:
-            Folder.delete_by_id(self._db, id)
+            model.delete_by_id(self._db, id)
+        dbitemcacher.invalidate(ids=[id])
+        if model is Folder:
+            folderpathcacher.remove(id)
 
     def update_path_by_id(self, id: int, new_path: str) -> bool:
         """
-        通过ID匹配数据并修改path
+        通过ID匹配数据并修改path，文件夹会同时更新其下所有子路径
         """
         item = self.get_by_id(id)
         if not item:
@@ -329,7 +477,16 @@ class FileDbHelper(DbOper):
         if item["type"] == "file":
             File.update_path(self._db, id, new_path)
         else:
-            return False
+            old_path = item["path"]
+            try:
+                Folder.move_subtree(self._db, id, old_path, new_path)
+            except IntegrityError:
+                logger.warning(
+                    f"【数据库】移动文件夹 {old_path} -> {new_path} 失败，目标路径已存在记录，需先清理冲突记录"
+                )
+                raise
+            folderpathcacher.move_subtree(old_path, new_path)
+        dbitemcacher.clear()
 
         return True
 
@@ -343,19 +500,148 @@ class FileDbHelper(DbOper):
 
         if item["type"] == "file":
             File.update_name(self._db, id, new_name)
+            dbitemcacher.invalidate(ids=[id])
         else:
             return False
 
         return True
 
+    def get_storage_report(self) -> Dict[str, Any]:
+        """
+        获取文件表与数据库文件的空间占用报告
+        """
+        ct_db_writer.flush()
+        report = File.get_extra_stats(self._db)
+        report["extra_mode"] = configer.DB_FILES_EXTRA_MODE
+        report["avg_extra_bytes"] = (
+            report["extra_bytes"] / report["extra_rows"] if report["extra_rows"] else 0
+        )
+        return report
+
+    def compact_extra(self, batch_size: int = 2000) -> Dict[str, Any]:
+        """
+        按当前存储模式重新编码已有的 files.extra
+
+        full 模式无法还原已精简的数据，不做处理；释放的空间将被后续写入复用
+
+        :return: 处理前后的 extra 占用字节数与改写行数
+        """
+        ct_db_writer.flush()
+        before = File.get_extra_stats(self._db)["extra_bytes"]
+        updated = 0
+        if configer.DB_FILES_EXTRA_MODE != "full":
+            last_id = -1
+            while rows := File.get_extra_batch(self._db, last_id, batch_size):
+                changes = []
+                for file_id, extra in rows:
+                    new_extra = self.encode_extra(self.decode_extra(extra))
+                    if new_extra != extra:
+                        changes.append({"_id": file_id, "_extra": new_extra})
+                if changes:
+                    File.update_extra_batch(self._db, changes)
+                    updated += len(changes)
+                last_id = rows[-1][0]
+            dbitemcacher.clear()
+        after = File.get_extra_stats(self._db)["extra_bytes"]
+        logger.info(
+            f"【数据库】files.extra 重新编码完成（{configer.DB_FILES_EXTRA_MODE}）: "
+            f"改写 {updated} 条，{before / 1024 / 1024:.2f} MB -> "
+            f"{after / 1024 / 1024:.2f} MB"
+        )
+        return {"before_bytes": before, "after_bytes": after, "updated": updated}
+
     def get_any_pickcode(self) -> Optional[str]:
         """
         从文件表中任意获取一条 pickcode 不为空的数据的 pickcode
 
         :return: pickcode
         """
+        ct_db_writer.flush()
         pickcode = File.get_any_pickcode(self._db)
         if pickcode:
             return pickcode
 
         return None
+
+
+class FileDbUpsertBuffer:
+    """
+    按 ID 去重的流式批量写入缓冲
+
+    文件和文件夹分别以 ID 为键合并，累计到阈值时写入数据库；
+    同一次遍历中已写入的文件夹不会重复写入
+    """
+
+    def __init__(self, helper: FileDbHelper, flush_size: int = 1000):
+        """
+        :param helper: 数据库操作实例
+        :param flush_size: 触发写入的记录数
+        """
+        self.helper = helper
+        self.flush_size = max(int(flush_size), 1)
+        self.files: Dict[int, Dict] = {}
+        self.folders: Dict[int, Dict] = {}
+        self.written_folders: Set[int] = set()
+        self.written = 0
+
+    def __enter__(self) -> "FileDbUpsertBuffer":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.flush()
+
+    def add(self, batch: List[Dict]):
+        """
+        加入 process_* 方法生成的数据
+        """
+        for entry in batch:
+            data = entry.get("data", {})
+            if "id" not in data:
+                continue
+            if entry.get("table") == "files":
+                self.files[data["id"]] = data
+            elif entry.get("table") == "folders":
+                if data["id"] in self.written_folders:
+                    continue
+                self.folders[data["id"]] = data
+        if len(self.files) + len(self.folders) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        """
+        写入缓冲中的数据
+        """
+        if self.files:
+            self.helper.upsert_batch_by_list("files", list(self.files.values()))
+            self.written += len(self.files)
+            self.files = {}
+        if self.folders:
+            self.helper.upsert_batch_by_list("folders", list(self.folders.values()))
+            self.written += len(self.folders)
+            self.written_folders.update(self.folders)
+            self.folders = {}
+
+
+def _apply_committed(rows: List[Tuple[Any, Any, Optional[Dict]]]):
+    """
+    延迟写入提交后记录已入库的文件夹
+    """
+    folderpathcacher.update(row for model, _, row in rows if model is Folder and row)
+
+
+def _rollback_discarded(rows: List[Tuple[Any, Any, Optional[Dict]]]):
+    """
+    延迟写入被丢弃后移除对应缓存，之后的查询以数据库为准
+    """
+    dbitemcacher.invalidate(
+        ids=[rid for _, rid, _ in rows],
+        paths=[row["path"] for _, _, row in rows if row and row.get("path")],
+    )
+    for model, rid, _ in rows:
+        if model is Folder:
+            folderpathcacher.remove(rid)
+
+
+ct_db_writer.on_commit(_apply_committed)
+ct_db_writer.on_discard(_rollback_discarded)
@@ -1,4 +1,4 @@
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from sqlalchemy import (
     Column,
@@ -8,12 +8,27 @@ from sqlalchemy import (
     BigInteger,
     select,
     delete,
+    update,
+    bindparam,
+    func,
     and_,
+    cast,
+    text,
+    LargeBinary,
+    literal,
+    null,
+    union_all,
 )
 from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 
-from ...db_manager import db_update, db_query, P115StrmHelperBase
+from ...db_manager import (
+    db_update,
+    db_query,
+    path_subtree_clause,
+    P115StrmHelperBase,
+)
+from .folder import Folder
 
 
 class File(P115StrmHelperBase):
@@ -24,7 +39,7 @@ class File(P115StrmHelperBase):
     __tablename__ = "files"
 
     id = Column(Integer, primary_key=True)
-    parent_id = Column(Integer, nullable=False)
+    parent_id = Column(Integer, nullable=False, index=True)
     name = Column(String(255), default="")
     sha1 = Column(String(40), default="")
     size = Column(BigInteger, default=0)
@@ -52,6 +67,45 @@ class File(P115StrmHelperBase):
         """
         return db.scalars(select(File).where(File.id == file_id)).first()
 
+    @staticmethod
+    @db_query
+    def get_item(
+        db: Session, file_id: Optional[int] = None, file_path: Optional[str] = None
+    ) -> Optional[Dict]:
+        """
+        通过 ID 或路径在一条语句中查询文件或文件夹，同时存在时优先返回文件
+
+        :return: 字段与对应表一致，并附带 type（file/folder）
+        """
+        file_cond = File.id == file_id if file_path is None else File.path == file_path
+        folder_cond = (
+            Folder.id == file_id if file_path is None else Folder.path == file_path
+        )
+        stmt = union_all(
+            select(
+                literal("file").label("type"),
+                *(column for column in File.__table__.columns),
+            ).where(file_cond),
+            select(
+                literal("folder").label("type"),
+                *(
+                    Folder.__table__.columns[column.name]
+                    if column.name in Folder.__table__.columns
+                    else null().label(column.name)
+                    for column in File.__table__.columns
+                ),
+            ).where(folder_cond),
+        )
+        row = db.execute(stmt.order_by("type").limit(1)).mappings().first()
+        if not row:
+            return None
+        if row["type"] == "file":
+            return dict(row)
+        return {
+            "type": "folder",
+            **{column.name: row[column.name] for column in Folder.__table__.columns},
+        }
+
     @staticmethod
     @db_query
     def get_by_parent_id(db: Session, parent_id: int):
@@ -62,6 +116,23 @@ class File(P115StrmHelperBase):
             db.execute(select(File).where(File.parent_id == parent_id)).scalars().all()
         )
 
+    @staticmethod
+    @db_query
+    def get_next_by_parent_id(db: Session, parent_id: int, name: str, limit: int):
+        """
+        获取同一父目录下按名称排序位于 name 之后的文件
+        """
+        return (
+            db.execute(
+                select(File)
+                .where(File.parent_id == parent_id, File.name > name)
+                .order_by(File.name)
+                .limit(limit)
+            )
+            .scalars()
+            .all()
+        )
+
     @staticmethod
     @db_update
     def delete_by_path(db: Session, file_path: str):
@@ -96,7 +167,7 @@ class File(P115StrmHelperBase):
         """
         通过路径批量删除
         """
-        db.execute(delete(File).where(File.path.startswith(path)))
+        db.execute(delete(File).where(path_subtree_clause(File.path, path)))
         return True
 
     @staticmethod
@@ -130,3 +201,55 @@ class File(P115StrmHelperBase):
         )
         result = db.scalar(stmt)
         return result
+
+    @staticmethod
+    @db_query
+    def get_extra_batch(db: Session, last_id: int, limit: int):
+        """
+        按 ID 顺序分批获取 extra 不为空的 (id, extra)
+        """
+        return db.execute(
+            select(File.id, File.extra)
+            .where(File.id > last_id, File.extra.is_not(None))
+            .order_by(File.id)
+            .limit(limit)
+        ).all()
+
+    @staticmethod
+    @db_update
+    def update_extra_batch(db: Session, rows: List[Dict]):
+        """
+        批量更新 extra，rows 为 {"_id": id, "_extra": extra} 列表
+        """
+        table = File.__table__
+        db.execute(
+            update(table)
+            .where(table.c.id == bindparam("_id"))
+            .values(extra=bindparam("_extra")),
+            rows,
+        )
+        return True
+
+    @staticmethod
+    @db_query
+    def get_extra_stats(db: Session):
+        """
+        统计 extra 字段与数据库文件的空间占用
+        """
+        rows, extra_rows, extra_bytes = db.execute(
+            select(
+                func.count(File.id),
+                func.count(File.extra),
+                func.coalesce(func.sum(func.length(cast(File.extra, LargeBinary))), 0),
+            )
+        ).one()
+        page_size = db.execute(text("PRAGMA page_size")).scalar() or 0
+        page_count = db.execute(text("PRAGMA page_count")).scalar() or 0
+        freelist_count = db.execute(text("PRAGMA freelist_count")).scalar() or 0
+        return {
+            "rows": rows,
+            "extra_rows": extra_rows,
+            "extra_bytes": extra_bytes,
+            "db_bytes": page_size * page_count,
+            "free_bytes": page_size * freelist_count,
+        }
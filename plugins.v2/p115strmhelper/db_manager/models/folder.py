@@ -1,4 +1,4 @@
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
 from sqlalchemy import (
     Column,
@@ -7,11 +7,18 @@ from sqlalchemy import (
     Text,
     select,
     delete,
+    update,
 )
 from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 
-from ...db_manager import db_update, db_query, P115StrmHelperBase
+from ...db_manager import (
+    db_update,
+    db_query,
+    path_subtree_clause,
+    subtree_path_update,
+    P115StrmHelperBase,
+)
 
 
 class Folder(P115StrmHelperBase):
@@ -56,6 +63,14 @@ class Folder(P115StrmHelperBase):
             .all()
         )
 
+    @staticmethod
+    @db_query
+    def get_all_id_path(db: Session) -> List[Tuple[int, str]]:
+        """
+        获取所有文件夹的 (id, path)
+        """
+        return [tuple(row) for row in db.execute(select(Folder.id, Folder.path))]
+
     @staticmethod
     @db_update
     def delete_by_path(db: Session, file_path: str):
@@ -90,5 +105,26 @@ class Folder(P115StrmHelperBase):
         """
         通过路径批量删除
         """
-        db.execute(delete(Folder).where(Folder.path.startswith(path)))
+        db.execute(delete(Folder).where(path_subtree_clause(Folder.path, path)))
+        return True
+
+    @staticmethod
+    @db_update
+    def move_subtree(db: Session, folder_id: int, old_path: str, new_path: str):
+        """
+        在一个事务中移动文件夹，同时更新其下所有文件夹与文件的路径
+
+        目标路径已被其它记录占用时抛出 IntegrityError，整个移动回滚
+        """
+        # 延迟导入避免循环导入
+        from .file import File
+
+        db.execute(
+            update(Folder)
+            .where(Folder.id == folder_id)
+            .values(path=new_path)
+            .execution_options(synchronize_session=False)
+        )
+        db.execute(subtree_path_update(Folder, old_path, new_path))
+        db.execute(subtree_path_update(File, old_path, new_path))
         return True
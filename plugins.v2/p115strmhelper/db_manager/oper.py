@@ -1,7 +1,13 @@
-from .file_oper import FileDbHelper
+from .file_oper import FileDbHelper, FileDbUpsertBuffer
 from .life_event import LifeEventDbHelper
 from .moviepilot_transfer import TransferHBOper
 from .open_file_oper import OpenFileOper
 
 
-__all__ = ["FileDbHelper", "LifeEventDbHelper", "TransferHBOper", "OpenFileOper"]
+__all__ = [
+    "FileDbHelper",
+    "FileDbUpsertBuffer",
+    "LifeEventDbHelper",
+    "TransferHBOper",
+    "OpenFileOper",
+]
@@ -1,11 +1,10 @@
 from shutil import rmtree
 from collections import defaultdict
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from threading import Timer, Event, Thread
-from time import sleep, strftime, localtime, time
-from typing import List, Set, Dict, Optional
+from threading import Timer, Event, Thread, Lock
+from time import strftime, localtime, time, perf_counter
+from typing import List, Set, Dict, Optional, Tuple, Callable
 from pathlib import Path
-from itertools import batched, chain
 
 from ...core.config import configer
 from ...core.message import post_message
@@ -20,10 +19,12 @@ from ...utils.automaton import AutomatonUtils
 from ...utils.mediainfo_download import MediainfoDownloadMiddleware
 from ...utils.http import check_iter_path_data
 from ...utils.exception import FileItemKeyMiss
-from ...db_manager.oper import FileDbHelper, LifeEventDbHelper
+from ...db_manager.oper import FileDbHelper, FileDbUpsertBuffer, LifeEventDbHelper
 from ...helper.mediainfo_download import MediaInfoDownloader
 from ...helper.mediasyncdel import MediaSyncDelHelper
 from ...helper.mediaserver import MediaServerRefresh
+from ...helper.life.pipeline import LifeEventPipeline
+from ...helper.life.poller import AdaptivePoller
 from ...helper.life.queue import LifeTasksQueue
 
 from p115client import P115Client, check_response
@@ -44,6 +45,20 @@ from app.chain.storage import StorageChain
 from app.chain.transfer import TransferChain
 
 
+# 需要处理的事件类型
+PROCESS_EVENT_TYPES = {1, 2, 5, 6, 14, 17, 18, 22}
+
+# 处理阶段名称
+STAGE_NAMES = {
+    "compile": "编译配置",
+    "resolve": "路径解析",
+    "creata": "生成STRM",
+    "remove": "删除STRM",
+    "transfer": "网盘整理",
+    "folder": "新建目录",
+}
+
+
 @sentry_manager.capture_all_class_exceptions
 class MonitorLife:
     """
@@ -81,8 +96,24 @@ class MonitorLife:
         self.mediainfodownloader = mediainfodownloader
         self.stop_event = stop_event
 
-        self.tasks_queue = LifeTasksQueue()
+        self.tasks_queue = LifeTasksQueue(
+            configer.PLUGIN_CONFIG_PATH / "life_tasks_queue.json"
+        )
+        if configer.monitor_life_first_pull_mode == "last":
+            if restored := self.tasks_queue.load():
+                logger.info(f"【监控生活事件】恢复等待队列 {restored} 个事件")
+        else:
+            self.tasks_queue.clear()
+            self.tasks_queue.save()
+        self.poller = AdaptivePoller(
+            min_interval=configer.monitor_life_poll_min_interval,
+            max_interval=configer.monitor_life_poll_max_interval,
+        )
+        self.pipeline = LifeEventPipeline(
+            max_workers=configer.monitor_life_event_workers
+        )
 
+        self._monitor_life_notification_lock = Lock()
         self._monitor_life_notification_timer = None
         self._monitor_life_notification_queue = defaultdict(
             lambda: {"strm_count": 0, "mediainfo_count": 0}
@@ -91,6 +122,7 @@ class MonitorLife:
         self.rmt_mediaext: List = []
         self.rmt_mediaext_set: Set = set()
         self.download_mediaext_set: Set = set()
+        self.pipeline_roots: Tuple[str, ...] = ()
 
         self.mdaw = AutomatonUtils.build_automaton(
             configer.mediainfo_download_whitelist
@@ -116,14 +148,32 @@ class MonitorLife:
         self._monitor_life_notification_timer = Timer(60.0, self._send_notification)
         self._monitor_life_notification_timer.start()
 
+    def _add_notification(self, strm_count: int = 0, mediainfo_count: int = 0):
+        """
+        累加通知计数，可在多个工作线程中调用
+        """
+        if strm_count <= 0 and mediainfo_count <= 0:
+            return
+        with self._monitor_life_notification_lock:
+            counts = self._monitor_life_notification_queue["life"]
+            counts["strm_count"] += strm_count
+            counts["mediainfo_count"] += mediainfo_count
+            self._schedule_notification()
+
     def _send_notification(self):
         """
         发送合并后的通知
         """
-        if "life" not in self._monitor_life_notification_queue:
-            return
+        with self._monitor_life_notification_lock:
+            if "life" not in self._monitor_life_notification_queue:
+                return
+            counts = self._monitor_life_notification_queue["life"]
+            # 重置计数器
+            self._monitor_life_notification_queue["life"] = {
+                "strm_count": 0,
+                "mediainfo_count": 0,
+            }
 
-        counts = self._monitor_life_notification_queue["life"]
         if counts["strm_count"] == 0 and counts["mediainfo_count"] == 0:
             return
 
@@ -140,12 +190,6 @@ class MonitorLife:
                 text="\n" + "\n".join(text_parts),
             )
 
-        # 重置计数器
-        self._monitor_life_notification_queue["life"] = {
-            "strm_count": 0,
-            "mediainfo_count": 0,
-        }
-
     def _get_path_by_cid(self, cid: int) -> Optional[Path]:
         """
         通过 cid 获取路径
@@ -195,8 +239,7 @@ class MonitorLife:
             _databasehelper.remove_by_id_batch(int(event["file_id"]), False)
             # 文件夹情况，遍历文件夹，获取整理文件
             # 缓存顶层文件夹ID
-            if str(event["file_id"]) not in pantransfercacher.delete_pan_transfer_list:
-                pantransfercacher.delete_pan_transfer_list.append(str(event["file_id"]))
+            pantransfercacher.add_delete(event["file_id"])
             for item in iter_files_with_path(
                 self._client, cid=int(file_id), with_ancestors=True, cooldown=2
             ):
@@ -209,22 +252,10 @@ class MonitorLife:
                 if not PathUtils.has_prefix(file_path, org_file_path):
                     continue
                 # 缓存文件夹ID
-                if (
-                    str(item["parent_id"])
-                    not in pantransfercacher.delete_pan_transfer_list
-                ):
-                    pantransfercacher.delete_pan_transfer_list.append(
-                        str(item["parent_id"])
-                    )
+                pantransfercacher.add_delete(item["parent_id"])
                 if file_path.suffix.lower() in rmt_mediaext:
                     # 缓存文件ID
-                    if (
-                        str(item["id"])
-                        not in pantransfercacher.creata_pan_transfer_list
-                    ):
-                        pantransfercacher.creata_pan_transfer_list.append(
-                            str(item["id"])
-                        )
+                    pantransfercacher.add_creata(item["id"])
                     # 判断此顶层目录MP是否能处理
                     if str(item["parent_id"]) != event["file_id"]:
                         cache_top_path = True
@@ -250,13 +281,7 @@ class MonitorLife:
                     or file_path.suffix.lower() in settings.RMT_SUBEXT
                 ):
                     # 如果是MP可处理的音轨或字幕文件，则缓存文件ID
-                    if (
-                        str(item["id"])
-                        not in pantransfercacher.creata_pan_transfer_list
-                    ):
-                        pantransfercacher.creata_pan_transfer_list.append(
-                            str(item["id"])
-                        )
+                    pantransfercacher.add_creata(item["id"])
 
             # 批量加入整理队列
             if file_item_list:
@@ -277,39 +302,14 @@ class MonitorLife:
 
             # 顶层目录MP无法处理时添加到缓存字典中
             if cache_top_path and cache_file_id_list:
-                if (
-                    str(event["file_id"])
-                    in pantransfercacher.top_delete_pan_transfer_list
-                ):
-                    # 如果存在相同ID的根目录则合并
-                    cache_file_id_list = list(
-                        dict.fromkeys(
-                            chain(
-                                cache_file_id_list,
-                                pantransfercacher.top_delete_pan_transfer_list[
-                                    str(event["file_id"])
-                                ],
-                            )
-                        )
-                    )
-                    del pantransfercacher.top_delete_pan_transfer_list[
-                        str(event["file_id"])
-                    ]
-                pantransfercacher.top_delete_pan_transfer_list[
-                    str(event["file_id"])
-                ] = cache_file_id_list
+                # 如果存在相同ID的根目录则合并
+                pantransfercacher.merge_top_delete(event["file_id"], cache_file_id_list)
         else:
             # 文件情况，直接整理
             if file_path.suffix.lower() in rmt_mediaext:
                 _databasehelper.remove_by_id("file", event["file_id"])
                 # 缓存文件ID
-                if (
-                    str(event["file_id"])
-                    not in pantransfercacher.creata_pan_transfer_list
-                ):
-                    pantransfercacher.creata_pan_transfer_list.append(
-                        str(event["file_id"])
-                    )
+                pantransfercacher.add_creata(event["file_id"])
                 fileitem = FileItem(
                     storage=configer.storage_module,
                     fileid=str(file_id),
@@ -354,22 +354,16 @@ class MonitorLife:
                     event=event, file_path=file_path.as_posix()
                 )
             )
-            for batch in batched(
-                iter_files_with_path(
+            with FileDbUpsertBuffer(_databasehelper) as upsert_buffer:
+                for item in iter_files_with_path(
                     self._client, cid=int(file_id), with_ancestors=True, cooldown=2
-                ),
-                7_000,
-            ):
-                processed = []
-                for item in batch:
+                ):
                     try:
                         check_iter_path_data(item)
                     except FileItemKeyMiss as e:
                         logger.warning(f"【监控生活事件】数据拉取异常: {e}")
                         continue
-                    _process_item = _databasehelper.process_item(item)
-                    if _process_item not in processed:
-                        processed.extend(_process_item)
+                    upsert_buffer.add(_databasehelper.process_item(item))
                     if item["is_dir"]:
                         continue
                     if "creata" in configer.get_config("monitor_life_event_modes"):  # pylint: disable=E1135
@@ -496,16 +490,10 @@ class MonitorLife:
                             file_path=str(new_file_path),
                             file_name=str(original_file_name),
                         )
-                _databasehelper.upsert_batch(processed)
             if configer.get_config("notify"):
-                if strm_count > 0 or mediainfo_count > 0:
-                    self._monitor_life_notification_queue["life"]["strm_count"] += (
-                        strm_count
-                    )
-                    self._monitor_life_notification_queue["life"][
-                        "mediainfo_count"
-                    ] += mediainfo_count
-                    self._schedule_notification()
+                self._add_notification(
+                    strm_count=strm_count, mediainfo_count=mediainfo_count
+                )
         else:
             file_path_string = file_path.as_posix()
             _databasehelper.upsert_batch(
@@ -566,10 +554,7 @@ class MonitorLife:
                             pan_media_dir,
                         ]
                         if configer.get_config("notify"):
-                            self._monitor_life_notification_queue["life"][
-                                "mediainfo_count"
-                            ] += 1
-                            self._schedule_notification()
+                            self._add_notification(mediainfo_count=1)
                         return
 
                 if file_path.suffix.lower() not in self.rmt_mediaext_set:
@@ -618,8 +603,7 @@ class MonitorLife:
                     pan_media_dir,
                 ]
                 if configer.get_config("notify"):
-                    self._monitor_life_notification_queue["life"]["strm_count"] += 1
-                    self._schedule_notification()
+                    self._add_notification(strm_count=1)
                 scrape_metadata = True
                 if configer.get_config("monitor_life_scrape_metadata_enabled"):
                     if configer.get_config(
@@ -800,14 +784,18 @@ class MonitorLife:
         except Exception as e:
             logger.error(f"【监控生活事件】{file_path} 删除失败: {e}")
 
-    def new_creata_path(self, event: Dict):
+    def new_creata_path(self, event: Dict, file_path: Optional[Path] = None):
         """
         处理新出现的路径
+
+        :param event: 事件
+        :param file_path: 已解析的网盘路径，为空时通过父目录 ID 获取
         """
         # 1.获取绝对文件路径
-        file_name = event["file_name"]
-        dir_path = self._get_path_by_cid(int(event["parent_id"]))
-        file_path = Path(dir_path) / file_name
+        if file_path is None:
+            file_name = event["file_name"]
+            dir_path = self._get_path_by_cid(int(event["parent_id"]))
+            file_path = Path(dir_path) / file_name
         # 匹配逻辑 整理路径目录 > 生成STRM文件路径目录
         # 2.匹配是否为整理路径目录
         if configer.get_config("pan_transfer_enabled") and configer.get_config(
@@ -817,23 +805,119 @@ class MonitorLife:
                 paths=configer.get_config("pan_transfer_paths"),
                 transfer_path=file_path,
             ):
-                self.media_transfer(
-                    event=event,
-                    file_path=Path(file_path),
-                    rmt_mediaext=self.rmt_mediaext,
-                )
+                with self.pipeline.stage("transfer"):
+                    self.media_transfer(
+                        event=event,
+                        file_path=Path(file_path),
+                        rmt_mediaext=self.rmt_mediaext,
+                    )
                 return
         # 3.匹配是否为生成STRM文件路径目录
         if configer.get_config("monitor_life_enabled") and configer.get_config(
             "monitor_life_paths"
         ):
-            if str(event["file_id"]) in pantransfercacher.creata_pan_transfer_list:
-                # 检查是否命中缓存
-                pantransfercacher.creata_pan_transfer_list.remove(str(event["file_id"]))
+            # 检查是否命中缓存
+            if pantransfercacher.pop_creata(event["file_id"]):
                 if "transfer" in configer.get_config("monitor_life_event_modes"):  # pylint: disable=E1135
-                    self.creata_strm(event=event, file_path=file_path)
+                    with self.pipeline.stage("creata"):
+                        self.creata_strm(event=event, file_path=file_path)
             else:
-                self.creata_strm(event=event, file_path=file_path)
+                with self.pipeline.stage("creata"):
+                    self.creata_strm(event=event, file_path=file_path)
+
+    def new_folder(self, event: Dict, file_path: Path):
+        """
+        创建文件夹事件直接写入数据库
+        """
+        # 待整理目录跳过处理
+        if configer.pan_transfer_enabled and configer.pan_transfer_paths:
+            if PathUtils.get_run_transfer_path(
+                paths=configer.pan_transfer_paths,
+                transfer_path=file_path.as_posix(),
+            ):
+                return
+        # 未识别目录跳过处理
+        if configer.pan_transfer_unrecognized_path:
+            if PathUtils.has_prefix(
+                file_path.as_posix(), configer.pan_transfer_unrecognized_path
+            ):
+                return
+        _databasehelper = FileDbHelper()
+        _databasehelper.upsert_batch(
+            _databasehelper.process_life_dir_item(event=event, file_path=file_path)
+        )
+
+    def remove_path(self, event: Dict):
+        """
+        处理删除文件/文件夹事件
+        """
+        # 检查是否命中删除文件夹缓存，命中则无需处理
+        if pantransfercacher.pop_delete(event["file_id"]):
+            return
+        if (
+            configer.get_config("monitor_life_enabled")
+            and configer.get_config("monitor_life_paths")
+            and "remove" in configer.get_config("monitor_life_event_modes")  # pylint: disable=E1135
+        ):
+            with self.pipeline.stage("remove"):
+                self.remove_strm(event=event)
+
+    def _compile_batch_config(self):
+        """
+        每批次编译一次事件处理所需的配置
+        """
+        self.rmt_mediaext = [
+            f".{ext.strip()}"
+            for ext in configer.get_config("user_rmt_mediaext")
+            .replace("，", ",")
+            .split(",")
+        ]
+        self.rmt_mediaext_set = set(self.rmt_mediaext)
+        self.download_mediaext_set = {
+            f".{ext.strip()}"
+            for ext in configer.get_config("user_download_mediaext")
+            .replace("，", ",")
+            .split(",")
+        }
+        roots = []
+        for path in (configer.get_config("monitor_life_paths") or "").split("\n"):
+            if path and "#" in path:
+                roots.append(path.split("#", 1)[1])
+        for path in (configer.get_config("pan_transfer_paths") or "").split("\n"):
+            if path:
+                roots.append(path)
+        # 优先匹配更深的根目录
+        self.pipeline_roots = tuple(
+            sorted(roots, key=lambda root: len(Path(root).parts), reverse=True)
+        )
+        self.pipeline.max_workers = max(configer.monitor_life_event_workers, 1)
+
+    def _dispatch_event(self, event: Dict) -> Tuple[str, Callable[[], None]]:
+        """
+        解析事件路径，生成按顶层媒体路径分组的处理任务
+
+        :return: (分组键, 任务)
+        """
+        if int(event["type"]) == 22:
+            # 删除事件只能通过数据库获取路径
+            file_item = FileDbHelper().get_by_id(int(event["file_id"]))
+            path = file_item.get("path", "") if file_item else ""
+            return (
+                self.pipeline.group_key(path, self.pipeline_roots),
+                lambda: self.remove_path(event=event),
+            )
+
+        dir_path = self._get_path_by_cid(int(event["parent_id"]))
+        file_path = Path(dir_path) / event["file_name"]
+        key = self.pipeline.group_key(file_path.as_posix(), self.pipeline_roots)
+        if int(event["type"]) == 17:
+
+            def job():
+                with self.pipeline.stage("folder"):
+                    self.new_folder(event=event, file_path=file_path)
+
+            return key, job
+        return key, lambda: self.new_creata_path(event=event, file_path=file_path)
 
     def _wait_for_transfer_complete(self):
         """
@@ -878,6 +962,11 @@ class MonitorLife:
         if self._wait_for_transfer_complete():
             return from_time, from_id
 
+        self.poller.configure(
+            min_interval=configer.monitor_life_poll_min_interval,
+            max_interval=configer.monitor_life_poll_max_interval,
+        )
+
         events_batch: List = []
         for attempt in range(3, -1, -1):
             try:
@@ -918,12 +1007,20 @@ class MonitorLife:
                     return from_time, from_id
 
         if not events_batch:
-            if self.stop_event and self.stop_event.wait(timeout=20):
-                return from_time, from_id
-            elif not self.stop_event:
-                sleep(20)
+            self.poller.on_idle()
+            self.poller.wait(self.stop_event)
             return from_time, from_id
 
+        latest_update_time = max(int(event["update_time"]) for event in events_batch)
+        if (
+            self.poller.last_event_time is None
+            or latest_update_time > self.poller.last_event_time
+        ):
+            self.poller.on_events(latest_update_time)
+        else:
+            # 只拉取到仍在等待队列中的旧事件
+            self.poller.on_idle()
+
         db_helper = LifeEventDbHelper()
         db_helper.upsert_batch_by_list(events_batch)
 
@@ -934,35 +1031,17 @@ class MonitorLife:
             wait_time = 0
         process_time: int = int(time()) - wait_time
         process_item: bool = False
+        self.pipeline.reset()
+        batch_start = perf_counter()
+        with self.pipeline.stage("compile"):
+            self._compile_batch_config()
+        due_events: List[Dict] = []
         for event in reversed(events_batch):
-            self.rmt_mediaext = [
-                f".{ext.strip()}"
-                for ext in configer.get_config("user_rmt_mediaext")
-                .replace("，", ",")
-                .split(",")
-            ]
-            self.rmt_mediaext_set = set(self.rmt_mediaext)
-            self.download_mediaext_set = {
-                f".{ext.strip()}"
-                for ext in configer.get_config("user_download_mediaext")
-                .replace("，", ",")
-                .split(",")
-            }
-
             logger.debug(
                 f"【监控生活事件】{BEHAVIOR_TYPE_TO_NAME.get(event['type'], '未知类型')}: {event}"
             )
 
-            if (
-                int(event["type"]) != 1
-                and int(event["type"]) != 2
-                and int(event["type"]) != 5
-                and int(event["type"]) != 6
-                and int(event["type"]) != 14
-                and int(event["type"]) != 17
-                and int(event["type"]) != 18
-                and int(event["type"]) != 22
-            ):
+            if int(event["type"]) not in PROCESS_EVENT_TYPES:
                 continue
 
             if wait_time == 0:
@@ -994,62 +1073,31 @@ class MonitorLife:
             else:
                 continue
 
-            if (
-                int(event["type"]) == 1
-                or int(event["type"]) == 2
-                or int(event["type"]) == 5
-                or int(event["type"]) == 6
-                or int(event["type"]) == 14
-                or int(event["type"]) == 18
-            ):
-                # 新路径事件处理
-                self.new_creata_path(event=event)
-
-            if int(event["type"]) == 22:
-                # 删除文件/文件夹事件处理
-                if str(event["file_id"]) in pantransfercacher.delete_pan_transfer_list:
-                    # 检查是否命中删除文件夹缓存，命中则无需处理
-                    pantransfercacher.delete_pan_transfer_list.remove(
-                        str(event["file_id"])
-                    )
-                else:
-                    if (
-                        configer.get_config("monitor_life_enabled")
-                        and configer.get_config("monitor_life_paths")
-                        and "remove" in configer.get_config("monitor_life_event_modes")  # pylint: disable=E1135
-                    ):
-                        self.remove_strm(event=event)
-
-            if int(event["type"]) == 17:
-                # 对于创建文件夹事件直接写入数据库
-                _databasehelper = FileDbHelper()
-                file_name = event["file_name"]
-                dir_path = self._get_path_by_cid(int(event["parent_id"]))
-                file_path = Path(dir_path) / file_name
-                # 待整理目录跳过处理
-                if configer.pan_transfer_enabled and configer.pan_transfer_paths:
-                    if PathUtils.get_run_transfer_path(
-                        paths=configer.pan_transfer_paths,
-                        transfer_path=file_path.as_posix(),
-                    ):
-                        continue
-                # 未识别目录跳过处理
-                if configer.pan_transfer_unrecognized_path:
-                    if PathUtils.has_prefix(
-                        file_path.as_posix(), configer.pan_transfer_unrecognized_path
-                    ):
-                        continue
-                _databasehelper.upsert_batch(
-                    _databasehelper.process_life_dir_item(
-                        event=event, file_path=file_path
-                    )
+            due_events.append(event)
+
+        self.tasks_queue.save()
+
+        if due_events:
+            with self.pipeline.stage("resolve"):
+                jobs = [self._dispatch_event(event) for event in due_events]
+            groups = self.pipeline.run(jobs)
+            stages = self.pipeline.stats()["stages"]
+            logger.info(
+                f"【监控生活事件】本批次处理 {len(due_events)} 个事件，"
+                f"{groups} 个顶层目录并行，总耗时 {perf_counter() - batch_start:.2f}s；"
+                + "，".join(
+                    f"{STAGE_NAMES.get(name, name)} {stage['seconds']:.2f}s/{stage['count']}次"
+                    for name, stage in stages.items()
                 )
+            )
 
         if not process_item:
-            if self.stop_event and self.stop_event.wait(timeout=20):
-                return return_from_time, return_from_id
-            elif not self.stop_event:
-                sleep(20)
+            # 等待队列非空时在队首事件到期时再拉取
+            head_time = self.tasks_queue.head_time()
+            self.poller.wait(
+                self.stop_event,
+                timeout=head_time + wait_time - time() if head_time else None,
+            )
 
         return return_from_time, return_from_id
 
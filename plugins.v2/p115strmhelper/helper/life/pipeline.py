@@ -0,0 +1,126 @@
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import PurePosixPath
+from threading import Lock
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class LifeEventPipeline:
+    """
+    生活事件并发处理管道
+
+    事件按顶层媒体路径分组，同组事件在同一工作线程内按加入顺序执行，不同组并行执行；
+    同时统计各处理阶段的累计耗时
+    """
+
+    def __init__(self, max_workers: int = 4):
+        """
+        :param max_workers: 最大并行分组数
+        """
+        self.max_workers = max(int(max_workers), 1)
+        self._lock = Lock()
+        self.timings: Dict[str, float] = defaultdict(float)
+        self.counts: Dict[str, int] = defaultdict(int)
+        self.last_groups = 0
+        self.last_jobs = 0
+
+    @staticmethod
+    def group_key(path: Optional[str], roots: Iterable[str]) -> str:
+        """
+        获取路径所属的顶层媒体路径
+
+        位于某个根目录之下时取根目录下的第一级路径，否则取路径本身
+
+        :param path: 网盘路径
+        :param roots: 媒体根目录列表
+        """
+        if not path:
+            return ""
+        parts = PurePosixPath(path).parts
+        for root in roots:
+            root_parts = PurePosixPath(root).parts
+            if not root_parts or len(root_parts) > len(parts):
+                continue
+            if parts[: len(root_parts)] == root_parts:
+                return PurePosixPath(*parts[: len(root_parts) + 1]).as_posix()
+        return PurePosixPath(path).as_posix()
+
+    def reset(self):
+        """
+        清空阶段耗时统计
+        """
+        with self._lock:
+            self.timings.clear()
+            self.counts.clear()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        统计阶段耗时，可在工作线程中使用
+        """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = perf_counter() - start
+            with self._lock:
+                self.timings[name] += elapsed
+                self.counts[name] += 1
+
+    def run(self, jobs: Iterable[Tuple[str, Callable[[], Any]]]) -> int:
+        """
+        执行任务
+
+        同组任务出错时跳过该组剩余任务，其余分组继续执行，全部结束后抛出第一个异常
+
+        :param jobs: (分组键, 任务) 列表，按事件顺序排列
+
+        :return: 分组数量
+        """
+        groups: OrderedDict[str, List[Callable[[], Any]]] = OrderedDict()
+        for key, job in jobs:
+            groups.setdefault(key, []).append(job)
+        self.last_groups = len(groups)
+        self.last_jobs = sum(len(group) for group in groups.values())
+        if not groups:
+            return 0
+
+        def run_group(group: List[Callable[[], Any]]) -> Optional[BaseException]:
+            for job in group:
+                try:
+                    job()
+                except Exception as e:
+                    return e
+            return None
+
+        workers = min(self.max_workers, len(groups))
+        if workers <= 1:
+            errors = [run_group(group) for group in groups.values()]
+        else:
+            with ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="life-event"
+            ) as executor:
+                errors = list(executor.map(run_group, groups.values()))
+
+        for error in errors:
+            if error is not None:
+                raise error
+        return len(groups)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        最近一次执行与各阶段耗时统计
+        """
+        with self._lock:
+            stages = {
+                name: {"count": self.counts[name], "seconds": self.timings[name]}
+                for name in self.timings
+            }
+        return {
+            "max_workers": self.max_workers,
+            "groups": self.last_groups,
+            "jobs": self.last_jobs,
+            "stages": stages,
+        }
@@ -0,0 +1,97 @@
+from threading import Event
+from time import sleep, time
+from typing import Any, Dict, Optional
+
+
+class AdaptivePoller:
+    """
+    生活事件自适应拉取间隔
+
+    拉取到事件后回到最小间隔快速轮询，连续空闲时按倍数退避到最大间隔；
+    同时记录最近一次事件的延迟（事件更新时间到被拉取的时间差）
+    """
+
+    def __init__(
+        self,
+        min_interval: float = 2.0,
+        max_interval: float = 20.0,
+        backoff_factor: float = 2.0,
+    ):
+        """
+        :param min_interval: 最小拉取间隔（秒）
+        :param max_interval: 最大拉取间隔（秒）
+        :param backoff_factor: 空闲退避倍数
+        """
+        self.min_interval = max(float(min_interval), 0.1)
+        self.max_interval = max(float(max_interval), self.min_interval)
+        self.backoff_factor = max(float(backoff_factor), 1.0)
+        self.interval = self.min_interval
+
+        self.last_pull_time: Optional[float] = None
+        self.last_event_time: Optional[float] = None
+        self.last_event_lag: Optional[float] = None
+        self.idle_pulls = 0
+
+    def configure(self, min_interval: float, max_interval: float):
+        """
+        更新间隔上下限，当前间隔会被限制在新的范围内
+        """
+        self.min_interval = max(float(min_interval), 0.1)
+        self.max_interval = max(float(max_interval), self.min_interval)
+        self.interval = min(max(self.interval, self.min_interval), self.max_interval)
+
+    def on_events(self, latest_update_time: Optional[float] = None):
+        """
+        本次拉取到新事件
+
+        :param latest_update_time: 本批次最新事件的更新时间戳
+        """
+        now = time()
+        self.last_pull_time = now
+        self.idle_pulls = 0
+        self.interval = self.min_interval
+        if latest_update_time:
+            self.last_event_time = float(latest_update_time)
+            self.last_event_lag = max(now - self.last_event_time, 0.0)
+
+    def on_idle(self):
+        """
+        本次拉取没有新事件
+        """
+        self.last_pull_time = time()
+        self.idle_pulls += 1
+        if self.idle_pulls > 1:
+            self.interval = min(self.interval * self.backoff_factor, self.max_interval)
+
+    def wait(
+        self, stop_event: Optional[Event], timeout: Optional[float] = None
+    ) -> bool:
+        """
+        等待下一次拉取
+
+        :param stop_event: 停止信号
+        :param timeout: 指定等待时间，默认使用当前间隔，会被限制在上下限范围内
+
+        :return: 等待期间是否收到停止信号
+        """
+        if timeout is None:
+            timeout = self.interval
+        timeout = min(max(timeout, self.min_interval), self.max_interval)
+        if stop_event:
+            return stop_event.wait(timeout=timeout)
+        sleep(timeout)
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        当前调度状态
+        """
+        return {
+            "interval": self.interval,
+            "min_interval": self.min_interval,
+            "max_interval": self.max_interval,
+            "idle_pulls": self.idle_pulls,
+            "last_pull_time": self.last_pull_time,
+            "last_event_time": self.last_event_time,
+            "last_event_lag": self.last_event_lag,
+        }
@@ -1,33 +1,92 @@
-from collections import deque
-from typing import Dict
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+from orjson import dumps, loads, JSONDecodeError
 
 
 class LifeTasksQueue:
     """
     生活事件等待队列
+
+    按加入顺序排列、以事件 ID 为键的有序哈希表，成员判断、查看队首和出队均为 O(1)；
+    指定 path 时可持久化到磁盘，重启后恢复未处理的等待事件
     """
 
-    def __init__(self):
-        self.data = deque()
-        self.key = deque()
+    def __init__(self, path: Optional[Path] = None):
+        """
+        :param path: 持久化文件路径，为空时仅保存在内存中
+        """
+        self.path = path
+        self.data: OrderedDict[int, Dict] = OrderedDict()
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self.data)
 
     def add(self, item: Dict) -> None:
-        self.data.append(item)
-        self.key.append(item["id"])
+        self.data[item["id"]] = item
+        self._dirty = True
+
+    def peek(self) -> Optional[Dict]:
+        """
+        查看队首事件，队列为空时返回 None
+        """
+        if not self.data:
+            return None
+        return self.data[next(iter(self.data))]
 
     def pop(self) -> Dict:
-        self.key.popleft()
-        return self.data.popleft()
+        self._dirty = True
+        return self.data.popitem(last=False)[1]
 
     def exist(self, item: Dict) -> bool:
-        return item["id"] in self.key and self.key[0] == item["id"]
+        """
+        事件是否位于队首
+        """
+        return bool(self.data) and next(iter(self.data)) == item["id"]
 
     def inq(self, item: Dict) -> bool:
-        return item["id"] in self.key
+        return item["id"] in self.data
 
     def time_done(self, timestamp: int | float) -> bool:
-        return timestamp >= self.data[0]["update_time"]
+        return timestamp >= self.peek()["update_time"]
+
+    def head_time(self) -> Optional[int]:
+        """
+        队首事件的更新时间，队列为空时返回 None
+        """
+        head = self.peek()
+        return head["update_time"] if head else None
 
     def clear(self) -> None:
         self.data.clear()
-        self.key.clear()
+        self._dirty = True
+
+    def load(self) -> int:
+        """
+        从持久化文件恢复队列
+
+        :return: 恢复的事件数量
+        """
+        if not self.path:
+            return 0
+        try:
+            items = loads(self.path.read_bytes())
+        except (FileNotFoundError, JSONDecodeError):
+            return 0
+        self.data = OrderedDict((item["id"], item) for item in items if "id" in item)
+        self._dirty = False
+        return len(self.data)
+
+    def save(self) -> None:
+        """
+        队列有变化时写入持久化文件
+        """
+        if not self.path or not self._dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_bytes(dumps(list(self.data.values())))
+        tmp_path.replace(self.path)
+        self._dirty = False
@@ -1,10 +1,26 @@
 import asyncio
+import os
 import time
 from base64 import b64decode
+from collections import defaultdict
+from contextlib import asynccontextmanager, contextmanager
+from functools import wraps
 from itertools import batched
 from pathlib import Path
+from shutil import copyfile
+from threading import local
 from uuid import uuid4
-from typing import List, cast, Dict, Set, Optional, Tuple, Generator
+from typing import (
+    List,
+    cast,
+    Dict,
+    Set,
+    Optional,
+    Tuple,
+    Generator,
+    AsyncIterator,
+    Iterator,
+)
 from errno import EIO
 from urllib.parse import unquote, urlsplit
 
@@ -22,7 +38,7 @@ from p115client.tool.iterdir import (
     iter_files,
     iter_files_with_path_skim,
 )
-from zstandard import ZstdCompressor, ZstdDecompressor
+from zstandard import ZstdCompressor, ZstdDecompressor, ZstdError
 
 from app.log import logger
 
@@ -33,6 +49,20 @@ from ..utils.http import check_response
 from ..utils.url import Url
 from ..utils.sentry import sentry_manager
 from ..utils.exception import DownloadValidationFail
+from ..utils.limiter import AsyncTokenBucket
+
+
+def in_download_session(func):
+    """
+    在下载会话中运行批量下载方法
+    """
+
+    @wraps(func)
+    def wrapper(self: "MediaInfoDownloader", *args, **kwargs):
+        with self.download_session():
+            return func(self, *args, **kwargs)
+
+    return wrapper
 
 
 @sentry_manager.capture_all_class_exceptions
@@ -43,8 +73,8 @@ class MediaInfoDownloader:
 
     # 批处理文件数量
     batch_size = 200
-    # 最大同时下载线程（cdn_url）
-    max_workers = 4
+    # 流式下载写盘缓冲大小
+    write_buffer_size = 256 * 1024
 
     def __init__(self, cookie: str):
         self.cookie = cookie
@@ -73,16 +103,110 @@ class MediaInfoDownloader:
         self.headers = sanitized_headers
 
         self.stop_all_flag = None
+        # 下载会话状态（每个线程独立）
+        self._session = local()
 
         self.mediainfo_count: int = 0
         self.mediainfo_fail_count: int = 0
         self.mediainfo_fail_dict: List = []
+        self.dedup_linked: int = 0
 
         logger.debug(f"【媒体信息文件下载】初始化请求头：{self.headers}")
 
     def __del__(self):
         self.oof_fast_mi_cacher.close()
 
+    @contextmanager
+    def download_session(self) -> Iterator[None]:
+        """
+        下载会话
+
+        会话期间复用同一个事件循环和 HTTP/2 连接池，按令牌桶控制下载速率，
+        结束时输出吞吐量；嵌套调用时复用外层会话
+        """
+        if getattr(self._session, "runner", None) is not None:
+            yield
+            return
+        self._session.runner = asyncio.Runner()
+        self._session.client = None
+        self._session.bucket = None
+        self._session.files = 0
+        self._session.bytes = 0
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            runner = self._session.runner
+            try:
+                if self._session.client is not None:
+                    runner.run(self._session.client.aclose())
+            finally:
+                runner.close()
+                self._session.runner = None
+                self._session.client = None
+                self._session.bucket = None
+            elapsed = max(time.perf_counter() - start, 1e-6)
+            if self._session.files:
+                logger.info(
+                    f"【媒体信息文件下载】本次下载 {self._session.files} 个文件 "
+                    f"{self._session.bytes / 1024 / 1024:.2f} MB，耗时 {elapsed:.1f}s，"
+                    f"吞吐 {self._session.files / elapsed:.2f} 个/s "
+                    f"{self._session.bytes / 1024 / 1024 / elapsed:.2f} MB/s"
+                )
+
+    def _run(self, coro):
+        """
+        在当前下载会话的事件循环中运行协程
+        """
+        runner = getattr(self._session, "runner", None)
+        if runner is None:
+            return asyncio.run(coro)
+        return runner.run(coro)
+
+    @asynccontextmanager
+    async def _http_client(self) -> AsyncIterator[httpx.AsyncClient]:
+        """
+        获取 HTTP 客户端，会话中复用长连接客户端
+        """
+        if getattr(self._session, "runner", None) is None:
+            async with self._new_http_client() as client:
+                yield client
+            return
+        if self._session.client is None:
+            self._session.client = self._new_http_client()
+        yield self._session.client
+
+    @staticmethod
+    def _new_http_client() -> httpx.AsyncClient:
+        concurrency = configer.mediainfo_download_concurrency
+        return httpx.AsyncClient(
+            http2=True,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=concurrency,
+                max_keepalive_connections=concurrency,
+            ),
+        )
+
+    async def _acquire_token(self):
+        """
+        获取下载令牌
+        """
+        if getattr(self._session, "runner", None) is None:
+            return
+        if self._session.bucket is None:
+            self._session.bucket = AsyncTokenBucket(configer.mediainfo_download_rate)
+        await self._session.bucket.acquire()
+
+    def _record_download(self, size: int):
+        """
+        记录下载吞吐
+        """
+        if getattr(self._session, "runner", None) is None:
+            return
+        self._session.files += 1
+        self._session.bytes += size
+
     @staticmethod
     async def async_is_file_leq_1k(file_path: str | Path) -> bool:
         """
@@ -175,6 +299,31 @@ class MediaInfoDownloader:
             else:
                 yield item
 
+    def save_oof_cache_files(self, item_list: List | Tuple) -> Generator:
+        """
+        将本地 OOF 缓存数据流式解压后存入文件
+
+        :param item_list: 待处理的列表
+
+        :return: 迭代器，返回未能处理的项目
+        """
+        for item in item_list:
+            file_path = Path(item["path"])
+            try:
+                if not self.oof_fast_mi_cacher.write_decompressed(
+                    item["sha1"], file_path
+                ):
+                    yield item
+                    continue
+            except Exception as e:
+                logger.error(f"【媒体信息文件下载】处理 {item['path']} 时发生错误: {e}")
+                yield item
+                continue
+            logger.info(
+                f"【媒体信息文件下载】OOF Cache 保存 {file_path.name} 成功: {file_path}"
+            )
+            self.mediainfo_count += 1
+
     def save_mediainfo_file(self, file_path: Path, file_name: str, download_url: str):
         """
         保存媒体信息文件
@@ -219,10 +368,11 @@ class MediaInfoDownloader:
         async with semaphore:
             max_retries = 3
             for attempt in range(max_retries):
-                file_content_buffer = bytearray()
+                if self.stop_all_flag:
+                    return None
+                await self._acquire_token()
                 try:
                     request_headers = self.headers.copy()
-                    request_headers["Connection"] = "close"
                     if hide_cookies:
                         request_headers.pop("Cookie")
 
@@ -234,12 +384,11 @@ class MediaInfoDownloader:
                             response.raise_for_status()
                         response.raise_for_status()
                         file_path.parent.mkdir(parents=True, exist_ok=True)
-                        async with aiofiles.open(file_path, "wb") as f:
-                            async for chunk in response.aiter_bytes(chunk_size=8192):
-                                await f.write(chunk)
-                                file_content_buffer.extend(chunk)
+                        written, compressed = await self._stream_to_file(
+                            response, file_path, compress=bool(sha1)
+                        )
 
-                    if await self.async_is_file_leq_1k(file_path):
+                    if written <= 100:
                         raise DownloadValidationFail(
                             f"【媒体信息文件下载】文件 {file_name} 在下载后验证失败"
                         )
@@ -248,11 +397,18 @@ class MediaInfoDownloader:
                         f"【媒体信息文件下载】保存 {file_name} 成功: {file_path}"
                     )
                     self.mediainfo_count += 1
+                    self._record_download(written)
 
                     if sha1:
+                        if compressed is None:
+                            # 无法流式压缩时读取落盘文件整体压缩
+                            async with aiofiles.open(file_path, "rb") as f:
+                                compressed = self.zstd_compressor.compress(
+                                    await f.read()
+                                )
                         return "files", (
                             sha1,
-                            self.zstd_compressor.compress(file_content_buffer),
+                            compressed,
                             "application/octet-stream",
                         )
                     return None
@@ -286,6 +442,59 @@ class MediaInfoDownloader:
                         f"【媒体信息文件下载】保存 {file_name} 在 {max_retries} 次尝试后最终失败"
                     )
 
+    async def _stream_to_file(
+        self, response: httpx.Response, file_path: Path, compress: bool = False
+    ) -> Tuple[int, Optional[bytes]]:
+        """
+        将响应流式写入文件
+
+        数据经单个可复用缓冲合并后写盘；需要压缩时按块增量 zstd 压缩，
+        仅在响应声明了原始长度时启用（帧头需要写入内容长度以兼容整体解压）
+
+        :param response: 流式响应
+        :param file_path: 文件路径
+        :param compress: 是否返回压缩数据
+
+        :return: (写入字节数, 压缩数据)，无法流式压缩时压缩数据为 None
+        """
+        compressor = None
+        compressed_parts: List[bytes] = []
+        if compress:
+            content_size = None
+            if response.headers.get("content-encoding", "identity") == "identity":
+                try:
+                    content_size = int(response.headers["content-length"])
+                except (KeyError, ValueError):
+                    pass
+            if content_size is not None:
+                # 压缩上下文不能被多个并发的流共享，每个流使用独立的压缩器
+                compressor = ZstdCompressor().compressobj(size=content_size)
+
+        written = 0
+        write_buffer = bytearray()
+        async with aiofiles.open(file_path, "wb") as f:
+            async for chunk in response.aiter_bytes(chunk_size=65536):
+                written += len(chunk)
+                write_buffer += chunk
+                if compressor is not None:
+                    try:
+                        compressed_parts.append(compressor.compress(chunk))
+                    except ZstdError:
+                        compressor = None
+                if len(write_buffer) >= self.write_buffer_size:
+                    await f.write(write_buffer)
+                    write_buffer.clear()
+            if write_buffer:
+                await f.write(write_buffer)
+
+        if compressor is None:
+            return written, None
+        try:
+            compressed_parts.append(compressor.flush())
+        except ZstdError:
+            return written, None
+        return written, b"".join(compressed_parts)
+
     async def __async_download_batch_subtitle_image(
         self,
         data_map: Dict[str | int, str],
@@ -296,8 +505,8 @@ class MediaInfoDownloader:
         """
         为单个批次创建并并发执行所有下载任务
         """
-        semaphore = asyncio.Semaphore(256)
-        async with httpx.AsyncClient(follow_redirects=True) as client:
+        semaphore = asyncio.Semaphore(configer.mediainfo_download_concurrency)
+        async with self._http_client() as client:
             tasks = []
             for item in item_list:
                 url = data_map.get(item[value])
@@ -325,8 +534,8 @@ class MediaInfoDownloader:
         """
         为单个批次分享创建并并发执行所有下载任务
         """
-        semaphore = asyncio.Semaphore(256)
-        async with httpx.AsyncClient(follow_redirects=True) as client:
+        semaphore = asyncio.Semaphore(configer.mediainfo_download_concurrency)
+        async with self._http_client() as client:
             tasks = []
             for item in item_list:
                 path = Path(item["path"])
@@ -345,6 +554,7 @@ class MediaInfoDownloader:
                     return list(filter(bool, result))
         return None
 
+    @in_download_session
     def batch_subtitle_downloader(self, downloads_list: List):
         """
         批量字幕文件下载
@@ -391,7 +601,7 @@ class MediaInfoDownloader:
                     for info in resp["data"]["list"]
                     if info.get("file_id")
                 }
-                asyncio.run(
+                self._run(
                     self.__async_download_batch_subtitle_image(subtitles, item_list)
                 )
             except Exception as e:
@@ -399,6 +609,7 @@ class MediaInfoDownloader:
             finally:
                 self.client.fs_delete(scid)
 
+    @in_download_session
     def batch_share_subtitle_downloader(self, downloads_list: List):
         """
         批量转存字幕下载
@@ -438,7 +649,7 @@ class MediaInfoDownloader:
                     for info in resp["data"]["list"]
                     if info.get("file_id")
                 }
-                asyncio.run(
+                self._run(
                     self.__async_download_batch_subtitle_image(subtitles, item_list)
                 )
             except Exception as e:
@@ -446,6 +657,7 @@ class MediaInfoDownloader:
             finally:
                 self.client.fs_delete(scid)
 
+    @in_download_session
     def batch_image_downloader(self, downloads_list: List):
         """
         批量图片文件下载
@@ -486,14 +698,13 @@ class MediaInfoDownloader:
                             )
                     if url:
                         images[attr["sha1"]] = url
-                asyncio.run(
-                    self.__async_download_batch_subtitle_image(images, item_list)
-                )
+                self._run(self.__async_download_batch_subtitle_image(images, item_list))
             except Exception as e:
                 logger.error(f"【媒体信息文件下载】批处理图片文件失败: {e}")
             finally:
                 self.client.fs_delete(scid)
 
+    @in_download_session
     def batch_oof_fast_mi_downloader(
         self, downloads_list: List, u115_share: bool = False
     ):
@@ -505,10 +716,7 @@ class MediaInfoDownloader:
         3. 115 cdn 下载（下载完成后自动上传+本地缓存）
         """
         for item_list in batched(downloads_list, self.batch_size):
-            json = loads(
-                self.oof_fast_mi_cacher.batch_get([item["sha1"] for item in item_list])
-            )
-            api_item_lst = list(self.save_oof_mediainfo_file(item_list, json, "Cache"))
+            api_item_lst = list(self.save_oof_cache_files(item_list))
             dl_lst: List = api_item_lst
             if not api_item_lst:
                 continue
@@ -536,6 +744,16 @@ class MediaInfoDownloader:
             else:
                 self.batch_downloader(dl_lst, oof_upload=True)
 
+        stats = self.oof_fast_mi_cacher.stats()
+        if stats["hits"]:
+            logger.info(
+                f"【媒体信息文件下载】OOF 本地缓存命中 {stats['hits']}/"
+                f"{stats['hits'] + stats['misses']}，"
+                f"读取 {stats['bytes_read'] / 1024:.1f} KB，"
+                f"写入 {stats['bytes_written'] / 1024:.1f} KB"
+            )
+
+    @in_download_session
     def batch_share_downloader(self, downloads_list: List, oof_upload: bool = False):
         """
         批处理分享其它类型文件下载
@@ -571,24 +789,22 @@ class MediaInfoDownloader:
                 resp = self.client.download_urls(
                     ",".join(pcs), user_agent=configer.get_user_agent()
                 )
-                for batch in batched(resp.items(), self.max_workers):
-                    r_lst = asyncio.run(
-                        self.__async_download_batch_share(
-                            [
-                                {
-                                    "url": value.geturl(),
-                                    "path": sha1_to_path.get(value["sha1"]),
-                                    "sha1": value["sha1"],
-                                }
-                                for _, value in batch
-                            ],
-                            value="url",
-                            oof_upload=oof_upload,
-                        )
+                r_lst = self._run(
+                    self.__async_download_batch_share(
+                        [
+                            {
+                                "url": value.geturl(),
+                                "path": sha1_to_path.get(value["sha1"]),
+                                "sha1": value["sha1"],
+                            }
+                            for value in resp.values()
+                        ],
+                        value="url",
+                        oof_upload=oof_upload,
                     )
-                    if oof_upload:
-                        upload_lst.extend(r_lst)
-                    time.sleep(1)
+                )
+                if oof_upload:
+                    upload_lst.extend(r_lst)
             except Exception as e:
                 logger.error(f"【媒体信息文件下载】批处理下载文件失败: {e}")
             finally:
@@ -597,6 +813,7 @@ class MediaInfoDownloader:
         if oof_upload and upload_lst:
             self._oof_data_upload(upload_lst)
 
+    @in_download_session
     def batch_downloader(self, downloads_list: List, oof_upload: bool = False):
         """
         批处理其它类型文件下载
@@ -611,23 +828,125 @@ class MediaInfoDownloader:
                     ",".join(pcs), user_agent=configer.get_user_agent()
                 )
                 data_map = {key: value.geturl() for key, value in resp.items()}
-                for batch in batched(item_list, self.max_workers):
-                    if self.stop_all_flag:
-                        return
-                    r_lst = asyncio.run(
-                        self.__async_download_batch_subtitle_image(
-                            data_map, batch, value="file_id", oof_upload=oof_upload
-                        )
+                if self.stop_all_flag:
+                    return
+                r_lst = self._run(
+                    self.__async_download_batch_subtitle_image(
+                        data_map, item_list, value="file_id", oof_upload=oof_upload
                     )
-                    if oof_upload:
-                        upload_lst.extend(r_lst)
-                    time.sleep(1)
+                )
+                if oof_upload:
+                    upload_lst.extend(r_lst)
         except Exception as e:
             logger.error(f"【媒体信息文件下载】批处理下载文件失败: {e}")
 
         if oof_upload and upload_lst:
             self._oof_data_upload(upload_lst)
 
+    def _link_or_copy(self, source: Path, target: Path) -> bool:
+        """
+        将已保存的相同内容文件链接或复制到目标路径
+        """
+        try:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            # 先移除旧文件，避免写穿已有的硬链接
+            target.unlink(missing_ok=True)
+            if configer.mediainfo_download_dedup_hardlink:
+                try:
+                    os.link(source, target)
+                except OSError:
+                    copyfile(source, target)
+            else:
+                copyfile(source, target)
+        except OSError as e:
+            logger.error(f"【媒体信息文件下载】复制 {source} 到 {target} 失败: {e}")
+            self.mediainfo_fail_count += 1
+            self.mediainfo_fail_dict.append(target.as_posix())
+            return False
+        logger.info(f"【媒体信息文件下载】相同内容 保存 {target.name} 成功: {target}")
+        self.mediainfo_count += 1
+        self.dedup_linked += 1
+        return True
+
+    def _dedup_downloads(self, downloads_list: List) -> Tuple[List, Dict[str, List]]:
+        """
+        按 sha1 对下载列表去重
+
+        本地内容仓库命中的项目直接写入；其余每个 sha1 只保留第一个项目下载，
+        相同 sha1 的其它目标路径在下载完成后链接或复制
+
+        :return: (待下载列表, {sha1: 其它目标路径列表})
+        """
+        pending: List = []
+        sources: Dict[str, Path] = {}
+        representatives: Set[str] = set()
+        duplicates: Dict[str, List[Path]] = defaultdict(list)
+        for item in downloads_list:
+            sha1 = item.get("sha1")
+            if not sha1:
+                pending.append(item)
+                continue
+            path = Path(item["path"])
+            if sha1 in sources:
+                self._link_or_copy(sources[sha1], path)
+                continue
+            if sha1 in representatives:
+                duplicates[sha1].append(path)
+                continue
+            try:
+                hit = self.oof_fast_mi_cacher.write_blob(sha1, path)
+            except Exception as e:
+                logger.warning(f"【媒体信息文件下载】读取内容仓库 {sha1} 失败: {e}")
+                hit = False
+            if hit:
+                logger.info(
+                    f"【媒体信息文件下载】内容仓库 保存 {path.name} 成功: {path}"
+                )
+                self.mediainfo_count += 1
+                sources[sha1] = path
+                continue
+            representatives.add(sha1)
+            pending.append(item)
+        return pending, duplicates
+
+    def _store_and_fan_out(self, downloaded: List, duplicates: Dict[str, List]):
+        """
+        下载完成的文件存入内容仓库，并分发到相同 sha1 的其它目标路径
+        """
+        failed = set(self.mediainfo_fail_dict)
+        for item in downloaded:
+            sha1 = item.get("sha1")
+            if not sha1:
+                continue
+            path = Path(item["path"])
+            targets = duplicates.get(sha1, [])
+            if path.as_posix() in failed or not path.exists():
+                if targets:
+                    self.mediainfo_fail_count += len(targets)
+                    self.mediainfo_fail_dict.extend(t.as_posix() for t in targets)
+                continue
+            try:
+                self.oof_fast_mi_cacher.set_blob(sha1, path)
+            except Exception as e:
+                logger.warning(f"【媒体信息文件下载】写入内容仓库 {sha1} 失败: {e}")
+            for target in targets:
+                self._link_or_copy(path, target)
+
+    def _log_dedup_stats(self, total: int):
+        """
+        输出 sha1 去重命中率
+        """
+        blob_hits = self.oof_fast_mi_cacher.blob_hits
+        hits = blob_hits + self.dedup_linked
+        if not total or not hits:
+            return
+        logger.info(
+            f"【媒体信息文件下载】sha1 去重命中 {hits}/{total}"
+            f"（内容仓库 {blob_hits}，相同内容 {self.dedup_linked}），"
+            f"命中率 {hits / total:.1%}"
+        )
+
+    @in_download_session
     def batch_auto_downloader(self, downloads_list: List):
         """
         根据列表自动批量下载
@@ -640,6 +959,11 @@ class MediaInfoDownloader:
         self.mediainfo_count: int = 0
         self.mediainfo_fail_count: int = 0
         self.mediainfo_fail_dict: List = []
+        self.dedup_linked = 0
+        self.oof_fast_mi_cacher.reset_stats()
+
+        total = len(downloads_list)
+        downloads_list, duplicates = self._dedup_downloads(downloads_list)
 
         image_list: List = []
         subtitle_list: List = []
@@ -671,8 +995,12 @@ class MediaInfoDownloader:
         if other_list and not self.stop_all_flag:
             self.batch_downloader(other_list)
 
+        self._store_and_fan_out(downloads_list, duplicates)
+        self._log_dedup_stats(total)
+
         return self.mediainfo_count, self.mediainfo_fail_count, self.mediainfo_fail_dict
 
+    @in_download_session
     def batch_auto_share_downloader(self, downloads_list: List):
         """
         根据列表自动批量分享下载
@@ -683,6 +1011,11 @@ class MediaInfoDownloader:
         self.mediainfo_count: int = 0
         self.mediainfo_fail_count: int = 0
         self.mediainfo_fail_dict: List = []
+        self.dedup_linked = 0
+        self.oof_fast_mi_cacher.reset_stats()
+
+        total = len(downloads_list)
+        downloads_list, duplicates = self._dedup_downloads(downloads_list)
 
         image_list: List = []
         subtitle_list: List = []
@@ -706,7 +1039,7 @@ class MediaInfoDownloader:
                 other_list_append(item)
 
         if image_list:
-            asyncio.run(self.__async_download_batch_share(image_list))
+            self._run(self.__async_download_batch_share(image_list))
         if subtitle_list:
             self.batch_share_subtitle_downloader(subtitle_list)
         if oof_fast_mi_list:
@@ -714,4 +1047,7 @@ class MediaInfoDownloader:
         if other_list:
             self.batch_share_downloader(other_list)
 
+        self._store_and_fan_out(downloads_list, duplicates)
+        self._log_dedup_stats(total)
+
         return self.mediainfo_count, self.mediainfo_fail_count, self.mediainfo_fail_dict
@@ -1,12 +1,25 @@
 from collections.abc import Mapping
 from concurrent.futures import ThreadPoolExecutor
 from errno import EIO, ENOENT
-from typing import cast, Dict, Optional
+from pathlib import Path
+from time import monotonic
+from typing import (
+    cast,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    MutableMapping,
+    Optional,
+    Set,
+    Tuple,
+)
 from urllib.parse import parse_qsl, unquote, urlsplit, urlencode
 
 import asyncio
 
 import httpx
+from cachetools import TTLCache as MemoryTTLCache
 from orjson import dumps, loads
 from p115client import P115Client
 from p115client import check_response as p115_check_response
@@ -18,11 +31,145 @@ from app.log import logger
 from ..core.u115_open import U115OpenHelper
 from ..core.config import configer
 from ..core.cache import r302cacher
+from ..db_manager.oper import FileDbHelper
 from ..utils.http import check_response
+from ..utils.singleflight import AsyncSingleFlight
 from ..utils.url import Url
 from ..utils.sentry import sentry_manager
 
 
+class R302Prewarmer:
+    """
+    302 下载地址预热
+
+    播放某个文件时，在后台解析并缓存同一目录下按名称排序的后续 N 个媒体文件的下载地址；
+    每分钟的预热次数有上限且同一时间只运行一个预热任务，避免挤占实时请求
+    """
+
+    # 预热任务触发去重时间（秒）
+    TRIGGER_TTL = 600
+    # 预热延迟（秒），让触发预热的实时请求先完成
+    START_DELAY = 1.0
+
+    def __init__(self):
+        self._window_start = 0.0
+        self._used = 0
+        self._triggered: MutableMapping[Tuple[str, str], bool] = MemoryTTLCache(
+            maxsize=4096, ttl=self.TRIGGER_TTL
+        )
+        self._lock = asyncio.Lock()
+        self._tasks: Set[asyncio.Task] = set()
+        self.warmed = 0
+        self.skipped = 0
+
+    @staticmethod
+    def enabled() -> bool:
+        """
+        是否启用预热
+
+        多端播放开启时，预热写入的缓存会被计为已播放，导致后续真实播放走复制流程，
+        且预热请求本身也可能触发复制，因此不预热
+        """
+        return bool(configer.get_config("redirect_prewarm_enabled")) and not bool(
+            configer.get_config("same_playback")
+        )
+
+    def _take_budget(self) -> bool:
+        """
+        消耗一次预热额度，按 60 秒窗口重置
+        """
+        now = monotonic()
+        if now - self._window_start >= 60:
+            self._window_start = now
+            self._used = 0
+        if self._used >= configer.get_config("redirect_prewarm_budget"):
+            return False
+        self._used += 1
+        return True
+
+    @staticmethod
+    def _next_pickcodes(pickcode: str, count: int) -> List[str]:
+        """
+        从数据库获取同目录后续媒体文件的 pick_code
+        """
+        media_exts = {
+            f".{ext.strip()}".lower()
+            for ext in configer.get_config("user_rmt_mediaext")
+            .replace("，", ",")
+            .split(",")
+        }
+        pickcodes = []
+        for item in FileDbHelper().get_next_files(to_id(pickcode), count * 5):
+            if Path(item["name"]).suffix.lower() not in media_exts:
+                continue
+            if item.get("pickcode"):
+                pickcodes.append(item["pickcode"].lower())
+            if len(pickcodes) >= count:
+                break
+        return pickcodes
+
+    def schedule(
+        self,
+        pickcode: str,
+        cache_ua: str,
+        resolve: Callable[[str], Awaitable[Url]],
+    ):
+        """
+        调度预热任务
+
+        :param pickcode: 当前播放文件 pick_code
+        :param cache_ua: 缓存 UA 键
+        :param resolve: 解析并缓存指定 pick_code 下载地址的协程函数
+        """
+        if not self.enabled() or (pickcode, cache_ua) in self._triggered:
+            return
+        self._triggered[(pickcode, cache_ua)] = True
+        task = asyncio.create_task(self._prewarm(pickcode, cache_ua, resolve))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _prewarm(
+        self,
+        pickcode: str,
+        cache_ua: str,
+        resolve: Callable[[str], Awaitable[Url]],
+    ):
+        await asyncio.sleep(self.START_DELAY)
+        async with self._lock:
+            try:
+                pickcodes = await asyncio.to_thread(
+                    self._next_pickcodes,
+                    pickcode,
+                    configer.get_config("redirect_prewarm_count"),
+                )
+            except Exception as e:
+                logger.debug(f"【302跳转服务】预热获取后续文件失败 {pickcode}: {e}")
+                return
+            for next_pickcode in pickcodes:
+                if await r302cacher.get(next_pickcode, cache_ua):
+                    continue
+                if not self._take_budget():
+                    self.skipped += 1
+                    logger.debug(f"【302跳转服务】预热额度已用尽，跳过 {next_pickcode}")
+                    return
+                try:
+                    await resolve(next_pickcode)
+                    self.warmed += 1
+                    logger.debug(
+                        f"【302跳转服务】预热下载地址 {next_pickcode} {cache_ua}"
+                    )
+                except Exception as e:
+                    logger.debug(
+                        f"【302跳转服务】预热下载地址失败 {next_pickcode}: {e}"
+                    )
+
+    def stats(self) -> Dict[str, int]:
+        """
+        预热统计
+        """
+        return {"warmed": self.warmed, "skipped": self.skipped}
+
+
 @sentry_manager.capture_all_class_exceptions
 class Redirect:
     """
@@ -30,6 +177,10 @@ class Redirect:
     """
 
     _http_client: Optional[httpx.AsyncClient] = None
+    # 下载链接解析请求合并，同一事件循环内所有实例共享
+    downurl_flight = AsyncSingleFlight()
+    # 下载地址预热
+    prewarmer = R302Prewarmer()
 
     def __init__(self, client: P115Client, pid: Optional[int] = None):
         self.client = client
@@ -178,6 +329,20 @@ class Redirect:
         receive_code = json["data"]["receive_code"]
         return receive_code
 
+    async def _resolve_downurl(
+        self,
+        pickcode: str,
+        cache_ua: str,
+        fetch: Callable[[], Awaitable[Url]],
+    ) -> Url:
+        """
+        合并同一 (pickcode, UA) 的并发缓存未命中请求，只向上游请求一次
+        """
+        key = (pickcode, cache_ua)
+        if key in self.downurl_flight:
+            logger.debug(f"【302跳转服务】合并并发请求 {pickcode} {cache_ua}")
+        return await self.downurl_flight.do(key, fetch)
+
     async def get_downurl_cookie(
         self,
         pickcode: str,
@@ -191,6 +356,16 @@ class Redirect:
         else:
             cache_ua = user_agent
 
+        self.prewarmer.schedule(
+            pickcode,
+            cache_ua,
+            lambda next_pickcode: self._resolve_downurl(
+                next_pickcode,
+                cache_ua,
+                lambda: self._fetch_downurl_cookie(next_pickcode, user_agent, cache_ua),
+            ),
+        )
+
         cache_url = await r302cacher.get(pickcode, cache_ua)
         if cache_url:
             logger.debug(f"【302跳转服务】缓存获取 {pickcode} {cache_ua} {cache_url}")
@@ -199,6 +374,21 @@ class Redirect:
                 {"file_name": unquote(urlsplit(cache_url).path.rpartition("/")[-1])},
             )
 
+        return await self._resolve_downurl(
+            pickcode,
+            cache_ua,
+            lambda: self._fetch_downurl_cookie(pickcode, user_agent, cache_ua),
+        )
+
+    async def _fetch_downurl_cookie(
+        self,
+        pickcode: str,
+        user_agent: str,
+        cache_ua: str,
+    ) -> Url:
+        """
+        请求上游获取下载链接并写入缓存
+        """
         post_pickcode = pickcode
         if (
             configer.get_config("same_playback")
@@ -250,6 +440,16 @@ class Redirect:
         else:
             cache_ua = user_agent
 
+        self.prewarmer.schedule(
+            pickcode,
+            cache_ua,
+            lambda next_pickcode: self._resolve_downurl(
+                next_pickcode,
+                cache_ua,
+                lambda: self._fetch_downurl_open(next_pickcode, user_agent, cache_ua),
+            ),
+        )
+
         cache_url = await r302cacher.get(pickcode, cache_ua)
         if cache_url:
             logger.debug(f"【302跳转服务】缓存获取 {pickcode} {cache_ua} {cache_url}")
@@ -258,6 +458,21 @@ class Redirect:
                 {"file_name": unquote(urlsplit(cache_url).path.rpartition("/")[-1])},
             )
 
+        return await self._resolve_downurl(
+            pickcode,
+            cache_ua,
+            lambda: self._fetch_downurl_open(pickcode, user_agent, cache_ua),
+        )
+
+    async def _fetch_downurl_open(
+        self,
+        pickcode: str,
+        user_agent: str,
+        cache_ua: str,
+    ) -> Url:
+        """
+        请求上游获取下载链接并写入缓存
+        """
         post_pickcode = pickcode
         if (
             configer.get_config("same_playback")
@@ -0,0 +1,308 @@
+from array import array
+from hashlib import sha1
+from pathlib import Path
+from shutil import rmtree
+from threading import Lock
+from time import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from orjson import dumps, loads, JSONDecodeError
+
+from app.log import logger
+
+from ...core.config import configer
+
+
+class FullSyncCheckpoint:
+    """
+    全量同步断点
+
+    按 full_sync_strm_paths 的每一行单独持久化：已成功处理的文件 ID、
+    已见目录节点、已发射 STRM 路径（目录树）和待下载的媒体信息文件
+    """
+
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+
+    def __init__(self, entry: str, base_dir: Optional[Path] = None):
+        """
+        :param entry: full_sync_strm_paths 中的一行（本地路径#网盘路径）
+        :param base_dir: 断点根目录
+        """
+        self.entry = entry
+        self.base_dir = base_dir or self.default_base_dir()
+        self.path = self.base_dir / sha1(entry.encode("utf-8")).hexdigest()
+        self.state_path = self.path / "state.json"
+        self.file_ids_path = self.path / "file_ids.bin"
+        self.dirnodes_path = self.path / "dirnodes.jsonl"
+        self.downloads_path = self.path / "downloads.jsonl"
+        self.pan_tree_path = self.path / "pan_tree.txt"
+        self.state: Dict = self._load_state()
+        self._lock = Lock()
+
+    @staticmethod
+    def default_base_dir() -> Path:
+        """
+        断点默认存放目录
+        """
+        return configer.PLUGIN_CONFIG_PATH / "full_sync_checkpoint"
+
+    def _load_state(self) -> Dict:
+        try:
+            return loads(self.state_path.read_bytes())
+        except (FileNotFoundError, JSONDecodeError):
+            return {}
+
+    def _save_state(self):
+        self.state["updated_at"] = int(time())
+        tmp_path = self.state_path.with_suffix(".tmp")
+        tmp_path.write_bytes(dumps(self.state))
+        tmp_path.replace(self.state_path)
+
+    @property
+    def status(self) -> Optional[str]:
+        return self.state.get("status")
+
+    @property
+    def resumable(self) -> bool:
+        """
+        是否存在可继续的断点
+        """
+        return self.status == self.STATUS_RUNNING
+
+    @property
+    def done(self) -> bool:
+        return self.status == self.STATUS_DONE
+
+    def reset(self):
+        """
+        丢弃旧断点，开始新的同步
+        """
+        self.clear()
+        self.path.mkdir(parents=True, exist_ok=True)
+        now = int(time())
+        self.state = {
+            "entry": self.entry,
+            "status": self.STATUS_RUNNING,
+            "items": 0,
+            "strm_fail_dict": {},
+            "started_at": now,
+        }
+        self._save_state()
+
+    def resume(self):
+        """
+        从断点继续，失败的文件会被重新处理，清空失败记录
+        """
+        with self._lock:
+            self.state["strm_fail_dict"] = {}
+            self._save_state()
+
+    def clear(self):
+        """
+        删除断点
+        """
+        if self.path.exists():
+            rmtree(self.path, ignore_errors=True)
+        self.state = {}
+
+    def load_file_ids(self) -> Set[int]:
+        """
+        读取已处理的文件 ID
+        """
+        file_ids = array("Q")
+        try:
+            file_ids.frombytes(self.file_ids_path.read_bytes())
+        except (FileNotFoundError, ValueError):
+            return set()
+        return set(file_ids)
+
+    def load_dirnodes(self) -> Dict[int, Tuple[str, int]]:
+        """
+        读取已见目录节点，可直接作为 id_to_dirnode 传入迭代函数
+        """
+        dirnodes: Dict[int, Tuple[str, int]] = {}
+        try:
+            with open(self.dirnodes_path, "rb") as f:
+                for line in f:
+                    try:
+                        folder_id, name, parent_id = loads(line)
+                    except (JSONDecodeError, ValueError):
+                        continue
+                    dirnodes[folder_id] = (name, parent_id)
+        except FileNotFoundError:
+            pass
+        return dirnodes
+
+    def load_downloads(self) -> List[Dict]:
+        """
+        读取已排队但尚未下载的媒体信息文件
+        """
+        downloads: List[Dict] = []
+        try:
+            with open(self.downloads_path, "rb") as f:
+                for line in f:
+                    try:
+                        info = loads(line)
+                    except JSONDecodeError:
+                        continue
+                    info["path"] = Path(info["path"])
+                    downloads.append(info)
+        except FileNotFoundError:
+            pass
+        return downloads
+
+    def commit_batch(
+        self,
+        file_ids: Iterable[int],
+        dirnodes: Dict[int, Tuple[str, int]],
+        downloads: List[Dict],
+        strm_fail_dict: Dict[str, str],
+    ):
+        """
+        记录一个已完成（已写入数据库与 STRM 文件）的批次，可在多个线程中调用
+
+        :param file_ids: 本批次成功处理的文件 ID
+        :param dirnodes: 本批次新发现的目录节点
+        :param downloads: 本批次新增的媒体信息下载任务
+        :param strm_fail_dict: 本批次的失败记录
+        """
+        ids = array("Q", file_ids)
+        with self._lock:
+            with open(self.file_ids_path, "ab") as f:
+                ids.tofile(f)
+            if dirnodes:
+                with open(self.dirnodes_path, "ab") as f:
+                    f.writelines(
+                        dumps([folder_id, name, parent_id]) + b"\n"
+                        for folder_id, (name, parent_id) in dirnodes.items()
+                    )
+            if downloads:
+                with open(self.downloads_path, "ab") as f:
+                    f.writelines(
+                        dumps({**info, "path": str(info["path"])}) + b"\n"
+                        for info in downloads
+                    )
+            self.state["items"] = self.state.get("items", 0) + len(ids)
+            self.state.setdefault("strm_fail_dict", {}).update(strm_fail_dict)
+            self._save_state()
+
+    def mark_done(self):
+        """
+        标记该路径遍历完成
+        """
+        with self._lock:
+            self.state["status"] = self.STATUS_DONE
+            self._save_state()
+
+    def summary(self) -> Dict:
+        """
+        断点摘要
+        """
+        return {
+            "entry": self.entry,
+            "status": self.status,
+            "items": self.state.get("items", 0),
+            "fail_count": len(self.state.get("strm_fail_dict", {})),
+            "started_at": self.state.get("started_at"),
+            "updated_at": self.state.get("updated_at"),
+        }
+
+    @classmethod
+    def list_all(cls, base_dir: Optional[Path] = None) -> List[Dict]:
+        """
+        列出所有断点摘要
+        """
+        base_dir = base_dir or cls.default_base_dir()
+        if not base_dir.exists():
+            return []
+        summaries = []
+        for state_path in base_dir.glob("*/state.json"):
+            try:
+                entry = loads(state_path.read_bytes()).get("entry")
+            except (OSError, JSONDecodeError) as e:
+                logger.warning(f"【全量STRM生成】读取断点失败 {state_path}: {e}")
+                continue
+            if entry:
+                summaries.append(cls(entry, base_dir).summary())
+        return summaries
+
+
+class CheckpointBatch:
+    """
+    断点中的一个批次
+
+    批次内的 STRM 文件由写入线程池异步写入，批次封存且所有写入结束后才提交到断点，
+    只有未失败的文件 ID 会被记录，失败的文件在下次继续时重新处理
+    """
+
+    def __init__(self, checkpoint: FullSyncCheckpoint):
+        self.checkpoint = checkpoint
+        self._lock = Lock()
+        # 封存前额外持有一个计数，避免写入先于封存全部完成时提前提交
+        self._pending = 1
+        self._file_ids: List[int] = []
+        self._dirnodes: Dict[int, Tuple[str, int]] = {}
+        self._downloads: List[Dict] = []
+        self._strm_fail_dict: Dict[str, str] = {}
+
+    def track(self, file_id: int) -> Tuple["CheckpointBatch", int]:
+        """
+        登记一个待写入的 STRM 文件
+
+        :return: 写入凭据，写入完成后传给 write_done
+        """
+        with self._lock:
+            self._pending += 1
+        return self, file_id
+
+    def write_done(self, file_id: int, path: str, error: Optional[str] = None):
+        """
+        一个 STRM 文件写入结束
+
+        :param file_id: 文件 ID
+        :param path: STRM 文件路径
+        :param error: 写入失败原因，成功时为 None
+        """
+        with self._lock:
+            if error is None:
+                self._file_ids.append(file_id)
+            else:
+                self._strm_fail_dict[path] = error
+            self._pending -= 1
+            ready = self._pending == 0
+        if ready:
+            self._commit()
+
+    def seal(
+        self,
+        file_ids: Iterable[int],
+        dirnodes: Dict[int, Tuple[str, int]],
+        downloads: List[Dict],
+        strm_fail_dict: Dict[str, str],
+    ):
+        """
+        封存批次，此后不再登记新的写入
+
+        :param file_ids: 本批次无需写入 STRM 且未失败的文件 ID
+        :param dirnodes: 本批次新发现的目录节点
+        :param downloads: 本批次新增的媒体信息下载任务
+        :param strm_fail_dict: 本批次的失败记录
+        """
+        with self._lock:
+            self._file_ids.extend(file_ids)
+            self._dirnodes = dirnodes
+            self._downloads = downloads
+            self._strm_fail_dict.update(strm_fail_dict)
+            self._pending -= 1
+            ready = self._pending == 0
+        if ready:
+            self._commit()
+
+    def _commit(self):
+        self.checkpoint.commit_batch(
+            file_ids=self._file_ids,
+            dirnodes=self._dirnodes,
+            downloads=self._downloads,
+            strm_fail_dict=self._strm_fail_dict,
+        )
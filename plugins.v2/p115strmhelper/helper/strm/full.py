@@ -2,8 +2,7 @@ from collections import namedtuple
 from concurrent.futures import as_completed, ThreadPoolExecutor
 from itertools import batched
 from pathlib import Path
-from os import makedirs
-from queue import Empty, Queue
+from queue import Queue
 from threading import Thread
 from time import perf_counter, sleep
 from typing import List, Dict, Optional, Set, Tuple
@@ -21,10 +20,12 @@ from app.log import logger
 from full_strm_sync import Processor, PackedResult
 from full_strm_sync import __version__ as rust_core_version
 
+from ...core.cache import StrmFingerprintCache, folderpathcacher
 from ...core.config import configer
 from ...core.p115 import get_pid_by_path
 from ...db_manager.oper import FileDbHelper
 from ...helper.mediainfo_download import MediaInfoDownloader
+from ...helper.strm.checkpoint import CheckpointBatch, FullSyncCheckpoint
 from ...utils.automaton import AutomatonUtils
 from ...utils.exception import (
     FileItemKeyMiss,
@@ -34,6 +35,7 @@ from ...utils.path import PathUtils, PathRemoveUtils
 from ...utils.sentry import sentry_manager
 from ...utils.strm import StrmUrlGetter, StrmGenerater
 from ...utils.tree import DirectoryTree
+from ...utils.writer import AdaptiveWriterPool
 from ...utils.http import check_iter_path_data
 from ...utils.base64 import CBase64
 from ...utils.math import MathUtils
@@ -76,6 +78,7 @@ class FullSyncStrmHelper:
         self.strm_fail_count = 0
         self.mediainfo_fail_count = 0
         self.remove_unless_strm_count = 0
+        self.strm_unchanged_count = 0
         self.strm_fail_dict: Dict[str, str] = {}
         self.mediainfo_fail_dict: List = []
         self.pan_transfer_enabled = configer.pan_transfer_enabled
@@ -84,6 +87,11 @@ class FullSyncStrmHelper:
         self.remove_unless_strm = configer.full_sync_remove_unless_strm
         self.databasehelper = FileDbHelper()
         self.download_mediainfo_list = []
+        self.fingerprint_cache: Optional[StrmFingerprintCache] = None
+        if configer.full_sync_skip_unchanged_strm:
+            self.fingerprint_cache = StrmFingerprintCache(
+                configer.PLUGIN_CONFIG_PATH / "strm_fingerprint"
+            )
 
         self.mediaserver_helper = MediaServerRefresh(
             func_name="【全量STRM生成】",
@@ -102,11 +110,15 @@ class FullSyncStrmHelper:
 
         self.write_queue = Queue(maxsize=4096)
         self.result_queue = Queue()
+        self.writer = AdaptiveWriterPool(
+            task_queue=self.write_queue,
+            flush=self.__flush_write_buffer,
+            min_workers=configer.full_sync_io_workers_min,
+            max_workers=configer.full_sync_io_workers_max,
+        )
 
         self.local_tree_path = configer.PLUGIN_TEMP_PATH / "local_tree.txt"
-        self.pan_tree_path = configer.PLUGIN_TEMP_PATH / "pan_tree.txt"
         self.local_tree = DirectoryTree(self.local_tree_path)
-        self.pan_tree = DirectoryTree(self.pan_tree_path)
 
         if configer.full_sync_strm_log:
             self.__base_logger = self.__base_has_logger
@@ -119,9 +131,10 @@ class FullSyncStrmHelper:
     def _clean_tree(self):
         """
         清理目录树文件
+
+        网盘目录树保存在断点目录中，由断点负责清理
         """
         self.local_tree.clear()
-        self.pan_tree.clear()
 
     @staticmethod
     def __base_no_logger(level, msg, *args):
@@ -211,21 +224,23 @@ class FullSyncStrmHelper:
 
         for item in batch:
             ancestors = item.get("ancestors", [])
-            path_parts = []
+            path = ""
             for ancestor in ancestors[1:-1]:
-                path_parts.append(ancestor["name"])
-                path = "/" + "/".join(path_parts)
+                path = f"{path}/{ancestor['name']}"
                 ancestor_id = str(ancestor["id"])
-                if ancestor_id not in seen_folder_ids:
-                    folders_list.append(
-                        {
-                            "id": ancestor["id"],
-                            "parent_id": ancestor["parent_id"],
-                            "name": ancestor["name"],
-                            "path": path,
-                        }
-                    )
-                    seen_folder_ids.add(ancestor_id)
+                if ancestor_id in seen_folder_ids or folderpathcacher.is_known(
+                    ancestor_id, path
+                ):
+                    continue
+                folders_list.append(
+                    {
+                        "id": ancestor["id"],
+                        "parent_id": ancestor["parent_id"],
+                        "name": ancestor["name"],
+                        "path": path,
+                    }
+                )
+                seen_folder_ids.add(ancestor_id)
             file_id = str(item["id"])
             if file_id not in seen_file_ids:
                 files_list.append(
@@ -239,7 +254,7 @@ class FullSyncStrmHelper:
                         "ctime": item.get("ctime", 0),
                         "mtime": item.get("mtime", 0),
                         "path": item.get("path", ""),
-                        "extra": dumps(item).decode("utf-8") if item else None,
+                        "extra": FileDbHelper.encode_extra(item),
                     }
                 )
                 seen_file_ids.add(file_id)
@@ -251,73 +266,73 @@ class FullSyncStrmHelper:
 
         return seen_folder_ids, seen_file_ids
 
-    def __io_writer_worker(self):
-        """
-        写入 STRM 文件操作
-        """
-        buffer_size = 64
-
-        while True:
-            tasks: List[Tuple[Path, str, str]] = []
-            task_done_handled = False
-            try:
-                first_task = self.write_queue.get()
-                if first_task is None:
-                    self.result_queue.put(None)
-                    self.write_queue.task_done()
-                    break
-                tasks.append(first_task)
-
-                while len(tasks) < buffer_size:
-                    try:
-                        extra_task = self.write_queue.get_nowait()
-                        if extra_task is None:
-                            self.__flush_write_buffer(tasks)
-                            for _ in tasks:
-                                self.write_queue.task_done()
-                            self.result_queue.put(None)
-                            self.write_queue.task_done()
-                            task_done_handled = True
-                            return
-                        tasks.append(extra_task)
-                    except Empty:
-                        break
-                self.__flush_write_buffer(tasks)
-            finally:
-                if not task_done_handled:
-                    for _ in tasks:
-                        self.write_queue.task_done()
-
-    def __flush_write_buffer(self, tasks: List[Tuple[Path, str, str]]):
+    def __flush_write_buffer(
+        self, tasks: List[Tuple[Path, str, str, Optional[Tuple[CheckpointBatch, int]]]]
+    ):
         """
         批量处理写入任务
+
+        开启指纹缓存时，内容未变化且文件仍存在的 STRM 不会被重写
         """
-        for new_file_path, strm_url, original_file_name in tasks:
+        known_fingerprints: Dict[str, Optional[bytes]] = {}
+        written_fingerprints: Dict[str, bytes] = {}
+        if self.fingerprint_cache:
+            known_fingerprints = self.fingerprint_cache.batch_get(
+                str(new_file_path) for new_file_path, _, _, _ in tasks
+            )
+
+        for new_file_path, strm_url, original_file_name, ticket in tasks:
+            fingerprint = None
+            if self.fingerprint_cache:
+                fingerprint = StrmFingerprintCache.fingerprint(strm_url)
+                if (
+                    known_fingerprints.get(str(new_file_path)) == fingerprint
+                    and new_file_path.exists()
+                ):
+                    self.result_queue.put(
+                        ProcessResult(
+                            status="unchanged",
+                            path=str(new_file_path),
+                            message=None,
+                            data=ticket,
+                            path_entry=None,
+                        )
+                    )
+                    continue
             try:
+                write_start = perf_counter()
+                self.writer.ensure_parent(new_file_path)
                 with open(new_file_path, "w", encoding="utf-8") as file:
                     file.write(strm_url)
+                self.writer.observe(perf_counter() - write_start)
 
+                if fingerprint:
+                    written_fingerprints[str(new_file_path)] = fingerprint
                 self.result_queue.put(
                     ProcessResult(
                         status="success",
                         path=str(new_file_path),
                         message=None,
-                        data=None,
+                        data=ticket,
                         path_entry=None,
                     )
                 )
             except FileNotFoundError:
                 try:
-                    makedirs(new_file_path.parent, exist_ok=True)
+                    # 目录在缓存后被外部删除
+                    self.writer.forget_parent(new_file_path)
+                    self.writer.ensure_parent(new_file_path)
                     with open(new_file_path, "w", encoding="utf-8") as file:
                         file.write(strm_url)
 
+                    if fingerprint:
+                        written_fingerprints[str(new_file_path)] = fingerprint
                     self.result_queue.put(
                         ProcessResult(
                             status="success",
                             path=str(new_file_path),
                             message=None,
-                            data=None,
+                            data=ticket,
                             path_entry=None,
                         )
                     )
@@ -333,7 +348,7 @@ class FullSyncStrmHelper:
                             status="fail",
                             path=str(new_file_path),
                             message=str(e),
-                            data=None,
+                            data=ticket,
                             path_entry=None,
                         )
                     )
@@ -349,13 +364,23 @@ class FullSyncStrmHelper:
                         status="fail",
                         path=str(new_file_path),
                         message=str(e),
-                        data=None,
+                        data=ticket,
                         path_entry=None,
                     )
                 )
 
+        if written_fingerprints:
+            try:
+                self.fingerprint_cache.batch_set(written_fingerprints)
+            except Exception as e:
+                logger.warning(f"【全量STRM生成】写入 STRM 指纹缓存失败: {e}")
+
     def __process_single_item(
-        self, item: Dict, target_dir: Path, pan_media_dir: str
+        self,
+        item: Dict,
+        target_dir: Path,
+        pan_media_dir: str,
+        ckpt_batch: CheckpointBatch,
     ) -> Optional[ProcessResult]:
         """
         处理单个项目
@@ -575,7 +600,8 @@ class FullSyncStrmHelper:
             strm_url = self.strmurlgetter.get_strm_url(
                 pickcode, original_file_name, item.get("path")
             )
-            self.write_queue.put((new_file_path, strm_url, original_file_name))
+            ticket = ckpt_batch.track(int(item["id"])) if item.get("id") else None
+            self.write_queue.put((new_file_path, strm_url, original_file_name, ticket))
 
             return ProcessResult(
                 status="submitted",
@@ -668,34 +694,56 @@ class FullSyncStrmHelper:
             f"【全量STRM生成】全量更新数据库完成，时间 {self.elapsed_time:.6f} 秒，数据库写入量 {self.total_db_write_count} 条"
         )
 
-    def generate_strm_files(self, full_sync_strm_paths):
+    @staticmethod
+    def __collect_dirnodes(
+        batch, recorded_dir_ids: Set[int]
+    ) -> Dict[int, Tuple[str, int]]:
+        """
+        收集批次中新出现的目录节点
+        """
+        dirnodes: Dict[int, Tuple[str, int]] = {}
+        for item in batch:
+            for ancestor in item.get("ancestors", [])[1:-1]:
+                ancestor_id = int(ancestor["id"])
+                if ancestor_id in recorded_dir_ids:
+                    continue
+                dirnodes[ancestor_id] = (ancestor["name"], int(ancestor["parent_id"]))
+                recorded_dir_ids.add(ancestor_id)
+        return dirnodes
+
+    def generate_strm_files(self, full_sync_strm_paths, resume: bool = False):
         """
         生成 STRM 文件
+
+        :param full_sync_strm_paths: 全量同步路径
+        :param resume: 是否从上次中断的断点继续
         """
         rust = configer.full_sync_process_rust
         media_paths = full_sync_strm_paths.split("\n")
+        checkpoints: List[FullSyncCheckpoint] = []
 
-        num_io_workers = 8
-        io_threads = []
-        for _ in range(num_io_workers):
-            thread = Thread(target=self.__io_writer_worker)
-            thread.daemon = True
-            thread.start()
-            io_threads.append(thread)
+        self.writer.start()
 
         def result_collector():
-            finished_workers = 0
-            while finished_workers < num_io_workers:
+            while True:
                 try:
                     result = self.result_queue.get()
                     if result is None:
-                        finished_workers += 1
-                        continue
+                        break
                     if result.status == "success":
                         self.strm_count += 1
+                    elif result.status == "unchanged":
+                        self.strm_unchanged_count += 1
                     elif result.status == "fail":
                         self.strm_fail_count += 1
                         self.strm_fail_dict[result.path] = result.message
+                    if result.data:
+                        ckpt_batch, file_id = result.data
+                        ckpt_batch.write_done(
+                            file_id,
+                            result.path,
+                            result.message if result.status == "fail" else None,
+                        )
                 finally:
                     self.result_queue.task_done()
 
@@ -714,6 +762,33 @@ class FullSyncStrmHelper:
                 pan_media_dir = parts[1]
                 target_dir = parts[0]
 
+                checkpoint = FullSyncCheckpoint(path)
+                checkpoints.append(checkpoint)
+                if resume and checkpoint.done:
+                    logger.info(
+                        f"【全量STRM生成】{path} 已在上次运行中完成，从断点跳过"
+                    )
+                    continue
+                pan_tree = DirectoryTree(checkpoint.pan_tree_path)
+                done_file_ids: Set[int] = set()
+                known_dirnodes: Dict[int, Tuple[str, int]] = {}
+                # 中断前已写入目录树的路径，未提交的批次重新遍历时不再重复写入
+                pan_tree_paths: Set[str] = set()
+                if resume and checkpoint.resumable:
+                    done_file_ids = checkpoint.load_file_ids()
+                    known_dirnodes = checkpoint.load_dirnodes()
+                    self.download_mediainfo_list.extend(checkpoint.load_downloads())
+                    if self.remove_unless_strm:
+                        pan_tree_paths = set(pan_tree.iter_paths())
+                    checkpoint.resume()
+                    logger.info(
+                        f"【全量STRM生成】从断点继续: {path}，已完成 {len(done_file_ids)} 个文件"
+                    )
+                else:
+                    checkpoint.reset()
+                    pan_tree.clear()
+                recorded_dir_ids: Set[int] = set(known_dirnodes)
+
                 if self.remove_unless_strm:
                     local_tree_task_thread = self.__remove_unless_strm_local(target_dir)
 
@@ -779,6 +854,8 @@ class FullSyncStrmHelper:
                     logger.debug(
                         f"【全量STRM生成】迭代函数 {iter_func}; 参数 {iter_kwargs}"
                     )
+                    if known_dirnodes:
+                        iter_kwargs["id_to_dirnode"] = known_dirnodes
                     start_time = perf_counter()
                     seen_folder_ids: Set[str] = set()
                     seen_file_ids: Set[str] = set()
@@ -786,7 +863,20 @@ class FullSyncStrmHelper:
                         iter_func(self.client, **iter_kwargs),
                         int(configer.get_config("full_sync_batch_num")),
                     ):
+                        if done_file_ids:
+                            batch = [
+                                item
+                                for item in batch
+                                if int(item.get("id", 0)) not in done_file_ids
+                            ]
+                            if not batch:
+                                continue
                         path_list: List = []
+                        download_start = len(self.download_mediainfo_list)
+                        ckpt_batch = CheckpointBatch(checkpoint)
+                        # 写入 STRM 或处理失败的文件，不在封存时记为已完成
+                        excluded_ids: Set[int] = set()
+                        batch_fails: Dict[str, str] = {}
 
                         db_task_future = executor.submit(
                             self.__process_db_item,
@@ -812,6 +902,11 @@ class FullSyncStrmHelper:
                             ]
 
                             self.total_count += len(input_batch)
+                            id_by_path = {
+                                item.get("path"): int(item["id"])
+                                for item in batch
+                                if item.get("id")
+                            }
 
                             batch_json = dumps(input_batch).decode("utf-8")
                             results: PackedResult = processor.process_batch(batch_json)
@@ -821,6 +916,9 @@ class FullSyncStrmHelper:
                                 self.strm_fail_dict[fail_info.path_in_pan] = (
                                     fail_info.reason
                                 )
+                                batch_fails[fail_info.path_in_pan] = fail_info.reason
+                                if fail_info.path_in_pan in id_by_path:
+                                    excluded_ids.add(id_by_path[fail_info.path_in_pan])
 
                             for download_info in results.download_results:
                                 local_path = target_dir / Path(
@@ -869,11 +967,17 @@ class FullSyncStrmHelper:
                                     strm_info.original_file_name,
                                     strm_info.path_in_pan,
                                 )
+                                ticket = None
+                                if strm_info.path_in_pan in id_by_path:
+                                    file_id = id_by_path[strm_info.path_in_pan]
+                                    excluded_ids.add(file_id)
+                                    ticket = ckpt_batch.track(file_id)
                                 self.write_queue.put(
                                     (
                                         new_file_path,
                                         strm_url,
                                         strm_info.original_file_name,
+                                        ticket,
                                     )
                                 )
 
@@ -893,6 +997,7 @@ class FullSyncStrmHelper:
                                     item,
                                     target_dir_path,
                                     pan_media_dir,
+                                    ckpt_batch,
                                 ): item
                                 for item in batch
                             }
@@ -906,11 +1011,15 @@ class FullSyncStrmHelper:
                                     if not result:
                                         continue
 
+                                    if result.status in ("fail", "submitted"):
+                                        if item.get("id"):
+                                            excluded_ids.add(int(item["id"]))
                                     if result.status == "fail":
                                         self.strm_fail_count += 1
                                         self.strm_fail_dict[result.path] = (
                                             result.message
                                         )
+                                        batch_fails[result.path] = result.message
                                     elif result.status == "download":
                                         self.download_mediainfo_list.append(result.data)
 
@@ -918,6 +1027,8 @@ class FullSyncStrmHelper:
                                         path_list.append(result.path_entry)
 
                                 except Exception as e:
+                                    if item.get("id"):
+                                        excluded_ids.add(int(item["id"]))
                                     sentry_manager.sentry_hub.capture_exception(e)
                                     logger.error(
                                         f"【全量STRM生成】并发处理出错: {item} - {str(e)}"
@@ -932,9 +1043,26 @@ class FullSyncStrmHelper:
                             )
 
                         if self.remove_unless_strm:
-                            self.pan_tree.generate_tree_from_list(
-                                path_list, append=True
-                            )
+                            if pan_tree_paths:
+                                path_list = [
+                                    path_entry
+                                    for path_entry in path_list
+                                    if path_entry not in pan_tree_paths
+                                ]
+                            pan_tree.generate_tree_from_list(path_list, append=True)
+
+                        # 本批次的 STRM 写入全部结束后由结果收集线程提交断点
+                        ckpt_batch.seal(
+                            file_ids=[
+                                file_id
+                                for item in batch
+                                if item.get("id")
+                                and (file_id := int(item["id"])) not in excluded_ids
+                            ],
+                            dirnodes=self.__collect_dirnodes(batch, recorded_dir_ids),
+                            downloads=self.download_mediainfo_list[download_start:],
+                            strm_fail_dict=batch_fails,
+                        )
 
                     end_time = perf_counter()
                     self.elapsed_time += end_time - start_time
@@ -944,6 +1072,7 @@ class FullSyncStrmHelper:
 
                     self.write_queue.join()
                     self.result_queue.join()
+                    checkpoint.mark_done()
                 except Exception as e:
                     sentry_manager.sentry_hub.capture_exception(e)
                     logger.error(
@@ -970,7 +1099,7 @@ class FullSyncStrmHelper:
                             )
                             local_tree_count = self.local_tree.count()
                             remove_count = self.local_tree.compare_entry_counts(
-                                self.pan_tree
+                                pan_tree
                             )
                             rp = (remove_count / local_tree_count) * 100
                             if rp > configer.full_sync_remove_unless_max_threshold:
@@ -1015,9 +1144,7 @@ class FullSyncStrmHelper:
                                         path_base64, {"counts": []}
                                     )
 
-                            for remove_path in self.local_tree.compare_trees(
-                                self.pan_tree
-                            ):
+                            for remove_path in self.local_tree.compare_trees(pan_tree):
                                 logger.info(
                                     f"【全量STRM生成】清理无效 STRM 文件: {remove_path}"
                                 )
@@ -1043,13 +1170,12 @@ class FullSyncStrmHelper:
                         )
 
         logger.info("【全量STRM生成】所有文件处理任务已提交，等待文件写入完成...")
-        self.write_queue.join()
-        for _ in range(num_io_workers):
-            self.write_queue.put(None)
-        for thread in io_threads:
-            thread.join()
+        self.writer.shutdown()
+        self.result_queue.put(None)
         self.result_queue.join()
         collector_thread.join()
+        if self.fingerprint_cache:
+            self.fingerprint_cache.close()
 
         self.mediainfo_count, self.mediainfo_fail_count, self.mediainfo_fail_dict = (
             self.mediainfodownloader.batch_auto_downloader(
@@ -1057,6 +1183,9 @@ class FullSyncStrmHelper:
             )
         )
 
+        for checkpoint in checkpoints:
+            checkpoint.clear()
+
         if self.mediaserver_helper.enabled:
             logger.info(
                 "【全量STRM生成】开始刷新整个媒体库，此操作会刷新所有媒体服务器"
@@ -1088,6 +1217,18 @@ class FullSyncStrmHelper:
             logger.warn(
                 f"【全量STRM生成】{self.strm_fail_count} 个 STRM 文件生成失败，{self.mediainfo_fail_count} 个媒体数据文件下载失败"
             )
+        writer_stats = self.writer.stats()
+        if writer_stats["files"]:
+            logger.info(
+                f"【全量STRM生成】STRM 写入 {writer_stats['files']} 个，"
+                f"吞吐 {writer_stats['files_per_second']:.1f} 个/秒，"
+                f"P95 写入延迟 {writer_stats['p95_latency_ms']:.2f} ms，"
+                f"峰值写入线程 {writer_stats['peak_workers']} 个"
+            )
+        if self.strm_unchanged_count != 0:
+            logger.info(
+                f"【全量STRM生成】{self.strm_unchanged_count} 个 STRM 文件内容未变化，跳过写入"
+            )
         if self.remove_unless_strm_count != 0:
             logger.warn(
                 f"【全量STRM生成】清理 {self.remove_unless_strm_count} 个失效 STRM 文件"
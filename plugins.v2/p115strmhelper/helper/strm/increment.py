@@ -1,6 +1,8 @@
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor
 from itertools import batched
 from pathlib import Path
-from threading import Thread
+from threading import Lock, Thread
 from time import sleep
 from typing import List, Dict, Optional, Tuple, Iterator, Any, Generator
 
@@ -73,6 +75,8 @@ class IncrementSyncStrmHelper:
         self.strm_fail_count = 0
         self.mediainfo_fail_count = 0
         self.api_count = 0
+        # 多个根路径并发导出目录树时保护计数器
+        self._count_lock = Lock()
         self.strm_fail_dict: Dict[str, str] = {}
         self.mediainfo_fail_dict: List = []
         self.pan_transfer_enabled = configer.pan_transfer_enabled
@@ -118,6 +122,13 @@ class IncrementSyncStrmHelper:
         self.pan_tree.clear()
         self.pan_to_local_tree.clear()
 
+    def __add_count(self, name: str, value: int = 1):
+        """
+        线程安全地累加计数器
+        """
+        with self._count_lock:
+            setattr(self, name, getattr(self, name) + value)
+
     def __itertree(
         self, pan_path: str, local_path: str
     ) -> Generator[tuple[str, str], Any, None]:
@@ -134,7 +145,7 @@ class IncrementSyncStrmHelper:
         cid = get_pid_by_path(self.client, pan_path, True, False, False)
         if cid == -1:
             raise PanPathNotFound(f"网盘路径不存在: {pan_path}")
-        self.api_count += 4
+        self.__add_count("api_count", 4)
 
         items_iterator = export_dir_parse_iter(
             client=self.client, export_file_ids=cid, delete=True
@@ -145,24 +156,30 @@ class IncrementSyncStrmHelper:
         except StopIteration:
             return
 
-        def process_file_item(item_str: str):
-            item_path = Path(pan_path) / Path(item_str).relative_to(relative_path)
-            relative_item_path = item_path.relative_to(pan_path)
-            local_item_path = Path(local_path) / relative_item_path
+        # 导出根路径前缀长度，item_str[prefix_len:] 即为以 "/" 开头的相对路径
+        prefix_len = len(relative_path.rstrip("/"))
+        rmt_mediaext = set(self.rmt_mediaext)
+        download_mediaext = (
+            set(self.download_mediaext) if self.auto_download_mediainfo else set()
+        )
 
-            if item_path.suffix.lower() in self.rmt_mediaext:
-                strm_filename = StrmGenerater.get_strm_filename(local_item_path)
+        def process_file_item(item_str: str):
+            relative_item = item_str[prefix_len:]
+            name = relative_item[relative_item.rfind("/") + 1 :]
+            dot = name.rfind(".")
+            suffix = name[dot:].lower() if 0 < dot < len(name) - 1 else ""
+
+            if suffix in rmt_mediaext:
+                local_item = local_path + relative_item
+                strm_filename = StrmGenerater.get_strm_filename(Path(local_item))
                 yield (
-                    (local_item_path.parent / strm_filename).as_posix(),
-                    item_path.as_posix(),
+                    local_item[: len(local_item) - len(name)] + strm_filename,
+                    pan_path + relative_item,
                 )
-            elif (
-                item_path.suffix.lower() in self.download_mediaext
-                and self.auto_download_mediainfo
-            ):
+            elif suffix in download_mediaext:
                 yield (
-                    local_item_path.as_posix(),
-                    item_path.as_posix(),
+                    local_path + relative_item,
+                    pan_path + relative_item,
                 )
 
         previous_item = None
@@ -185,7 +202,7 @@ class IncrementSyncStrmHelper:
         """
         logger.debug(f"【增量STRM生成】迭代网盘目录: {cid} {path}")
         for batch in iter_fs_files(self.client, cid, cooldown=2):
-            self.api_count += 1
+            self.__add_count("api_count")
             for item in batch.get("data", []):
                 item["path"] = path + "/" + item.get("n")
                 yield item
@@ -318,22 +335,28 @@ class IncrementSyncStrmHelper:
             logger.info("【增量STRM生成】扫描本地媒体库运行中...")
             sleep(10)
 
-    def __generate_pan_tree(self, pan_media_dir: str, target_dir: str):
+    def __generate_pan_tree(
+        self,
+        pan_media_dir: str,
+        target_dir: str,
+        pan_tree: DirectoryTree,
+        pan_to_local_tree: DirectoryTree,
+    ):
         """
         生成网盘目录树
         """
         for i in range(1, 4):
-            self.pan_tree.clear()
-            self.pan_to_local_tree.clear()
+            pan_tree.clear()
+            pan_to_local_tree.clear()
 
             logger.info(f"【增量STRM生成】开始生成网盘目录树: {pan_media_dir}")
 
             try:
-                for path1, path2 in self.__itertree(
-                    pan_path=pan_media_dir, local_path=target_dir
-                ):
-                    self.pan_to_local_tree.generate_tree_from_list([path1], append=True)
-                    self.pan_tree.generate_tree_from_list([path2], append=True)
+                DirectoryTree.generate_trees_from_rows(
+                    (pan_to_local_tree, pan_tree),
+                    self.__itertree(pan_path=pan_media_dir, local_path=target_dir),
+                    append=True,
+                )
 
                 logger.info(f"【增量STRM生成】网盘目录树生成完成: {pan_media_dir}")
                 break
@@ -442,14 +465,14 @@ class IncrementSyncStrmHelper:
             new_file_path.parent.mkdir(parents=True, exist_ok=True)
 
             if not pickcode:
-                self.strm_fail_count += 1
+                self.__add_count("strm_fail_count")
                 self.strm_fail_dict[str(new_file_path)] = "不存在 pickcode 值"
                 logger.error(
                     f"【增量STRM生成】{pan_path_obj.name} 不存在 pickcode 值，无法生成 STRM 文件"
                 )
                 return
             if not (len(pickcode) == 17 and str(pickcode).isalnum()):
-                self.strm_fail_count += 1
+                self.__add_count("strm_fail_count")
                 self.strm_fail_dict[str(new_file_path)] = (
                     f"错误的 pickcode 值 {pickcode}"
                 )
@@ -464,7 +487,7 @@ class IncrementSyncStrmHelper:
 
             with open(new_file_path, "w", encoding="utf-8") as file:
                 file.write(strm_url)
-            self.strm_count += 1
+            self.__add_count("strm_count")
             logger.info(
                 "【增量STRM生成】生成 STRM 文件成功: %s",
                 str(new_file_path),
@@ -476,7 +499,7 @@ class IncrementSyncStrmHelper:
                 str(new_file_path),
                 e,
             )
-            self.strm_fail_count += 1
+            self.__add_count("strm_fail_count")
             self.strm_fail_dict[str(new_file_path)] = str(e)
             return
         if self.scrape_metadata_enabled:
@@ -499,12 +522,37 @@ class IncrementSyncStrmHelper:
             file_name=new_file_path.name,
         )
 
+    def __pan_tree_paths(self, index: int) -> Tuple[Path, Path]:
+        """
+        获取第 index 个同步根路径使用的网盘目录树文件路径
+
+        :return: (网盘目录树路径, 网盘映射本地目录树路径)
+        """
+        if index == 0:
+            return self.pan_tree_path, self.pan_to_local_tree_path
+        temp_path = configer.get_config("PLUGIN_TEMP_PATH")
+        return (
+            temp_path / f"increment_pan_tree_{index}.txt",
+            temp_path / f"increment_pan_to_local_tree_{index}.txt",
+        )
+
+    def __pan_trees(self, index: int) -> Tuple[DirectoryTree, DirectoryTree]:
+        """
+        获取第 index 个同步根路径使用的网盘目录树
+
+        :return: (网盘目录树, 网盘映射本地目录树)
+        """
+        if index == 0:
+            return self.pan_tree, self.pan_to_local_tree
+        pan_tree_path, pan_to_local_tree_path = self.__pan_tree_paths(index)
+        return DirectoryTree(pan_tree_path), DirectoryTree(pan_to_local_tree_path)
+
     def generate_strm_files(self, sync_strm_paths):
         """
         生成 STRM 文件
         """
-        media_paths = sync_strm_paths.split("\n")
-        for path in media_paths:
+        roots: List[Tuple[str, str, str]] = []
+        for path in sync_strm_paths.split("\n"):
             if not path:
                 continue
             parts = path.split("#", 1)
@@ -516,47 +564,83 @@ class IncrementSyncStrmHelper:
                     f"【增量STRM生成】网盘目录或本地生成目录不能为根目录: {path}"
                 )
 
-            pan_media_dir = pan_media_dir.rstrip("/")
-            target_dir = target_dir.rstrip("/")
+            roots.append((path, pan_media_dir.rstrip("/"), target_dir.rstrip("/")))
 
-            try:
-                # 生成本地目录树文件
-                local_tree_task_thread = self.__generate_local_tree(
-                    target_dir=target_dir
+        trees = [self.__pan_trees(index) for index in range(len(roots))]
+        workers = min(configer.increment_sync_export_workers, len(roots))
+        executor = None
+        pan_tree_futures: List[Optional[Future]] = [None] * len(roots)
+        if workers > 1:
+            # 提前并发导出后续根路径的网盘目录树，与当前根路径的比对处理重叠进行
+            executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="increment-export"
+            )
+            pan_tree_futures = [
+                executor.submit(
+                    self.__generate_pan_tree, pan_media_dir, target_dir, *trees[index]
                 )
+                for index, (_, pan_media_dir, target_dir) in enumerate(roots)
+            ]
 
-                # 生成网盘目录树文件
-                self.__generate_pan_tree(
-                    pan_media_dir=pan_media_dir, target_dir=target_dir
-                )
+        try:
+            for index, (path, pan_media_dir, target_dir) in enumerate(roots):
+                pan_tree, pan_to_local_tree = trees[index]
+                try:
+                    # 生成本地目录树文件
+                    local_tree_task_thread = self.__generate_local_tree(
+                        target_dir=target_dir
+                    )
 
-                # 等待生成本地目录树运行完成
-                self.__wait_generate_local_tree(local_tree_task_thread)
+                    # 生成网盘目录树文件
+                    if pan_tree_futures[index] is not None:
+                        pan_tree_futures[index].result()
+                    else:
+                        self.__generate_pan_tree(
+                            pan_media_dir=pan_media_dir,
+                            target_dir=target_dir,
+                            pan_tree=pan_tree,
+                            pan_to_local_tree=pan_to_local_tree,
+                        )
 
-                if (
-                    not self.pan_to_local_tree_path.exists()
-                    or not self.local_tree_path.exists()
-                ) and settings.CACHE_BACKEND_TYPE != "redis":
-                    logger.error(f"【增量STRM生成】{path} 目录树生成错误")
-                    return
+                    # 等待生成本地目录树运行完成
+                    self.__wait_generate_local_tree(local_tree_task_thread)
 
-                # 生成或者下载文件
-                for line in self.pan_to_local_tree.compare_trees_lines(self.local_tree):
-                    pan_path_str = self.pan_tree.get_path_by_line_number(line)
-                    local_path_str = self.pan_to_local_tree.get_path_by_line_number(
-                        line
-                    )
-                    if pan_path_str and local_path_str:
-                        self.__handle_addition_path(
-                            pan_path=pan_path_str,
-                            local_path=local_path_str,
-                        )
-            except Exception as e:
-                sentry_manager.sentry_hub.capture_exception(e)
-                logger.error(f"【增量STRM生成】增量同步 STRM 文件失败: {e}")
-                return
+                    if (
+                        not self.__pan_tree_paths(index)[1].exists()
+                        or not self.local_tree_path.exists()
+                    ) and settings.CACHE_BACKEND_TYPE != "redis":
+                        logger.error(f"【增量STRM生成】{path} 目录树生成错误")
+                        return
 
-            sleep(2)
+                    # 生成或者下载文件
+                    lines = array(
+                        "Q", pan_to_local_tree.compare_trees_lines(self.local_tree)
+                    )
+                    for (_, pan_path_str), (_, local_path_str) in zip(
+                        pan_tree.get_paths_by_line_numbers(lines),
+                        pan_to_local_tree.get_paths_by_line_numbers(lines),
+                    ):
+                        if pan_path_str and local_path_str:
+                            self.__handle_addition_path(
+                                pan_path=pan_path_str,
+                                local_path=local_path_str,
+                            )
+                except Exception as e:
+                    sentry_manager.sentry_hub.capture_exception(e)
+                    logger.error(f"【增量STRM生成】增量同步 STRM 文件失败: {e}")
+                    return
+                finally:
+                    if index != 0:
+                        pan_tree.clear()
+                        pan_to_local_tree.clear()
+
+                sleep(2)
+        finally:
+            if executor:
+                executor.shutdown(wait=True, cancel_futures=True)
+                for pan_tree, pan_to_local_tree in trees[1:]:
+                    pan_tree.clear()
+                    pan_to_local_tree.clear()
 
         # 下载媒体信息文件
         self.mediainfo_count, self.mediainfo_fail_count, self.mediainfo_fail_dict = (
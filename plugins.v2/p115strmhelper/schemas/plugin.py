@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 
 
@@ -18,6 +18,8 @@ class LifeEventCheckSummary(BaseModel):
     monitorlife_initialized: bool
     thread_running: bool
     config_valid: bool
+    poll_interval: Optional[float] = None
+    event_lag: Optional[float] = None
 
 
 class LifeEventCheckData(BaseModel):
@@ -29,3 +31,49 @@ class LifeEventCheckData(BaseModel):
     error_messages: List[str]
     debug_info: str
     summary: LifeEventCheckSummary
+
+
+class FullSyncCheckpointData(BaseModel):
+    """
+    全量同步断点数据
+    """
+
+    entry: str
+    status: Optional[str] = None
+    items: int = 0
+    fail_count: int = 0
+    started_at: Optional[int] = None
+    updated_at: Optional[int] = None
+
+
+class DbStorageReportData(BaseModel):
+    """
+    数据库空间占用报告
+    """
+
+    extra_mode: str
+    rows: int = 0
+    extra_rows: int = 0
+    extra_bytes: int = 0
+    avg_extra_bytes: float = 0
+    db_bytes: int = 0
+    free_bytes: int = 0
+
+
+class DbCompactExtraData(BaseModel):
+    """
+    files.extra 重新编码结果
+    """
+
+    before_bytes: int = 0
+    after_bytes: int = 0
+    updated: int = 0
+
+
+class RedirectStatsData(BaseModel):
+    """
+    302 跳转服务统计
+    """
+
+    downurl_flight: Dict[str, int] = {}
+    prewarm: Dict[str, int] = {}
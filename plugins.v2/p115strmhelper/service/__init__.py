@@ -374,9 +374,11 @@ class ServiceHelper:
             except Exception as e:
                 logger.error(f"【监控生活事件】注册守护服务失败: {str(e)}")
 
-    def full_sync_strm_files(self):
+    def full_sync_strm_files(self, resume: bool = False):
         """
         全量同步
+
+        :param resume: 是否从上次中断的断点继续
         """
         if (
             not configer.get_config("full_sync_strm_paths")
@@ -391,6 +393,7 @@ class ServiceHelper:
         )
         strm_helper.generate_strm_files(
             full_sync_strm_paths=configer.get_config("full_sync_strm_paths"),
+            resume=resume,
         )
         (
             strm_count,
@@ -414,13 +417,16 @@ class ServiceHelper:
                 text=text,
             )
 
-    def start_full_sync(self):
+    def start_full_sync(self, resume: bool = False):
         """
         启动全量同步
+
+        :param resume: 是否从上次中断的断点继续
         """
         self.scheduler = BackgroundScheduler(timezone=settings.TZ)
         self.scheduler.add_job(
             func=self.full_sync_strm_files,
+            kwargs={"resume": resume},
             trigger="date",
             run_date=datetime.now(tz=timezone(settings.TZ)) + timedelta(seconds=3),
             name="115网盘助手全量生成STRM",
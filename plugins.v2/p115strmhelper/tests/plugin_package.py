@@ -0,0 +1,29 @@
+import sys
+from importlib import import_module
+from importlib.util import find_spec
+from pathlib import Path
+from types import ModuleType
+
+plugin_dir = Path(__file__).resolve().parent.parent
+
+PACKAGE = "p115strmhelper"
+
+# 依赖 MoviePilot 运行环境（app 包）的模块，环境不存在时跳过相关测试
+HAS_MOVIEPILOT = find_spec("app") is not None
+
+
+def load_module(name: str) -> ModuleType:
+    """
+    以轻量包的形式导入插件子模块，不执行插件入口及上层包的 __init__
+
+    :param name: 相对插件根目录的模块名，如 core.cache
+    """
+    parts = [PACKAGE, *name.split(".")]
+    for i in range(1, len(parts)):
+        package = ".".join(parts[:i])
+        if package in sys.modules:
+            continue
+        module = ModuleType(package)
+        module.__path__ = [str(plugin_dir.joinpath(*parts[1:i]))]
+        sys.modules[package] = module
+    return import_module(".".join(parts))
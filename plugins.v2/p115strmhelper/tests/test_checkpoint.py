@@ -0,0 +1,124 @@
+import sys
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from plugin_package import HAS_MOVIEPILOT, load_module
+
+
+@unittest.skipUnless(HAS_MOVIEPILOT, "需要 MoviePilot 运行环境")
+class TestFullSyncCheckpoint(unittest.TestCase):
+    """
+    测试全量同步断点与批次提交
+    """
+
+    entry = "/media#/115/media"
+
+    def setUp(self):
+        module = load_module("helper.strm.checkpoint")
+        self.FullSyncCheckpoint = module.FullSyncCheckpoint
+        self.CheckpointBatch = module.CheckpointBatch
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.base_dir = Path(tmp.name)
+        self.checkpoint = self.FullSyncCheckpoint(self.entry, self.base_dir)
+        self.checkpoint.reset()
+
+    def reopen(self):
+        return self.FullSyncCheckpoint(self.entry, self.base_dir)
+
+    def test_commit_after_seal_and_writes(self):
+        """测试批次封存且所有写入结束后才提交到断点"""
+        batch = self.CheckpointBatch(self.checkpoint)
+        ticket = batch.track(1)
+        batch.track(2)
+        self.assertEqual(ticket, (batch, 1))
+
+        batch.seal(
+            file_ids=[3],
+            dirnodes={10: ("a", 0)},
+            downloads=[{"path": Path("/media/a.nfo"), "url": "u"}],
+            strm_fail_dict={},
+        )
+        self.assertEqual(self.reopen().load_file_ids(), set())
+
+        batch.write_done(1, "/media/1.strm")
+        self.assertEqual(self.reopen().load_file_ids(), set())
+        self.assertEqual(self.reopen().load_dirnodes(), {})
+
+        batch.write_done(2, "/media/2.strm", "写入失败")
+        checkpoint = self.reopen()
+        self.assertEqual(checkpoint.load_file_ids(), {1, 3})
+        self.assertEqual(checkpoint.load_dirnodes(), {10: ("a", 0)})
+        self.assertEqual(
+            checkpoint.load_downloads(), [{"path": Path("/media/a.nfo"), "url": "u"}]
+        )
+        self.assertEqual(
+            checkpoint.state["strm_fail_dict"], {"/media/2.strm": "写入失败"}
+        )
+        self.assertEqual(checkpoint.state["items"], 2)
+
+    def test_writes_done_before_seal(self):
+        """测试写入先于封存全部结束时，封存后才提交"""
+        batch = self.CheckpointBatch(self.checkpoint)
+        batch.track(1)
+        batch.write_done(1, "/media/1.strm")
+        self.assertEqual(self.reopen().load_file_ids(), set())
+
+        batch.seal(file_ids=[], dirnodes={}, downloads=[], strm_fail_dict={})
+        self.assertEqual(self.reopen().load_file_ids(), {1})
+
+    def test_resume_filters_done_file_ids(self):
+        """测试继续时只跳过已成功的文件，失败记录被清空"""
+        for file_ids, fails in (([1, 2], {}), ([4], {"/media/3.strm": "写入失败"})):
+            batch = self.CheckpointBatch(self.checkpoint)
+            batch.seal(
+                file_ids=file_ids, dirnodes={}, downloads=[], strm_fail_dict=fails
+            )
+        # 未封存的批次不会被记录
+        self.CheckpointBatch(self.checkpoint).track(5)
+
+        checkpoint = self.reopen()
+        self.assertTrue(checkpoint.resumable)
+        done_file_ids = checkpoint.load_file_ids()
+        self.assertEqual(done_file_ids, {1, 2, 4})
+        batch = [{"id": str(i)} for i in range(1, 6)]
+        self.assertEqual(
+            [item["id"] for item in batch if int(item["id"]) not in done_file_ids],
+            ["3", "5"],
+        )
+
+        checkpoint.resume()
+        self.assertEqual(self.reopen().state["strm_fail_dict"], {})
+        self.assertEqual(self.reopen().load_file_ids(), {1, 2, 4})
+
+    def test_clear_after_done(self):
+        """测试完成后标记断点，并在全部成功后删除"""
+        self.checkpoint.mark_done()
+        checkpoint = self.reopen()
+        self.assertTrue(checkpoint.done)
+        self.assertFalse(checkpoint.resumable)
+        self.assertEqual(len(self.FullSyncCheckpoint.list_all(self.base_dir)), 1)
+
+        checkpoint.clear()
+        self.assertFalse(checkpoint.path.exists())
+        self.assertEqual(self.FullSyncCheckpoint.list_all(self.base_dir), [])
+        self.assertIsNone(self.reopen().status)
+
+    def test_reset_discards_old_checkpoint(self):
+        """测试重新开始时丢弃旧断点"""
+        batch = self.CheckpointBatch(self.checkpoint)
+        batch.seal(file_ids=[1], dirnodes={}, downloads=[], strm_fail_dict={})
+        self.checkpoint.pan_tree_path.write_text("/media/1.strm\n")
+
+        checkpoint = self.reopen()
+        checkpoint.reset()
+        self.assertEqual(checkpoint.load_file_ids(), set())
+        self.assertFalse(checkpoint.pan_tree_path.exists())
+        self.assertTrue(checkpoint.resumable)
+
+
+if __name__ == "__main__":
+    unittest.main()
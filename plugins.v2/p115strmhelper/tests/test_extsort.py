@@ -0,0 +1,71 @@
+import sys
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+utils_dir = Path(__file__).resolve().parent.parent / "utils"
+sys.path.append(str(utils_dir))
+
+from extsort import SortedRunStore, merge_diff
+
+
+class TestSortedRunStore(unittest.TestCase):
+    """
+    测试 SortedRunStore 外部排序与 merge_diff 归并比较
+    """
+
+    def setUp(self):
+        self._tmp = TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _store(self, name, lines, memory_budget=1):
+        source = self.tmp / f"{name}.txt"
+        source.write_text("".join(f"{line}\n" for line in lines), encoding="utf-8")
+        store = SortedRunStore(self.tmp / f"{name}.runs", memory_budget=memory_budget)
+        store.ensure(source)
+        return store, source
+
+    def test_records_sorted_and_deduplicated(self):
+        """测试小内存预算下多 run 归并后有序且去重"""
+        store, _ = self._store("a", ["/c", "/a", "", "/b", "/a"])
+        self.assertEqual(
+            list(store.records()), [("/a", [2, 5]), ("/b", [4]), ("/c", [1])]
+        )
+        self.assertEqual(store.lines, 5)
+        self.assertEqual(store.entries, 4)
+
+    def test_merge_diff_matches_set_difference(self):
+        """测试归并比较结果与集合差一致"""
+        left = [f"/media/{i:04d}.strm" for i in range(300)]
+        right = [f"/media/{i:04d}.strm" for i in range(0, 300, 3)]
+        left_store, _ = self._store("left", list(reversed(left)), memory_budget=2048)
+        right_store, _ = self._store("right", right, memory_budget=2048)
+
+        result = list(merge_diff(left_store.records(), right_store.records()))
+        expected_paths = sorted(set(left) - set(right))
+        self.assertEqual([path for _, path in result], expected_paths)
+        for line_num, path in result:
+            self.assertEqual(list(reversed(left))[line_num - 1], path)
+
+    def test_rebuild_when_source_changed(self):
+        """测试源文件变化后重新排序"""
+        store, source = self._store("a", ["/b"])
+        with open(source, "a", encoding="utf-8") as f:
+            f.write("/a\n")
+        self.assertFalse(store.is_fresh(source))
+        store.ensure(source)
+        self.assertEqual(list(store.records()), [("/a", [2]), ("/b", [1])])
+
+    def test_many_runs_are_compacted(self):
+        """测试 run 数量超过扇入上限时中间归并"""
+        lines = [f"/{i:05d}" for i in range(200, 0, -1)]
+        store, _ = self._store("a", lines)
+        self.assertEqual([key for key, _ in store.records()], sorted(lines))
+        self.assertLessEqual(len(list(store.run_dir.glob("run-*.txt"))), 64)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,79 @@
+import sys
+import tempfile
+import unittest
+from hashlib import sha1
+from os import urandom
+from pathlib import Path
+from unittest import mock
+
+utils_dir = Path(__file__).resolve().parent.parent / "utils"
+sys.path.append(str(utils_dir))
+
+import hashing
+from hashing import FileHasher
+
+
+class TestFileHasher(unittest.TestCase):
+    """
+    测试 FileHasher 单次读取计算全文与前缀 SHA1
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _write(self, name: str, data: bytes) -> Path:
+        path = self.dir / name
+        path.write_bytes(data)
+        return path
+
+    def test_digest_matches_separate_passes(self):
+        """测试前缀边界落在缓冲块中间时结果与分别计算一致"""
+        data = urandom(100_000)
+        path = self._write("a.bin", data)
+        hasher = FileHasher(preid_size=40_000, buffer_size=16_384)
+        digest = hasher.digest(path)
+        self.assertEqual(digest.sha1, sha1(data).hexdigest())
+        self.assertEqual(digest.preid, sha1(data[:40_000]).hexdigest())
+        self.assertEqual(digest.size, len(data))
+
+    def test_small_and_empty_files(self):
+        """测试小于前缀长度与空文件时前缀 SHA1 等于全文 SHA1"""
+        hasher = FileHasher(preid_size=1024, buffer_size=256)
+        for name, data in (("small.bin", b"x" * 1000), ("empty.bin", b"")):
+            digest = hasher.digest(self._write(name, data))
+            self.assertEqual(digest.sha1, sha1(data).hexdigest())
+            self.assertEqual(digest.preid, digest.sha1)
+
+    def test_buffered_fallback(self):
+        """测试 mmap 不可用时回退到缓冲读取"""
+        data = urandom(50_000)
+        path = self._write("b.bin", data)
+        hasher = FileHasher(preid_size=30_000, buffer_size=7_000)
+        with mock.patch.object(hashing, "mmap", side_effect=OSError):
+            digest = hasher.digest(path)
+        self.assertEqual(digest.sha1, sha1(data).hexdigest())
+        self.assertEqual(digest.preid, sha1(data[:30_000]).hexdigest())
+
+    def test_cache_by_stat(self):
+        """测试文件未变化时命中缓存，修改后重新计算"""
+        path = self._write("c.bin", b"first")
+        hasher = FileHasher(preid_size=4)
+        first = hasher.digest(path)
+        self.assertEqual(hasher.digest(path), first)
+        self.assertEqual((hasher.hits, hasher.misses), (1, 1))
+        path.write_bytes(b"second")
+        self.assertEqual(hasher.digest(path).sha1, sha1(b"second").hexdigest())
+        self.assertEqual(hasher.misses, 2)
+
+    def test_range_sha1(self):
+        """测试区间 SHA1 包含两端字节"""
+        path = self._write("d.bin", b"0123456789")
+        self.assertEqual(FileHasher.range_sha1(path, 2, 5), sha1(b"2345").hexdigest())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import sys
+import unittest
+from pathlib import Path
+from threading import Lock
+from time import sleep
+
+life_dir = Path(__file__).resolve().parent.parent / "helper" / "life"
+sys.path.append(str(life_dir))
+
+from pipeline import LifeEventPipeline
+
+
+class TestLifeEventPipeline(unittest.TestCase):
+    """
+    测试 LifeEventPipeline 生活事件并发处理管道
+    """
+
+    def test_group_key(self):
+        """测试按顶层媒体路径分组"""
+        roots = ("/媒体/电影/华语", "/媒体/电影", "/待整理")
+        key = LifeEventPipeline.group_key
+        self.assertEqual(key("/媒体/电影/A (2020)/A.mkv", roots), "/媒体/电影/A (2020)")
+        self.assertEqual(key("/媒体/电影/华语/B/B.mkv", roots), "/媒体/电影/华语/B")
+        self.assertEqual(key("/待整理/C", roots), "/待整理/C")
+        self.assertEqual(key("/其他/D.mkv", roots), "/其他/D.mkv")
+        self.assertEqual(key("", roots), "")
+
+    def test_order_preserved_within_group(self):
+        """测试同组任务按顺序执行，不同组并行执行"""
+        pipeline = LifeEventPipeline(max_workers=4)
+        lock = Lock()
+        order = {"a": [], "b": []}
+        running = {"now": 0, "max": 0}
+
+        def job(key, index):
+            def run():
+                with lock:
+                    running["now"] += 1
+                    running["max"] = max(running["max"], running["now"])
+                sleep(0.02)
+                with lock:
+                    order[key].append(index)
+                    running["now"] -= 1
+
+            return key, run
+
+        jobs = [job("a" if i % 2 else "b", i) for i in range(6)]
+        self.assertEqual(pipeline.run(jobs), 2)
+        self.assertEqual(order["a"], [1, 3, 5])
+        self.assertEqual(order["b"], [0, 2, 4])
+        self.assertEqual(running["max"], 2)
+        self.assertEqual(pipeline.stats()["jobs"], 6)
+
+    def test_error_stops_group_and_raises(self):
+        """测试出错分组跳过剩余任务，其他分组继续执行并在结束后抛出异常"""
+        pipeline = LifeEventPipeline(max_workers=2)
+        done = []
+
+        def fail():
+            raise OSError("boom")
+
+        jobs = [
+            ("a", fail),
+            ("a", lambda: done.append("a")),
+            ("b", lambda: done.append("b")),
+        ]
+        with self.assertRaises(OSError):
+            pipeline.run(jobs)
+        self.assertEqual(done, ["b"])
+
+    def test_stage_timings(self):
+        """测试阶段耗时统计"""
+        pipeline = LifeEventPipeline()
+        for _ in range(2):
+            with pipeline.stage("creata"):
+                sleep(0.01)
+        stage = pipeline.stats()["stages"]["creata"]
+        self.assertEqual(stage["count"], 2)
+        self.assertGreater(stage["seconds"], 0.015)
+        pipeline.reset()
+        self.assertEqual(pipeline.stats()["stages"], {})
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,63 @@
+import importlib.util
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+# helper/life/queue.py 与标准库 queue 同名，按文件路径加载
+queue_path = Path(__file__).resolve().parent.parent / "helper" / "life" / "queue.py"
+spec = importlib.util.spec_from_file_location("life_queue", queue_path)
+life_queue = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(life_queue)
+LifeTasksQueue = life_queue.LifeTasksQueue
+
+
+def event(event_id, update_time):
+    return {"id": event_id, "update_time": update_time, "file_name": f"{event_id}"}
+
+
+class TestLifeTasksQueue(unittest.TestCase):
+    """
+    测试 LifeTasksQueue 生活事件等待队列
+    """
+
+    def test_fifo_and_membership(self):
+        """测试先进先出、队首判断与成员判断"""
+        queue = LifeTasksQueue()
+        for i in range(1, 4):
+            queue.add(event(i, 100 + i))
+        self.assertTrue(queue.exist(event(1, 0)))
+        self.assertFalse(queue.exist(event(2, 0)))
+        self.assertTrue(queue.inq(event(3, 0)))
+        self.assertFalse(queue.inq(event(4, 0)))
+        self.assertEqual(queue.head_time(), 101)
+        self.assertTrue(queue.time_done(101))
+        self.assertFalse(queue.time_done(100))
+        self.assertEqual(queue.pop()["id"], 1)
+        self.assertTrue(queue.exist(event(2, 0)))
+        self.assertEqual(len(queue), 2)
+
+    def test_empty_queue(self):
+        """测试空队列"""
+        queue = LifeTasksQueue()
+        self.assertIsNone(queue.peek())
+        self.assertIsNone(queue.head_time())
+        self.assertFalse(queue.exist(event(1, 0)))
+
+    def test_persist_and_restore(self):
+        """测试持久化后恢复顺序与时间戳"""
+        with TemporaryDirectory() as tmp:
+            path = Path(tmp) / "queue.json"
+            queue = LifeTasksQueue(path)
+            for i in (5, 3, 9):
+                queue.add(event(i, i * 10))
+            queue.pop()
+            queue.save()
+
+            restored = LifeTasksQueue(path)
+            self.assertEqual(restored.load(), 2)
+            self.assertEqual([item["id"] for item in restored.data.values()], [3, 9])
+            self.assertEqual(restored.head_time(), 30)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,38 @@
+import sys
+import unittest
+from pathlib import Path
+from time import monotonic
+
+utils_dir = Path(__file__).resolve().parent.parent / "utils"
+sys.path.append(str(utils_dir))
+
+from limiter import AsyncTokenBucket
+
+
+class TestAsyncTokenBucket(unittest.IsolatedAsyncioTestCase):
+    """
+    测试 AsyncTokenBucket 异步令牌桶
+    """
+
+    async def test_burst_then_rate(self):
+        """测试容量内突发不等待，超出后按速率等待"""
+        bucket = AsyncTokenBucket(rate=50, capacity=5)
+        start = monotonic()
+        for _ in range(5):
+            await bucket.acquire()
+        self.assertLess(monotonic() - start, 0.05)
+        for _ in range(5):
+            await bucket.acquire()
+        self.assertGreaterEqual(monotonic() - start, 0.09)
+
+    async def test_unlimited(self):
+        """测试速率为 0 时不限速"""
+        bucket = AsyncTokenBucket(rate=0)
+        start = monotonic()
+        for _ in range(1000):
+            await bucket.acquire()
+        self.assertLess(monotonic() - start, 0.05)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
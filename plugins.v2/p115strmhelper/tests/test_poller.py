@@ -0,0 +1,55 @@
+import sys
+import unittest
+from pathlib import Path
+from threading import Event
+from time import time
+
+life_dir = Path(__file__).resolve().parent.parent / "helper" / "life"
+sys.path.append(str(life_dir))
+
+from poller import AdaptivePoller
+
+
+class TestAdaptivePoller(unittest.TestCase):
+    """
+    测试 AdaptivePoller 生活事件拉取间隔调度
+    """
+
+    def test_idle_backoff_is_bounded(self):
+        """测试空闲时指数退避且不超过上限"""
+        poller = AdaptivePoller(min_interval=2, max_interval=20)
+        intervals = []
+        for _ in range(6):
+            poller.on_idle()
+            intervals.append(poller.interval)
+        self.assertEqual(intervals, [2, 4, 8, 16, 20, 20])
+
+    def test_events_reset_interval_and_record_lag(self):
+        """测试拉取到事件后回到最小间隔并记录延迟"""
+        poller = AdaptivePoller(min_interval=2, max_interval=20)
+        for _ in range(4):
+            poller.on_idle()
+        poller.on_events(time() - 5)
+        self.assertEqual(poller.interval, 2)
+        self.assertEqual(poller.idle_pulls, 0)
+        self.assertAlmostEqual(poller.last_event_lag, 5, delta=1)
+
+    def test_wait_clamps_timeout_and_honours_stop(self):
+        """测试等待时间限制在上下限内且收到停止信号立即返回"""
+        poller = AdaptivePoller(min_interval=0.1, max_interval=0.2)
+        stop_event = Event()
+        stop_event.set()
+        self.assertTrue(poller.wait(stop_event, timeout=100))
+        self.assertFalse(poller.wait(Event(), timeout=-5))
+
+    def test_configure_clamps_current_interval(self):
+        """测试修改上下限后当前间隔被限制在新范围内"""
+        poller = AdaptivePoller(min_interval=2, max_interval=60)
+        for _ in range(6):
+            poller.on_idle()
+        poller.configure(min_interval=1, max_interval=10)
+        self.assertEqual(poller.interval, 10)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
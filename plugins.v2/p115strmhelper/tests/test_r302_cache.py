@@ -0,0 +1,78 @@
+import sys
+import unittest
+from pathlib import Path
+from time import time
+
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from plugin_package import HAS_MOVIEPILOT, load_module
+
+
+class MemoryAsyncCache:
+    """
+    按区域存储的异步缓存，可手动淘汰条目以模拟 LRU 淘汰
+    """
+
+    def __init__(self):
+        self.regions = {}
+
+    async def get(self, key, region):
+        return self.regions.get(region, {}).get(key)
+
+    async def set(self, key, value, ttl, region):
+        self.regions.setdefault(region, {})[key] = value
+
+    async def delete(self, key, region):
+        self.regions.get(region, {}).pop(key, None)
+
+    async def clear(self, region):
+        self.regions.pop(region, None)
+
+    def evict(self, key, region):
+        del self.regions[region][key]
+
+
+@unittest.skipUnless(HAS_MOVIEPILOT, "需要 MoviePilot 运行环境")
+class TestR302Cache(unittest.IsolatedAsyncioTestCase):
+    """
+    测试 R302Cache 302 跳转缓存
+    """
+
+    def setUp(self):
+        self.cache = load_module("core.cache").R302Cache()
+        self.backend = MemoryAsyncCache()
+        self.cache._cache = self.backend
+
+    async def test_count_by_pick_code(self):
+        """测试按 pick_code 统计不同 UA 的缓存条目"""
+        expires = time() + 600
+        await self.cache.set("pc", "ua1", "url1", expires)
+        await self.cache.set("pc", "ua2", "url2", expires)
+        await self.cache.set("other", "ua1", "url3", expires)
+        self.assertEqual(await self.cache.get("pc", "ua2"), "url2")
+        self.assertEqual(await self.cache.count_by_pick_code("pc"), 2)
+        self.assertEqual(await self.cache.count_by_pick_code("none"), 0)
+
+    async def test_evicted_entry_not_counted(self):
+        """测试被淘汰的条目不再计数，并从索引中移除"""
+        expires = time() + 600
+        await self.cache.set("pc", "ua1", "url1", expires)
+        await self.cache.set("pc", "ua2", "url2", expires)
+        self.backend.evict(self.cache._make_key("pc", "ua1"), self.cache.region)
+
+        self.assertEqual(await self.cache.count_by_pick_code("pc"), 1)
+        index = self.backend.regions[self.cache.index_region]["pc"]
+        self.assertEqual(set(index), {"ua2"})
+
+        self.backend.evict(self.cache._make_key("pc", "ua2"), self.cache.region)
+        self.assertEqual(await self.cache.count_by_pick_code("pc"), 0)
+        self.assertNotIn("pc", self.backend.regions[self.cache.index_region])
+
+    async def test_expired_entry_not_counted(self):
+        """测试已过期的条目不计数"""
+        await self.cache.set("pc", "ua1", "url1", time() - 1)
+        self.assertEqual(await self.cache.count_by_pick_code("pc"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
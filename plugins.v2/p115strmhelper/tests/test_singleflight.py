@@ -0,0 +1,83 @@
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+
+utils_dir = Path(__file__).resolve().parent.parent / "utils"
+sys.path.append(str(utils_dir))
+
+from singleflight import AsyncSingleFlight
+
+
+class TestAsyncSingleFlight(unittest.IsolatedAsyncioTestCase):
+    """
+    测试 AsyncSingleFlight 并发请求合并
+    """
+
+    async def test_concurrent_calls_are_coalesced(self):
+        """测试相同 key 的并发请求只执行一次"""
+        flight = AsyncSingleFlight()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "url"
+
+        results = await asyncio.gather(*(flight.do("a", fetch) for _ in range(10)))
+        self.assertEqual(results, ["url"] * 10)
+        self.assertEqual(calls, 1)
+        self.assertEqual(flight.stats()["coalesced"], 9)
+        self.assertEqual(flight.inflight(), 0)
+
+    async def test_different_keys_run_separately(self):
+        """测试不同 key 互不合并"""
+        flight = AsyncSingleFlight()
+
+        async def fetch(value):
+            await asyncio.sleep(0.01)
+            return value
+
+        results = await asyncio.gather(
+            flight.do("a", lambda: fetch(1)), flight.do("b", lambda: fetch(2))
+        )
+        self.assertEqual(results, [1, 2])
+        self.assertEqual(flight.stats()["leaders"], 2)
+
+    async def test_exception_propagates_and_clears(self):
+        """测试异常传递给所有等待者且不会残留"""
+        flight = AsyncSingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise OSError("upstream")
+
+        results = await asyncio.gather(
+            flight.do("a", fail), flight.do("a", fail), return_exceptions=True
+        )
+        self.assertTrue(all(isinstance(r, OSError) for r in results))
+        self.assertNotIn("a", flight)
+
+        async def ok():
+            return "url"
+
+        self.assertEqual(await flight.do("a", ok), "url")
+
+    async def test_waiter_cancel_does_not_cancel_upstream(self):
+        """测试单个请求方取消不影响其他等待者"""
+        flight = AsyncSingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.02)
+            return "url"
+
+        first = asyncio.ensure_future(flight.do("a", fetch))
+        second = asyncio.ensure_future(flight.do("a", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        self.assertEqual(await second, "url")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
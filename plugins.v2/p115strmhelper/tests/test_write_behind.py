@@ -0,0 +1,195 @@
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import PropertyMock, patch
+
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from plugin_package import HAS_MOVIEPILOT, load_module
+
+
+def file_row(file_id: int, name: str) -> dict:
+    return {
+        "id": file_id,
+        "parent_id": 0,
+        "name": name,
+        "sha1": "",
+        "size": 0,
+        "pickcode": "",
+        "ctime": 0,
+        "mtime": 0,
+        "path": f"/{name}",
+        "extra": None,
+    }
+
+
+@unittest.skipUnless(HAS_MOVIEPILOT, "需要 MoviePilot 运行环境")
+class TestWriteBehindQueue(unittest.TestCase):
+    """
+    测试 WriteBehindQueue 数据库延迟写入队列
+    """
+
+    def setUp(self):
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import scoped_session, sessionmaker
+        from sqlalchemy.pool import StaticPool
+
+        db_manager = load_module("db_manager")
+        self.File = load_module("db_manager.models.file").File
+        self.Folder = load_module("db_manager.models.folder").Folder
+
+        # 内存数据库，所有线程共用同一连接
+        self.engine = create_engine(
+            "sqlite://",
+            poolclass=StaticPool,
+            connect_args={"check_same_thread": False},
+        )
+        db_manager.P115StrmHelperBase.metadata.create_all(self.engine)
+        self.manager = db_manager.ct_db_manager
+        self.saved = (
+            self.manager.Engine,
+            self.manager.SessionFactory,
+            self.manager.ScopedSession,
+        )
+        self.manager.Engine = self.engine
+        self.manager.SessionFactory = sessionmaker(bind=self.engine)
+        self.manager.ScopedSession = scoped_session(self.manager.SessionFactory)
+
+        # 间隔足够长，只有 flush 或达到批量阈值时才提交
+        for name, value in (("interval", 60.0), ("batch_size", 1000)):
+            patcher = patch.object(
+                db_manager.WriteBehindQueue,
+                name,
+                new_callable=PropertyMock,
+                return_value=value,
+            )
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        # db_update 写入前等待的是全局队列
+        self.writer = db_manager.ct_db_writer
+        self.writer.RETRY_DELAY = 0
+        self.saved_hooks = (self.writer._commit_hooks, self.writer._discard_hooks)
+        self.writer._commit_hooks, self.writer._discard_hooks = [], []
+
+    def tearDown(self):
+        self.writer.stop()
+        self.writer._commit_hooks, self.writer._discard_hooks = self.saved_hooks
+        self.writer.__dict__.pop("_commit", None)
+        self.writer.__dict__.pop("RETRY_DELAY", None)
+        self.writer._attempts.clear()
+        self.manager.ScopedSession.remove()
+        self.engine.dispose()
+        (
+            self.manager.Engine,
+            self.manager.SessionFactory,
+            self.manager.ScopedSession,
+        ) = self.saved
+
+    def fail_commit(self, times: int):
+        """
+        使提交先失败指定次数，之后正常提交
+        """
+        commit = type(self.writer)._commit
+        calls = []
+
+        def _commit(db, batch):
+            calls.append(dict(batch))
+            if len(calls) <= times:
+                raise RuntimeError("database is locked")
+            return commit(db, batch)
+
+        self.writer._commit = _commit
+        return calls
+
+    def test_failed_batch_is_retried(self):
+        """测试提交失败的批次重新入队，重试成功后写入数据库"""
+        calls = self.fail_commit(1)
+        discarded = []
+        self.writer.on_discard(discarded.extend)
+
+        self.writer.upsert(
+            self.Folder, [{"id": 1, "parent_id": 0, "name": "a", "path": "/a"}]
+        )
+        self.writer.flush()
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.Folder.get_by_id(None, 1).path, "/a")
+        self.assertEqual(discarded, [])
+        self.assertEqual(self.writer._attempts, {})
+        self.assertFalse(self.writer.shadows(self.Folder, 1))
+
+    def test_discard_after_max_attempts(self):
+        """测试超过最大提交次数后丢弃数据并通知 on_discard"""
+        calls = self.fail_commit(self.writer.MAX_ATTEMPTS)
+        committed, discarded = [], []
+        self.writer.on_commit(committed.extend)
+        self.writer.on_discard(discarded.extend)
+        row = file_row(1, "a")
+
+        self.writer.upsert(self.File, [row])
+        self.writer.flush()
+
+        self.assertEqual(len(calls), self.writer.MAX_ATTEMPTS)
+        self.assertEqual(discarded, [(self.File, 1, row)])
+        self.assertEqual(committed, [])
+        self.assertIsNone(self.File.get_by_id(None, 1))
+        self.assertEqual(self.writer._attempts, {})
+
+    def test_flush_before_direct_write(self):
+        """测试直接写入文件表前先提交队列中的数据，保证写入顺序"""
+        self.writer.upsert(self.File, [file_row(1, "a")])
+        self.assertTrue(self.writer.shadows(self.File, 1))
+
+        self.File.update_name(None, 1, "b")
+
+        self.assertFalse(self.writer.shadows(self.File, 1))
+        self.assertEqual(self.File.get_by_id(None, 1).name, "b")
+        self.writer.flush()
+        self.assertEqual(self.File.get_by_id(None, 1).name, "b")
+
+    def test_hooks_after_commit(self):
+        """测试 on_commit 回调仅在提交成功后调用，且此时数据已可从数据库读取"""
+        calls = self.fail_commit(1)
+        committed, visible = [], []
+
+        def on_commit(rows):
+            committed.extend(rows)
+            visible.extend(
+                self.File.get_by_id(None, rid) is not None for _, rid, _ in rows
+            )
+
+        self.writer.on_commit(on_commit)
+        row = file_row(1, "a")
+        self.writer.upsert(self.File, [row])
+        self.assertEqual(committed, [])
+
+        self.writer.flush()
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(committed, [(self.File, 1, row)])
+        self.assertEqual(visible, [True])
+
+    def test_hooks_skip_repending_rows(self):
+        """测试提交期间被新操作覆盖的数据不传入 on_commit 回调"""
+        commit = type(self.writer)._commit
+        committed = []
+        self.writer.on_commit(committed.extend)
+        newer = file_row(1, "b")
+
+        def _commit(db, batch):
+            if newer not in self.writer.get_by_id(self.File, 1):
+                self.writer.upsert(self.File, [newer])
+            return commit(db, batch)
+
+        self.writer._commit = _commit
+        self.writer.upsert(self.File, [file_row(1, "a"), file_row(2, "c")])
+        self.writer.flush()
+
+        self.assertEqual([rid for _, rid, _ in committed], [2, 1])
+        self.assertEqual(committed[-1][2], newer)
+        self.assertEqual(self.File.get_by_id(None, 1).name, "b")
+
+
+if __name__ == "__main__":
+    unittest.main()
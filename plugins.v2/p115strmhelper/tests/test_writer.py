@@ -0,0 +1,78 @@
+import sys
+import unittest
+from pathlib import Path
+from queue import Queue
+from tempfile import TemporaryDirectory
+from time import sleep
+
+utils_dir = Path(__file__).resolve().parent.parent / "utils"
+sys.path.append(str(utils_dir))
+
+from writer import AdaptiveWriterPool
+
+
+class TestAdaptiveWriterPool(unittest.TestCase):
+    """
+    测试 AdaptiveWriterPool 自适应写入线程池
+    """
+
+    def test_processes_all_tasks_and_reports_stats(self):
+        """测试所有任务均被处理且统计正确"""
+        queue = Queue(maxsize=16)
+        done = []
+
+        def flush(tasks):
+            for task in tasks:
+                pool.observe(0.001)
+                done.append(task)
+
+        pool = AdaptiveWriterPool(queue, flush, min_workers=2, max_workers=4)
+        pool.start()
+        for i in range(500):
+            queue.put(i)
+        pool.shutdown()
+
+        self.assertEqual(sorted(done), list(range(500)))
+        stats = pool.stats()
+        self.assertEqual(stats["files"], 500)
+        self.assertAlmostEqual(stats["p95_latency_ms"], 1.0)
+        self.assertEqual(pool.active_workers, 0)
+
+    def test_scales_up_on_slow_writes(self):
+        """测试慢写入且队列积压时扩容，且不超过上限"""
+        queue = Queue()
+
+        def flush(tasks):
+            for _ in tasks:
+                sleep(0.005)
+                pool.observe(0.005)
+
+        pool = AdaptiveWriterPool(
+            queue, flush, min_workers=1, max_workers=4, batch_size=1, interval=0.05
+        )
+        for i in range(200):
+            queue.put(i)
+        pool.start()
+        pool.shutdown()
+
+        peak = pool.stats()["peak_workers"]
+        self.assertGreater(peak, 1)
+        self.assertLessEqual(peak, 4)
+
+    def test_ensure_parent_creates_directory_once(self):
+        """测试父目录创建与缓存"""
+        with TemporaryDirectory() as tmp:
+            pool = AdaptiveWriterPool(Queue(), lambda tasks: None)
+            file_path = Path(tmp) / "a" / "b" / "c.strm"
+            pool.ensure_parent(file_path)
+            self.assertTrue(file_path.parent.is_dir())
+            file_path.parent.rmdir()
+            pool.ensure_parent(file_path)
+            self.assertFalse(file_path.parent.exists())
+            pool.forget_parent(file_path)
+            pool.ensure_parent(file_path)
+            self.assertTrue(file_path.parent.is_dir())
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -10,8 +10,9 @@ from .exception import (
     DownloadValidationFail,
     FileItemKeyMiss,
 )
+from .hashing import FileHasher, FileDigest
 from .http import check_response, check_iter_path_data
-from .limiter import RateLimiter, ApiEndpointCooldown
+from .limiter import RateLimiter, ApiEndpointCooldown, AsyncTokenBucket
 from .machineid import MachineID
 from .math import MathUtils
 from .mediainfo_download import MediainfoDownloadMiddleware
@@ -41,10 +42,13 @@ __all__ = [
     "PathNotInKey",
     "DownloadValidationFail",
     "FileItemKeyMiss",
+    "FileHasher",
+    "FileDigest",
     "check_response",
     "check_iter_path_data",
     "RateLimiter",
     "ApiEndpointCooldown",
+    "AsyncTokenBucket",
     "MachineID",
     "MathUtils",
     "MediainfoDownloadMiddleware",
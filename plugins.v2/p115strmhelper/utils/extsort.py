@@ -0,0 +1,225 @@
+__all__ = ["SortedRunStore", "merge_diff"]
+
+from heapq import merge
+from itertools import groupby
+from operator import itemgetter
+from os import stat_result
+from pathlib import Path
+from shutil import rmtree
+from sys import getsizeof
+from typing import Dict, Generator, Iterable, Iterator, List, Optional, Tuple
+
+from orjson import dumps, loads, JSONDecodeError
+
+
+SortedRecord = Tuple[str, List[int]]
+
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+MAX_MERGE_FAN_IN = 64
+
+_SEP = "\x00"
+_META_NAME = "meta.json"
+# 单条记录在内存中的大致额外开销（dict 槽位 + list + int）
+_ENTRY_OVERHEAD = 160
+_LINE_OVERHEAD = 36
+
+
+class SortedRunStore:
+    """
+    外部排序后的有序去重 run 文件集合
+
+    每个 run 文件按路径排序，run 内相同路径合并为一条记录并保留全部行号，
+    排序时的内存占用由 memory_budget 限制
+    """
+
+    def __init__(self, run_dir: Path | str, memory_budget: int = DEFAULT_MEMORY_BUDGET):
+        self.run_dir = Path(run_dir)
+        self.memory_budget = max(int(memory_budget), 1)
+        self._meta_path = self.run_dir / _META_NAME
+        self._meta: Dict = self._load_meta()
+
+    @property
+    def lines(self) -> int:
+        """
+        源文件总行数
+        """
+        return self._meta.get("lines", 0)
+
+    @property
+    def entries(self) -> int:
+        """
+        源文件有效（非空）条目数
+        """
+        return self._meta.get("entries", 0)
+
+    @staticmethod
+    def _signature(stat: stat_result) -> List[int]:
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def _load_meta(self) -> Dict:
+        try:
+            return loads(self._meta_path.read_bytes())
+        except (FileNotFoundError, JSONDecodeError):
+            return {}
+
+    def _save_meta(self):
+        self._meta_path.write_bytes(dumps(self._meta))
+
+    def _run_files(self) -> List[Path]:
+        return [self.run_dir / name for name in self._meta.get("runs", [])]
+
+    def is_fresh(self, source: Path) -> bool:
+        """
+        判断 run 文件是否与源文件一致
+        """
+        try:
+            signature = self._signature(source.stat())
+        except FileNotFoundError:
+            return False
+        return self._meta.get("source") == signature
+
+    def clear(self):
+        """
+        删除所有 run 文件
+        """
+        if self.run_dir.exists():
+            rmtree(self.run_dir, ignore_errors=True)
+        self._meta = {}
+
+    def ensure(self, source: Path):
+        """
+        源文件变化时重新构建 run 文件
+        """
+        if not self.is_fresh(source):
+            self.build(source)
+
+    def build(self, source: Path):
+        """
+        按内存预算分段读取源文件，每段排序去重后写出为一个 run 文件
+
+        :param source: 每行一个路径的源文件
+        """
+        self.clear()
+        self.run_dir.mkdir(parents=True, exist_ok=True)
+        signature = self._signature(source.stat())
+
+        runs: List[str] = []
+        buffer: Dict[str, List[int]] = {}
+        buffer_bytes = line_num = entries = 0
+        with open(source, "r", encoding="utf-8", newline="\n") as f:
+            for line_num, line in enumerate(f, 1):
+                key = line.strip()
+                if not key:
+                    continue
+                entries += 1
+                lines = buffer.get(key)
+                if lines is None:
+                    buffer[key] = [line_num]
+                    buffer_bytes += getsizeof(key) + _ENTRY_OVERHEAD
+                else:
+                    lines.append(line_num)
+                    buffer_bytes += _LINE_OVERHEAD
+                if buffer_bytes >= self.memory_budget:
+                    runs.append(self._spill(buffer, len(runs)))
+                    buffer.clear()
+                    buffer_bytes = 0
+        if buffer:
+            runs.append(self._spill(buffer, len(runs)))
+            buffer.clear()
+
+        runs = self._compact(runs)
+        self._meta = {
+            "source": signature,
+            "lines": line_num,
+            "entries": entries,
+            "runs": runs,
+        }
+        self._save_meta()
+
+    def _spill(self, buffer: Dict[str, List[int]], index: int) -> str:
+        """
+        将内存缓冲排序后写出为 run 文件
+        """
+        name = f"run-{index:06d}.txt"
+        self._write_run(
+            self.run_dir / name, ((key, buffer[key]) for key in sorted(buffer))
+        )
+        return name
+
+    @staticmethod
+    def _write_run(path: Path, records: Iterable[SortedRecord]):
+        with open(path, "w", encoding="utf-8", newline="\n", buffering=1048576) as f:
+            f.writelines(
+                f"{key}{_SEP}{','.join(map(str, lines))}\n" for key, lines in records
+            )
+
+    @staticmethod
+    def _read_run(path: Path) -> Generator[SortedRecord, None, None]:
+        with open(path, "r", encoding="utf-8", newline="\n", buffering=1048576) as f:
+            for line in f:
+                key, _, lines = line[:-1].rpartition(_SEP)
+                yield key, [int(n) for n in lines.split(",")]
+
+    @staticmethod
+    def _merge_records(
+        iterators: List[Iterator[SortedRecord]],
+    ) -> Generator[SortedRecord, None, None]:
+        """
+        多路归并，相同路径合并行号
+        """
+        for key, group in groupby(merge(*iterators, key=itemgetter(0)), itemgetter(0)):
+            lines: List[int] = []
+            for _, group_lines in group:
+                lines.extend(group_lines)
+            lines.sort()
+            yield key, lines
+
+    def _compact(self, runs: List[str]) -> List[str]:
+        """
+        run 文件数量超过归并扇入上限时，先进行中间归并，限制同时打开的文件数
+        """
+        index = len(runs)
+        while len(runs) > MAX_MERGE_FAN_IN:
+            chunk, runs = runs[:MAX_MERGE_FAN_IN], runs[MAX_MERGE_FAN_IN:]
+            name = f"run-{index:06d}.txt"
+            index += 1
+            self._write_run(
+                self.run_dir / name,
+                self._merge_records(
+                    [self._read_run(self.run_dir / run) for run in chunk]
+                ),
+            )
+            for run in chunk:
+                (self.run_dir / run).unlink(missing_ok=True)
+            runs.append(name)
+        return runs
+
+    def records(self) -> Generator[SortedRecord, None, None]:
+        """
+        按路径升序输出去重后的 (路径, 行号列表)
+        """
+        yield from self._merge_records(
+            [self._read_run(path) for path in self._run_files()]
+        )
+
+
+def merge_diff(
+    left: Iterable[SortedRecord], right: Iterable[SortedRecord]
+) -> Generator[Tuple[int, str], None, None]:
+    """
+    对两个按路径升序的记录流做归并连接，单次遍历输出 left 中存在而 right 中不存在的条目
+
+    :param left: 左侧有序记录
+    :param right: 右侧有序记录
+
+    :return: (行号, 路径) 生成器，按路径升序
+    """
+    right_iter = iter(right)
+    right_key: Optional[str] = next(right_iter, (None,))[0]
+    for key, lines in left:
+        while right_key is not None and right_key < key:
+            right_key = next(right_iter, (None,))[0]
+        if key == right_key:
+            continue
+        for line_num in lines:
+            yield line_num, key
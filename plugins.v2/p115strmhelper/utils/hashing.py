@@ -0,0 +1,152 @@
+__all__ = ["FileHasher", "FileDigest"]
+
+from hashlib import sha1
+import mmap as _mmap
+from mmap import ACCESS_READ, mmap
+from os import PathLike, stat_result
+from pathlib import Path
+from threading import Lock
+from typing import NamedTuple, Optional, Tuple, Union
+
+from cachetools import LRUCache
+
+
+class FileDigest(NamedTuple):
+    """
+    文件特征值
+    """
+
+    # 全文 SHA1
+    sha1: str
+    # 前 preid_size 字节的 SHA1
+    preid: str
+    # 文件大小
+    size: int
+
+
+class FileHasher:
+    """
+    文件 SHA1 计算器
+
+    一次顺序读取同时得到全文 SHA1 与前缀 SHA1，优先使用 mmap，不可用时回退到大块缓冲读取；
+    结果按 (设备, inode, 大小, 修改时间) 缓存，重试与重复上传无需再次读取文件
+    """
+
+    def __init__(
+        self,
+        preid_size: int,
+        buffer_size: int = 8 * 1024 * 1024,
+        maxsize: int = 1024,
+    ):
+        """
+        :param preid_size: 前缀 SHA1 的字节数
+        :param buffer_size: 单次送入哈希的字节数
+        :param maxsize: 缓存的最大文件数
+        """
+        self.preid_size = preid_size
+        self.buffer_size = buffer_size
+        self._cache: LRUCache = LRUCache(maxsize=maxsize)
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _cache_key(st: stat_result) -> Tuple[int, int, int, int]:
+        return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+
+    def digest(self, filepath: Union[str, PathLike]) -> FileDigest:
+        """
+        获取文件特征值
+
+        :param filepath: 文件路径
+        """
+        path = Path(filepath)
+        st = path.stat()
+        key = self._cache_key(st)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        result = self._hash(path, st.st_size)
+
+        # 计算期间文件被修改时不缓存
+        if self._cache_key(path.stat()) == key:
+            with self._lock:
+                self._cache[key] = result
+        return result
+
+    def _hash(self, path: Path, size: int) -> FileDigest:
+        hasher = sha1()
+        preid: Optional[str] = None
+        with open(path, "rb") as f:
+            try:
+                mm = mmap(f.fileno(), 0, access=ACCESS_READ) if size else None
+            except (OSError, ValueError):
+                mm = None
+            if mm is not None:
+                if hasattr(_mmap, "MADV_SEQUENTIAL"):
+                    mm.madvise(_mmap.MADV_SEQUENTIAL)
+                with mm, memoryview(mm) as view:
+                    preid = self._update(hasher, view, 0)
+            else:
+                preid = self._update_from_file(hasher, f)
+        full = hasher.hexdigest()
+        return FileDigest(sha1=full, preid=preid or full, size=size)
+
+    def _update(self, hasher, view: memoryview, base: int) -> Optional[str]:
+        """
+        将数据分块送入哈希，经过前缀边界时记录前缀 SHA1
+
+        :param view: 数据
+        :param base: 数据在文件中的起始偏移
+        """
+        preid = None
+        # 前缀边界在 view 中的位置
+        boundary = self.preid_size - base
+        offset, end = 0, len(view)
+        while offset < end:
+            stop = min(offset + self.buffer_size, end)
+            if offset < boundary < stop:
+                stop = boundary
+            hasher.update(view[offset:stop])
+            offset = stop
+            if offset == boundary:
+                preid = hasher.copy().hexdigest()
+        return preid
+
+    def _update_from_file(self, hasher, f) -> Optional[str]:
+        """
+        mmap 不可用时使用可复用的缓冲区顺序读取
+        """
+        preid = None
+        position = 0
+        buffer = bytearray(self.buffer_size)
+        with memoryview(buffer) as view:
+            while n := f.readinto(buffer):
+                with view[:n] as chunk:
+                    preid = self._update(hasher, chunk, position) or preid
+                position += n
+        return preid
+
+    @staticmethod
+    def range_sha1(filepath: Union[str, PathLike], start: int, end: int) -> str:
+        """
+        计算文件指定区间（包含两端）的 SHA1
+
+        :param filepath: 文件路径
+        :param start: 起始字节
+        :param end: 结束字节
+        """
+        with open(filepath, "rb") as f:
+            f.seek(start)
+            return sha1(f.read(end - start + 1)).hexdigest()
+
+    def clear(self):
+        """
+        清空缓存
+        """
+        with self._lock:
+            self._cache.clear()
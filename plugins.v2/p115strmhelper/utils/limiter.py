@@ -1,5 +1,6 @@
-__all__ = ["RateLimiter", "ApiEndpointCooldown"]
+__all__ = ["RateLimiter", "ApiEndpointCooldown", "AsyncTokenBucket"]
 
+import asyncio
 from threading import Lock
 from time import monotonic, sleep
 from typing import Callable
@@ -57,3 +58,38 @@ class ApiEndpointCooldown:
             with self.lock:
                 self.last_call_time = monotonic()
         return self.api_callable(payload)
+
+
+class AsyncTokenBucket:
+    """
+    异步令牌桶，按速率补充令牌，允许不超过容量的突发
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        """
+        :param rate: 每秒补充的令牌数，小于等于 0 时不限速
+        :param capacity: 桶容量，默认与速率相同
+        """
+        self.rate = float(rate)
+        self.capacity = max(float(capacity if capacity is not None else rate), 1.0)
+        self.tokens = self.capacity
+        self.updated = monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens: float = 1.0):
+        """
+        获取令牌，不足时等待补充
+        """
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            self._refill()
+            if self.tokens < tokens:
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= tokens
@@ -0,0 +1,70 @@
+__all__ = ["AsyncSingleFlight"]
+
+import asyncio
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+
+T = TypeVar("T")
+
+
+class AsyncSingleFlight:
+    """
+    异步请求合并器
+
+    同一个 key 同时只会有一个上游调用在执行，期间到达的相同请求等待并共享该结果；
+    上游调用运行在独立任务中，单个请求方取消不会影响其他等待者
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """
+        执行或合并调用
+
+        :param key: 合并键
+        :param func: 无参协程函数，仅在没有相同 key 的调用进行中时执行
+
+        :return: 上游调用结果，异常同样会传递给所有等待者
+        """
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            self.leaders += 1
+            task.add_done_callback(partial(self._on_done, key))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _on_done(self, key: Hashable, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # 所有等待者都已取消时避免 "exception was never retrieved"
+            task.exception()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    def inflight(self) -> int:
+        """
+        当前进行中的上游调用数
+        """
+        return len(self._inflight)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        合并统计
+        """
+        return {
+            "calls": self.calls,
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "inflight": self.inflight(),
+        }
@@ -1,12 +1,44 @@
 __all__ = ["DirectoryTree"]
 
 from abc import ABC, abstractmethod
+from array import array
+from contextlib import ExitStack
+from itertools import batched
 from pathlib import Path
-from typing import Iterable, Generator, Union, List
+from typing import Iterable, Generator, Union, List, Optional, Sequence, Tuple
 
 from app.core.config import settings
 from app.helper.redis import RedisHelper
 
+from ..core.config import configer
+from ..utils.extsort import SortedRunStore, merge_diff
+
+
+class DirectoryTreeWriter(ABC):
+    """
+    目录树流式写入器，逐条写入路径，关闭时落盘
+    """
+
+    @abstractmethod
+    def write(self, path: str):
+        """
+        写入一条路径，空路径会被忽略
+        """
+        pass
+
+    @abstractmethod
+    def close(self):
+        """
+        刷新缓冲并释放资源
+        """
+        pass
+
+    def __enter__(self) -> "DirectoryTreeWriter":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
 
 class DirectoryTreeStorage(ABC):
     """
@@ -14,10 +46,27 @@ class DirectoryTreeStorage(ABC):
     """
 
     @abstractmethod
+    def open_writer(self, append: bool = False) -> DirectoryTreeWriter:
+        """
+        打开流式写入器
+        """
+        pass
+
     def add_paths(self, paths: Iterable[str], append: bool = False):
         """
         从一个迭代器添加多个路径
         """
+        with self.open_writer(append=append) as writer:
+            for path in paths:
+                writer.write(path)
+
+    @abstractmethod
+    def diff(
+        self, other_storage: "DirectoryTreeStorage"
+    ) -> Generator[Tuple[int, str], None, None]:
+        """
+        比较两个树，单次遍历返回 self 中存在而 other 中不存在的 (行号, 路径)
+        """
         pass
 
     @abstractmethod
@@ -45,6 +94,22 @@ class DirectoryTreeStorage(ABC):
         """
         pass
 
+    def get_paths_by_line_numbers(
+        self, line_numbers: Iterable[int]
+    ) -> Generator[Tuple[int, Union[str, None]], None, None]:
+        """
+        批量根据行号获取路径，按行号升序返回 (行号, 路径)
+        """
+        for line_number in sorted(line_numbers):
+            yield line_number, self.get_path_by_line_number(line_number)
+
+    @abstractmethod
+    def iter_paths(self) -> Generator[str, None, None]:
+        """
+        遍历树中的所有有效路径
+        """
+        pass
+
     @abstractmethod
     def count(self) -> int:
         """
@@ -68,34 +133,82 @@ class TxtFileStorage(DirectoryTreeStorage):
     def __init__(self, file_path: Union[str, Path]):
         self.file_path = Path(file_path)
         self.file_path.parent.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.file_path.with_name(f"{self.file_path.name}.idx")
+        # 每行结束位置的字节偏移，第 n 行位于 [ends[n-2], ends[n-1])
+        self._line_ends: Optional[array] = None
+        # 索引对应的文件 (大小, 修改时间)
+        self._index_key: Optional[Tuple[int, int]] = None
+        # 非空行数量，索引载入前为 None
+        self._count: Optional[int] = None
+
+    def _stat_key(self) -> Optional[Tuple[int, int]]:
+        """
+        获取文件的 (大小, 修改时间)，文件不存在时返回 None
+        """
+        try:
+            st = self.file_path.stat()
+        except FileNotFoundError:
+            return None
+        return st.st_size, st.st_mtime_ns
 
-    def add_paths(self, paths: Iterable[str], append: bool = False):
-        mode = "a" if append else "w"
-        buffer_size = 1048576
-        with open(self.file_path, mode, encoding="utf-8", buffering=buffer_size) as f:
-            f.writelines(f"{path}\n" for path in paths)
+    def _load_index(self) -> array:
+        """
+        获取行偏移索引，索引缺失或与文件大小、修改时间不一致时顺序扫描重建
 
-    def compare_trees(
-        self, other_storage: "DirectoryTreeStorage"
-    ) -> Generator[str, None, None]:
-        if not isinstance(other_storage, TxtFileStorage):
-            raise TypeError("TxtFileStorage 只能与同类型的树进行比较")
+        索引文件开头三项为生成索引时文件的大小、修改时间与非空行数量，其后为各行结束偏移
+        """
+        key = self._stat_key()
+        if key is None:
+            self._line_ends, self._index_key, self._count = array("Q"), None, 0
+            self.index_path.unlink(missing_ok=True)
+            return self._line_ends
+
+        if self._line_ends is not None and self._index_key == key:
+            return self._line_ends
 
+        line_ends = array("Q")
         try:
-            with open(other_storage.file_path, "r", encoding="utf-8") as f2:
-                tree2_set = set(line.strip() for line in f2)
-        except FileNotFoundError:
-            tree2_set = set()
+            line_ends.frombytes(self.index_path.read_bytes())
+        except (FileNotFoundError, ValueError):
+            line_ends = array("Q")
+        if len(line_ends) >= 3 and tuple(line_ends[:2]) == key:
+            self._count = line_ends[2]
+            line_ends = line_ends[3:]
+        else:
+            line_ends = array("Q")
+            offset = 0
+            count = 0
+            with open(self.file_path, "rb", buffering=1048576) as f:
+                for line in f:
+                    offset += len(line)
+                    line_ends.append(offset)
+                    if line.strip():
+                        count += 1
+            self._count = count
+            self._write_index(line_ends, key, count)
 
-        with open(self.file_path, "r", encoding="utf-8") as f1:
-            for line in f1:
-                file_path = line.strip()
-                if file_path not in tree2_set:
-                    yield file_path
+        self._line_ends = line_ends
+        self._index_key = key
+        return line_ends
 
-    def compare_trees_lines(
+    def _write_index(self, line_ends: array, key: Tuple[int, int], count: int):
+        """
+        写入带文件 (大小, 修改时间, 非空行数量) 头的行偏移索引
+        """
+        with open(self.index_path, "wb") as f:
+            array("Q", (*key, count)).tofile(f)
+            line_ends.tofile(f)
+
+    @staticmethod
+    def _index_end(line_ends: array) -> int:
+        return line_ends[-1] if line_ends else 0
+
+    def open_writer(self, append: bool = False) -> "TxtTreeWriter":
+        return TxtTreeWriter(self, append=append)
+
+    def diff(
         self, other_storage: "DirectoryTreeStorage"
-    ) -> Generator[int, None, None]:
+    ) -> Generator[Tuple[int, str], None, None]:
         if not isinstance(other_storage, TxtFileStorage):
             raise TypeError("TxtFileStorage 只能与同类型的树进行比较")
 
@@ -109,34 +222,144 @@ class TxtFileStorage(DirectoryTreeStorage):
             for line_num, line in enumerate(f1, start=1):
                 file_path = line.strip()
                 if file_path not in tree2_set:
-                    yield line_num
+                    yield line_num, file_path
+
+    def compare_trees(
+        self, other_storage: "DirectoryTreeStorage"
+    ) -> Generator[str, None, None]:
+        for _, file_path in self.diff(other_storage):
+            yield file_path
+
+    def compare_trees_lines(
+        self, other_storage: "DirectoryTreeStorage"
+    ) -> Generator[int, None, None]:
+        for line_num, _ in self.diff(other_storage):
+            yield line_num
 
     def get_path_by_line_number(self, line_number: int) -> Union[str, None]:
-        if line_number <= 0:
-            return None
-        try:
-            with open(self.file_path, "r", encoding="utf-8") as f:
-                for i, line in enumerate(f, 1):
-                    if i == line_number:
-                        return line.strip()
-        except FileNotFoundError:
-            return None
+        for _, path in self.get_paths_by_line_numbers([line_number]):
+            return path
         return None
 
-    def count(self) -> int:
-        count = 0
+    def get_paths_by_line_numbers(
+        self, line_numbers: Iterable[int]
+    ) -> Generator[Tuple[int, Union[str, None]], None, None]:
+        line_ends = self._load_index()
+        total = len(line_ends)
+        if not total:
+            for line_number in sorted(line_numbers):
+                yield line_number, None
+            return
+        with open(self.file_path, "rb", buffering=1048576) as f:
+            for line_number in sorted(line_numbers):
+                if line_number <= 0 or line_number > total:
+                    yield line_number, None
+                    continue
+                start = line_ends[line_number - 2] if line_number > 1 else 0
+                if f.tell() != start:
+                    f.seek(start)
+                data = f.read(line_ends[line_number - 1] - start)
+                yield line_number, data.decode("utf-8").strip()
+
+    def iter_paths(self) -> Generator[str, None, None]:
         try:
             with open(self.file_path, "r", encoding="utf-8") as f:
                 for line in f:
-                    if line.strip():
-                        count += 1
+                    if file_path := line.strip():
+                        yield file_path
         except FileNotFoundError:
-            return 0
-        return count
+            return
+
+    def count(self) -> int:
+        self._load_index()
+        return self._count
 
     def clear(self):
         if self.file_path.exists():
             self.file_path.unlink()
+        self.index_path.unlink(missing_ok=True)
+        self._line_ends = None
+        self._index_key = None
+        self._count = None
+
+
+class TxtTreeWriter(DirectoryTreeWriter):
+    """
+    TXT 目录树写入器，整个写入过程只打开一次文件，关闭时写入行偏移索引
+    """
+
+    BUFFER_SIZE = 1048576
+
+    def __init__(self, storage: TxtFileStorage, append: bool = False):
+        self.storage = storage
+        self._line_ends = storage._load_index() if append else array("Q")
+        self._count = storage._count if append else 0
+        self._offset = storage._index_end(self._line_ends)
+        self._new_ends = array("Q")
+        self._file = open(
+            storage.file_path, "ab" if append else "wb", buffering=self.BUFFER_SIZE
+        )
+
+    def write(self, path: str):
+        if not path:
+            return
+        data = f"{path}\n".encode("utf-8")
+        self._file.write(data)
+        self._offset += len(data)
+        self._new_ends.append(self._offset)
+        if path.strip():
+            self._count += 1
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.close()
+        line_ends = self._line_ends + self._new_ends
+        key = self.storage._stat_key()
+        self.storage._write_index(line_ends, key, self._count)
+        self.storage._line_ends = line_ends
+        self.storage._index_key = key
+        self.storage._count = self._count
+
+
+class SortedTxtFileStorage(TxtFileStorage):
+    """
+    使用 TXT 文件 + 外部排序 run 文件作为后端的存储策略
+
+    比较时对两棵树的有序 run 做归并连接，内存占用与树大小无关，
+    差异按路径升序输出
+    """
+
+    def __init__(self, file_path: Union[str, Path], memory_budget: int):
+        super().__init__(file_path)
+        self.run_store = SortedRunStore(
+            self.file_path.with_name(f"{self.file_path.name}.runs"),
+            memory_budget=memory_budget,
+        )
+
+    def _sorted_records(self, missing_ok: bool = False):
+        """
+        获取有序去重记录，源文件变化时重新排序
+        """
+        if missing_ok and not self.file_path.exists():
+            return iter(())
+        self.run_store.ensure(self.file_path)
+        return self.run_store.records()
+
+    def diff(
+        self, other_storage: "DirectoryTreeStorage"
+    ) -> Generator[Tuple[int, str], None, None]:
+        if not isinstance(other_storage, SortedTxtFileStorage):
+            raise TypeError("SortedTxtFileStorage 只能与同类型的树进行比较")
+
+        yield from merge_diff(
+            self._sorted_records(),
+            other_storage._sorted_records(missing_ok=True),
+        )
+
+    def clear(self):
+        super().clear()
+        self.run_store.clear()
 
 
 class RedisStorage(DirectoryTreeStorage):
@@ -154,26 +377,30 @@ class RedisStorage(DirectoryTreeStorage):
         self._set_key = f"dirtree:set:{tree_name}"
         self._list_key = f"dirtree:list:{tree_name}"
 
-    def add_paths(self, paths: Iterable[str], append: bool = False):
-        pipe = self.client.pipeline()
-
-        if not append:
-            pipe.delete(self._set_key, self._list_key)
+    def open_writer(self, append: bool = False) -> "RedisTreeWriter":
+        return RedisTreeWriter(self, append=append)
 
-        chunk_size, path_chunk = 5000, []
-        for path in paths:
-            if path:
-                path_chunk.append(path)
-            if len(path_chunk) >= chunk_size:
-                pipe.sadd(self._set_key, *path_chunk)
-                pipe.rpush(self._list_key, *path_chunk)
-                path_chunk = []
+    def diff(
+        self, other_storage: "DirectoryTreeStorage"
+    ) -> Generator[Tuple[int, str], None, None]:
+        if not isinstance(other_storage, RedisStorage):
+            raise TypeError("RedisStorage 只能与同类型的树进行高性能比较")
 
-        if path_chunk:
-            pipe.sadd(self._set_key, *path_chunk)
-            pipe.rpush(self._list_key, *path_chunk)
+        chunk_size, line_num = 5000, 0
+        while True:
+            paths_chunk_bytes = self.client.lrange(
+                self._list_key, line_num, line_num + chunk_size - 1
+            )
+            if not paths_chunk_bytes:
+                break
 
-        pipe.execute()
+            pipe = self.client.pipeline()
+            for path_bytes in paths_chunk_bytes:
+                pipe.sismember(other_storage._set_key, path_bytes)
+            for path_bytes, exists in zip(paths_chunk_bytes, pipe.execute()):
+                line_num += 1
+                if not exists:
+                    yield line_num, path_bytes.decode("utf-8")
 
     def compare_trees(
         self, other_storage: "DirectoryTreeStorage"
@@ -188,21 +415,8 @@ class RedisStorage(DirectoryTreeStorage):
     def compare_trees_lines(
         self, other_storage: "DirectoryTreeStorage"
     ) -> Generator[int, None, None]:
-        if not isinstance(other_storage, RedisStorage):
-            raise TypeError("RedisStorage 只能与同类型的树进行高性能比较")
-
-        chunk_size, line_num = 5000, 0
-        while True:
-            paths_chunk_bytes = self.client.lrange(
-                self._list_key, line_num, line_num + chunk_size - 1
-            )
-            if not paths_chunk_bytes:
-                break
-
-            for path_bytes in paths_chunk_bytes:
-                line_num += 1
-                if not self.client.sismember(other_storage._set_key, path_bytes):
-                    yield line_num
+        for line_num, _ in self.diff(other_storage):
+            yield line_num
 
     def get_path_by_line_number(self, line_number: int) -> Union[str, None]:
         if line_number <= 0:
@@ -210,6 +424,23 @@ class RedisStorage(DirectoryTreeStorage):
         path_bytes = self.client.lindex(self._list_key, line_number - 1)
         return path_bytes.decode("utf-8") if path_bytes else None
 
+    def get_paths_by_line_numbers(
+        self, line_numbers: Iterable[int]
+    ) -> Generator[Tuple[int, Union[str, None]], None, None]:
+        for chunk in batched(sorted(line_numbers), 5000):
+            pipe = self.client.pipeline()
+            for line_number in chunk:
+                pipe.lindex(self._list_key, max(line_number - 1, 0))
+            for line_number, path_bytes in zip(chunk, pipe.execute()):
+                if line_number <= 0 or not path_bytes:
+                    yield line_number, None
+                else:
+                    yield line_number, path_bytes.decode("utf-8")
+
+    def iter_paths(self) -> Generator[str, None, None]:
+        for path_bytes in self.client.sscan_iter(self._set_key, count=5000):
+            yield path_bytes.decode("utf-8")
+
     def count(self) -> int:
         return self.client.scard(self._set_key)
 
@@ -217,19 +448,63 @@ class RedisStorage(DirectoryTreeStorage):
         self.client.delete(self._set_key, self._list_key)
 
 
+class RedisTreeWriter(DirectoryTreeWriter):
+    """
+    Redis 目录树写入器，按块通过 pipeline 批量提交，内存占用与树大小无关
+    """
+
+    CHUNK_SIZE = 5000
+
+    def __init__(self, storage: RedisStorage, append: bool = False):
+        self.storage = storage
+        self._chunk: List[str] = []
+        self._closed = False
+        if not append:
+            storage.client.delete(storage._set_key, storage._list_key)
+
+    def _flush(self):
+        if not self._chunk:
+            return
+        pipe = self.storage.client.pipeline(transaction=False)
+        pipe.sadd(self.storage._set_key, *self._chunk)
+        pipe.rpush(self.storage._list_key, *self._chunk)
+        pipe.execute()
+        self._chunk = []
+
+    def write(self, path: str):
+        if not path:
+            return
+        self._chunk.append(path)
+        if len(self._chunk) >= self.CHUNK_SIZE:
+            self._flush()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._flush()
+
+
 class DirectoryTree:
     """
     目录树操作的高级接口，支持 TXT 和 Redis 后端
     """
 
-    def __init__(self, file_path: Path):
+    def __init__(self, file_path: Path, memory_budget: Optional[int] = None):
         """
         初始化目录树实例。
+
+        :param file_path: 目录树文件路径
+        :param memory_budget: TXT 后端外部排序内存预算（字节），默认读取配置
         """
         if settings.CACHE_BACKEND_TYPE == "redis":
             self._storage: DirectoryTreeStorage = RedisStorage(file_path.stem)
         else:
-            self._storage: DirectoryTreeStorage = TxtFileStorage(file_path)
+            if memory_budget is None:
+                memory_budget = configer.directory_tree_memory_budget * 1024 * 1024
+            self._storage: DirectoryTreeStorage = SortedTxtFileStorage(
+                file_path, memory_budget=memory_budget
+            )
 
     def scan_directory_to_tree(
         self, root_path, append=False, extensions=None, use_posix=True
@@ -256,6 +531,41 @@ class DirectoryTree:
         """
         self._storage.add_paths(file_list, append=append)
 
+    def open_writer(self, append=False) -> DirectoryTreeWriter:
+        """
+        打开流式写入器，用于边遍历边写入
+        """
+        return self._storage.open_writer(append=append)
+
+    @staticmethod
+    def generate_trees_from_rows(
+        trees: Sequence["DirectoryTree"],
+        rows: Iterable[Sequence[str]],
+        append=False,
+    ):
+        """
+        单次遍历同时生成多棵目录树，每棵树只打开一个写入器
+
+        :param trees: 目录树列表
+        :param rows: 每行依次对应各目录树的路径
+        :param append: 是否追加写入
+        """
+        with ExitStack() as stack:
+            writers = [
+                stack.enter_context(tree.open_writer(append=append)) for tree in trees
+            ]
+            for row in rows:
+                for writer, path in zip(writers, row):
+                    writer.write(path)
+
+    def diff(
+        self, other_tree: "DirectoryTree"
+    ) -> Generator[Tuple[int, str], None, None]:
+        """
+        比较两个目录树，单次遍历同时返回差异文件的行号和路径
+        """
+        yield from self._storage.diff(other_tree._storage)
+
     def compare_trees(self, other_tree: "DirectoryTree") -> Generator[str, None, None]:
         """
         比较两个目录树，找出本树有而另一颗树没有的文件
@@ -276,6 +586,23 @@ class DirectoryTree:
         """
         return self._storage.get_path_by_line_number(line_number)
 
+    def get_paths_by_line_numbers(
+        self, line_numbers: Iterable[int]
+    ) -> Generator[Tuple[int, Union[str, None]], None, None]:
+        """
+        批量通过行号获取路径，按行号升序一次顺序读取
+
+        :param line_numbers: 行号集合
+        :return: (行号, 路径) 生成器
+        """
+        yield from self._storage.get_paths_by_line_numbers(line_numbers)
+
+    def iter_paths(self) -> Generator[str, None, None]:
+        """
+        遍历此目录树中的所有有效路径
+        """
+        yield from self._storage.iter_paths()
+
     def count(self) -> int:
         """
         获取此目录树中的有效条目总数
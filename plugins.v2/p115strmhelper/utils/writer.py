@@ -0,0 +1,239 @@
+__all__ = ["AdaptiveWriterPool"]
+
+from os import makedirs
+from pathlib import Path
+from queue import Empty, Queue
+from random import randrange
+from threading import Event, Lock, Thread
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional, Set
+
+
+class AdaptiveWriterPool:
+    """
+    自适应 IO 写入线程池
+
+    根据实测单文件写入延迟与队列积压在 [min_workers, max_workers] 之间伸缩线程数：
+    慢存储（NFS/SMB）延迟高、队列积压时扩容，本地磁盘空闲时收缩
+    """
+
+    # 单文件写入延迟高于该值时认为存储为 IO 瓶颈，扩容有效（秒）
+    SLOW_WRITE_LATENCY = 0.002
+    # 队列连续空闲多少个调度周期后收缩
+    IDLE_TICKS_TO_SHRINK = 3
+    # 延迟采样池大小
+    SAMPLE_SIZE = 8192
+    # 目录创建缓存上限
+    DIR_CACHE_SIZE = 200_000
+
+    def __init__(
+        self,
+        task_queue: Queue,
+        flush: Callable[[List[Any]], None],
+        min_workers: int = 2,
+        max_workers: int = 32,
+        batch_size: int = 64,
+        interval: float = 1.0,
+    ):
+        """
+        :param task_queue: 任务队列，None 为单个线程的退出信号
+        :param flush: 批量处理函数
+        :param min_workers: 最小线程数
+        :param max_workers: 最大线程数
+        :param batch_size: 单次批处理数量
+        :param interval: 调度周期（秒）
+        """
+        self.queue = task_queue
+        self.flush = flush
+        self.min_workers = max(1, int(min_workers))
+        self.max_workers = max(self.min_workers, int(max_workers))
+        self.batch_size = max(1, int(batch_size))
+        self.interval = interval
+
+        self._lock = Lock()
+        self._stop_event = Event()
+        self._threads: List[Thread] = []
+        self._controller: Optional[Thread] = None
+        self._active = 0
+        self._peak = 0
+        self._retire_requests = 0
+        self._stopping = False
+
+        self._dir_cache: Set[str] = set()
+
+        self._files = 0
+        self._samples: List[float] = []
+        self._window_sum = 0.0
+        self._window_count = 0
+        self._start_time = 0.0
+        self._end_time = 0.0
+
+    @property
+    def active_workers(self) -> int:
+        return self._active
+
+    def start(self):
+        """
+        启动线程池与调度线程
+        """
+        self._start_time = perf_counter()
+        self._spawn(self.min_workers)
+        self._controller = Thread(target=self._control_loop, daemon=True)
+        self._controller.start()
+
+    def shutdown(self):
+        """
+        等待队列处理完成后停止所有线程
+        """
+        self.queue.join()
+        self._stop_event.set()
+        if self._controller:
+            self._controller.join()
+        with self._lock:
+            self._stopping = True
+            active = self._active
+        for _ in range(active):
+            self.queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._end_time = perf_counter()
+
+    def ensure_parent(self, file_path: Path):
+        """
+        创建文件父目录，同一目录只创建一次
+        """
+        parent = file_path.parent
+        key = str(parent)
+        if key in self._dir_cache:
+            return
+        makedirs(parent, exist_ok=True)
+        with self._lock:
+            if len(self._dir_cache) >= self.DIR_CACHE_SIZE:
+                self._dir_cache.clear()
+            self._dir_cache.add(key)
+
+    def forget_parent(self, file_path: Path):
+        """
+        目录被外部删除时移除缓存
+        """
+        with self._lock:
+            self._dir_cache.discard(str(file_path.parent))
+
+    def observe(self, latency: float):
+        """
+        记录一次文件写入延迟（秒）
+        """
+        with self._lock:
+            self._files += 1
+            self._window_sum += latency
+            self._window_count += 1
+            if len(self._samples) < self.SAMPLE_SIZE:
+                self._samples.append(latency)
+            else:
+                index = randrange(self._files)
+                if index < self.SAMPLE_SIZE:
+                    self._samples[index] = latency
+
+    def stats(self) -> Dict[str, float]:
+        """
+        本次运行的写入统计
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+            files = self._files
+            peak = self._peak
+        end_time = self._end_time or perf_counter()
+        elapsed = max(end_time - self._start_time, 1e-9)
+        p95 = samples[int(0.95 * (len(samples) - 1))] if samples else 0.0
+        return {
+            "files": files,
+            "elapsed": elapsed,
+            "files_per_second": files / elapsed,
+            "p95_latency_ms": p95 * 1000,
+            "peak_workers": peak,
+        }
+
+    def _spawn(self, count: int):
+        with self._lock:
+            count = min(count, self.max_workers - self._active)
+            if count <= 0 or self._stopping:
+                return
+            self._active += count
+            self._peak = max(self._peak, self._active)
+        for _ in range(count):
+            thread = Thread(target=self._worker, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _try_retire(self) -> bool:
+        with self._lock:
+            if (
+                self._retire_requests > 0
+                and not self._stopping
+                and self._active > self.min_workers
+            ):
+                self._retire_requests -= 1
+                self._active -= 1
+                return True
+        return False
+
+    def _control_loop(self):
+        idle_ticks = 0
+        while not self._stop_event.wait(self.interval):
+            with self._lock:
+                window_count = self._window_count
+                avg_latency = self._window_sum / window_count if window_count else 0.0
+                self._window_sum = 0.0
+                self._window_count = 0
+                active = self._active
+
+            backlog = self.queue.qsize()
+            if backlog > active * self.batch_size:
+                idle_ticks = 0
+                if avg_latency >= self.SLOW_WRITE_LATENCY:
+                    self._spawn(max(1, active // 2))
+                elif window_count == 0:
+                    # 本周期没有完成任何写入，线程全部阻塞在 IO 上
+                    self._spawn(1)
+            elif backlog == 0:
+                idle_ticks += 1
+                if idle_ticks >= self.IDLE_TICKS_TO_SHRINK:
+                    idle_ticks = 0
+                    with self._lock:
+                        if self._active - self._retire_requests > self.min_workers:
+                            self._retire_requests += 1
+            else:
+                idle_ticks = 0
+
+    def _worker(self):
+        while True:
+            tasks: List[Any] = []
+            stop = False
+            first_task = self.queue.get()
+            if first_task is None:
+                self.queue.task_done()
+                with self._lock:
+                    self._active -= 1
+                return
+            tasks.append(first_task)
+            while len(tasks) < self.batch_size:
+                try:
+                    extra_task = self.queue.get_nowait()
+                except Empty:
+                    break
+                if extra_task is None:
+                    self.queue.task_done()
+                    stop = True
+                    break
+                tasks.append(extra_task)
+            try:
+                self.flush(tasks)
+            finally:
+                for _ in tasks:
+                    self.queue.task_done()
+            if stop:
+                with self._lock:
+                    self._active -= 1
+                return
+            if self._try_retire():
+                return